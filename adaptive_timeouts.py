@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+自适应等待超时
+功能：每个等待点（确认对话框、保存结果提示、评估表格行……）记录每次等待实际花了多久，
+直方图跨运行持久化到 ~/.ucas_eval/wait_latency.json；样本足够后超时取 p99 x 裕量 + 固定余量，
+不再对每个表单都白等固定的 3/5/10 秒，服务器繁忙时也会随观测自动放宽（最多到默认值的 max_factor 倍）
+
+等待超时不是耗时样本（只知道"至少等了这么久"），单独记为删失样本：
+- 一般等待点：超时计入样本总数，超过 1% 的等待超时时 p99 未知，回到默认值（不会因超时一路推高到上限）
+- 预期常常等不到的等待点（保存结果提示、错误对话框按钮，调用时传 expect_absence=True）：超时不参与 p99，
+  且超时只会放宽、不会低于默认值——这里等不到就当作"没有出错"，缩短等待会把来得慢的验证码错误提示误判为成功
+旧样本按半衰期衰减（latency_stats.LatencyHistogram），服务器恢复后超时会随新观测回落。
+超时值同样受单表单时间预算约束（form_deadline.budget）
+"""
+
+import threading
+import time
+
+from eval_state import state_path, load_json, save_json
+from form_deadline import budget
+from latency_stats import LatencyHistogram
+from eval_logging import get_logger
+
+log = get_logger("adaptive_timeouts")
+
+LATENCY_FILE = "wait_latency.json"
+
+
+def _is_timeout(exc):
+    try:
+        from selenium.common.exceptions import TimeoutException
+    except ImportError:
+        return type(exc).__name__ == "TimeoutException"
+    return isinstance(exc, TimeoutException)
+
+
+class AdaptiveTimeouts:
+    """
+    timeout(site, default)：样本不足 min_samples 或 p99 落在超时样本中时返回默认值，
+    否则返回 p99 x margin + slack，并限制在 [floor, default x max_factor] 之间（expect_absence 的等待点下限为默认值）
+    """
+
+    def __init__(self, min_samples=20, margin=1.5, slack=0.3, floor=0.5, max_factor=2.0, path=None):
+        self.min_samples = min_samples
+        self.margin = margin
+        self.slack = slack
+        self.floor = floor
+        self.max_factor = max_factor
+        self.path = path or state_path(LATENCY_FILE)
+        saved = load_json(self.path, default={}) or {}
+        self.histograms = {site: LatencyHistogram(entry.get("counts"), entry.get("censored"))
+                           for site, entry in saved.items()}
+        self.defaults = {}
+        self.absence_sites = set()
+        self.timeouts = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def timeout(self, site, default):
+        with self._lock:
+            self.defaults[site] = default
+            histogram = self.histograms.get(site)
+            expect_absence = site in self.absence_sites
+            include_censored = not expect_absence
+            if histogram is None:
+                return default
+            samples = histogram.total + (histogram.censored if include_censored else 0)
+            if samples < self.min_samples:
+                return default
+            p99 = histogram.quantile(99, include_censored=include_censored)
+        if p99 is None:
+            return default
+        floor = default if expect_absence else self.floor
+        return min(default * self.max_factor, max(floor, p99 * self.margin + self.slack))
+
+    def observe(self, site, seconds):
+        with self._lock:
+            self.histograms.setdefault(site, LatencyHistogram()).add(seconds)
+            self._dirty = True
+
+    def observe_timeout(self, site):
+        with self._lock:
+            self.histograms.setdefault(site, LatencyHistogram()).add_censored()
+            self.timeouts += 1
+            self._dirty = True
+
+    def wait(self, site, default, wait_fn, expect_absence=False):
+        """
+        以自适应超时调用 wait_fn(timeout) 并记录耗时；wait_fn 超时可以返回 None（wait_for_state）
+        或抛出 TimeoutException（WebDriverWait），两种情况都记为删失样本并原样交还调用方。
+        expect_absence=True 表示等待的东西经常本来就不会出现，超时不参与该等待点的 p99
+        """
+        if expect_absence:
+            with self._lock:
+                self.absence_sites.add(site)
+        timeout = budget(self.timeout(site, default))
+        started = time.monotonic()
+        try:
+            result = wait_fn(timeout)
+        except Exception as e:
+            if _is_timeout(e):
+                self.observe_timeout(site)
+            raise
+        if result is None:
+            self.observe_timeout(site)
+        else:
+            self.observe(site, time.monotonic() - started)
+        return result
+
+    def save(self):
+        """表单之间调用：有新观测时写盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {site: h.to_dict() for site, h in self.histograms.items()}
+            self._dirty = False
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            log.debug(f"保存等待耗时统计失败: {e}")
+
+    def summary_lines(self):
+        """运行报告：本次运行用到的每个等待点的默认值、当前超时、p99 和超时次数"""
+        lines = []
+        for site in sorted(self.defaults):
+            default = self.defaults[site]
+            histogram = self.histograms.get(site)
+            p99 = histogram.quantile(99, include_censored=site not in self.absence_sites) if histogram else None
+            current = self.timeout(site, default)
+            if histogram is None:
+                observed = "暂无样本"
+            else:
+                ignored = "，不计入" if site in self.absence_sites else ""
+                p99_text = f"p99 {p99:.2f}s，" if p99 is not None else ""
+                observed = f"{p99_text}{histogram.total:.0f} 个样本，超时 {histogram.censored:.0f} 次{ignored}"
+            lines.append(f"   {site}: {default:g}s → {current:.2f}s（{observed}）")
+        if lines:
+            lines.insert(0, "⏱️ 自适应等待超时（默认 → 当前）:")
+        return lines
+
+
+# 进程级实例：两个评估脚本和守护进程共用同一份统计
+ADAPTIVE_TIMEOUTS = AdaptiveTimeouts()
+
+
+def timed_wait(site, default, wait_fn, expect_absence=False):
+    return ADAPTIVE_TIMEOUTS.wait(site, default, wait_fn, expect_absence)
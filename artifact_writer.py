@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+失败现场记录
+功能：每个表单只截一张标注了失败行的截图并保存DOM快照，压缩、按内容去重后由后台线程写盘，目录有总大小上限
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import queue
+import re
+import threading
+import time
+
+from eval_logging import get_logger
+
+log = get_logger("artifact_writer")
+
+# 给失败元素所在行加醒目边框，截图后再移除
+HIGHLIGHT_SCRIPT = """
+const marked = [];
+for (const el of arguments[0]) {
+    const target = el.closest('tr') || el;
+    target.setAttribute('data-eval-fail', '1');
+    target.style.setProperty('outline', '3px solid red', 'important');
+    marked.push(target);
+}
+if (marked.length) marked[0].scrollIntoView({block: 'center'});
+return marked.length;
+"""
+
+CLEAR_HIGHLIGHT_SCRIPT = """
+for (const el of document.querySelectorAll('[data-eval-fail]')) {
+    el.style.removeProperty('outline');
+    el.removeAttribute('data-eval-fail');
+}
+"""
+
+ARTIFACT_NAME_PATTERN = re.compile(r"-([0-9a-f]{12})\.(png|html\.gz)$")
+
+
+def form_id_from_url(url):
+    """从评估URL中提取表单标识，例如 .../evaluateTeacher/78810/278488/1541/0 -> evaluateTeacher-78810-278488-1541-0"""
+    path = re.sub(r"^[a-z]+://[^/]+", "", url or "").split("?")[0]
+    parts = [p for p in path.split("/") if p and p != "evaluate"]
+    return re.sub(r"[^0-9A-Za-z_-]", "_", "-".join(parts))[-80:] or "unknown"
+
+
+class ArtifactWriter:
+    """
+    后台失败现场写入器：
+    - capture() 在主线程中只做截图和取DOM（必须经由 driver），其余工作交给后台线程
+    - 队列有上限，写盘跟不上时直接丢弃新的现场，绝不阻塞填表流程
+    """
+
+    def __init__(self, directory="eval_artifacts", max_queue=8, max_total_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_total_bytes = max_total_bytes
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.seen_hashes = set()
+        self.written = 0
+        self.skipped = 0
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            match = ARTIFACT_NAME_PATTERN.search(name)
+            if match:
+                self.seen_hashes.add(match.group(1))
+        self._thread = threading.Thread(target=self._worker, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    def capture(self, driver, form_id, failed_elements=(), note=""):
+        """记录一个表单的失败现场：一张标注截图 + 一份DOM快照"""
+        try:
+            if failed_elements:
+                driver.execute_script(HIGHLIGHT_SCRIPT, list(failed_elements))
+            png = driver.get_screenshot_as_png()
+            dom = driver.execute_script("return document.documentElement.outerHTML") or ""
+            if failed_elements:
+                driver.execute_script(CLEAR_HIGHLIGHT_SCRIPT)
+        except Exception as e:
+            log.warning(f"⚠️ 采集失败现场时出错: {e}")
+            return
+
+        self._ensure_started()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        header = f"<!-- form={form_id} time={stamp} note={note} -->\n"
+        try:
+            self.queue.put_nowait((form_id, stamp, png, dom, header))
+            log.info(f"📸 已记录表单 {form_id} 的失败现场（后台写入 {self.directory}/）")
+        except queue.Full:
+            self.skipped += 1
+            log.warning("⚠️ 失败现场写入队列已满，本次跳过")
+
+    def close(self, timeout=10):
+        """等待队列写完（最多 timeout 秒）"""
+        if not self._thread:
+            return
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self._write(*item)
+            except Exception as e:
+                log.warning(f"⚠️ 写入失败现场出错: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, form_id, stamp, png, dom, header=""):
+        header_bytes = header.encode("utf-8")
+        files = [("png", png, self._compress_png),
+                 ("html.gz", dom.encode("utf-8"), lambda data: gzip.compress(header_bytes + data, 6))]
+        for suffix, raw, compress in files:
+            # 按原始内容去重（DOM 不含表单/时间注释头，注释头只写进文件），重复的现场不再压缩和写盘
+            digest = hashlib.sha1(raw).hexdigest()[:12]
+            if digest in self.seen_hashes:
+                self.skipped += 1
+                continue
+            path = os.path.join(self.directory, f"form-{form_id}-{stamp}-{digest}.{suffix}")
+            with open(path, "wb") as f:
+                f.write(compress(raw))
+            self.seen_hashes.add(digest)
+            self.written += 1
+        self._enforce_size_cap()
+
+    @staticmethod
+    def _compress_png(png):
+        """量化为调色板PNG，截图体积通常可缩小到原来的 1/3 以下"""
+        try:
+            from PIL import Image
+            im = Image.open(io.BytesIO(png)).convert("RGB").quantize(colors=128)
+            buffer = io.BytesIO()
+            im.save(buffer, format="PNG", optimize=True)
+            if buffer.tell() < len(png):
+                return buffer.getvalue()
+        except Exception:
+            pass
+        return png
+
+    def _enforce_size_cap(self):
+        """目录超出上限时从最旧的文件开始删除"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path, name))
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, path, name in sorted(entries):
+            if total <= self.max_total_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                match = ARTIFACT_NAME_PATTERN.search(name)
+                if match:
+                    self.seen_hashes.discard(match.group(1))
+            except OSError:
+                pass
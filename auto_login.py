@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+sep.ucas.ac.cn 自动登录
+功能：从环境变量或本地密钥文件读取账号密码，复用验证码识别流程完成登录并确认进入首页
+"""
+
+import json
+import os
+import stat
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+from eval_state import state_path
+from browser_backend import create_backend
+from adaptive_timeouts import timed_wait
+from eval_logging import get_logger
+
+log = get_logger("auto_login")
+
+SEP_LOGIN_URL = "https://sep.ucas.ac.cn/"
+CREDENTIALS_FILE = "credentials.json"
+KEYRING_SERVICE = "ucas-sep"
+
+# 登录页元素（sep 登录表单）
+USERNAME_LOCATOR = (By.NAME, "userName")
+PASSWORD_LOCATOR = (By.NAME, "pwd")
+CERTCODE_LOCATOR = (By.NAME, "certCode")
+CERTCODE_IMAGE_LOCATOR = (By.ID, "code")
+SUBMIT_LOCATOR = (By.ID, "sb")
+LOGIN_ERROR_XPATH = "//*[contains(@class, 'alert-error') or contains(@class, 'alert-danger') or @id='errorInfo']"
+
+
+def load_credentials():
+    """
+    按优先级读取登录凭据：
+    1. 环境变量 UCAS_USERNAME / UCAS_PASSWORD
+    2. keyring（如已安装，服务名 ucas-sep，用户名取自 UCAS_USERNAME 或密钥文件）
+    3. 本地密钥文件 ~/.ucas_eval/credentials.json（需为仅本人可读）
+    返回 (username, password)，未配置时返回 None
+    """
+    username = os.environ.get("UCAS_USERNAME", "").strip()
+    password = os.environ.get("UCAS_PASSWORD", "")
+    if username and password:
+        return username, password
+
+    path = os.environ.get("UCAS_CREDENTIALS_FILE") or state_path(CREDENTIALS_FILE)
+    file_data = {}
+    if os.path.exists(path):
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+            if os.name == "posix" and mode & (stat.S_IRWXG | stat.S_IRWXO):
+                log.warning(f"⚠️ 密钥文件 {path} 权限过宽（{oct(mode)}），请执行 chmod 600")
+            with open(path, "r", encoding="utf-8") as f:
+                file_data = json.load(f) or {}
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ 读取密钥文件失败: {e}")
+
+    username = username or str(file_data.get("username", "")).strip()
+    if not username:
+        return None
+
+    if not password:
+        try:
+            import keyring
+            password = keyring.get_password(KEYRING_SERVICE, username) or ""
+        except ImportError:
+            pass
+        except Exception as e:
+            log.warning(f"⚠️ 读取 keyring 失败: {e}")
+    password = password or file_data.get("password", "")
+    return (username, password) if password else None
+
+
+def is_logged_in(driver):
+    """判断当前是否已处于 sep 登录后的页面"""
+    url = driver.current_url.lower()
+    if "sep.ucas.ac.cn" not in url or driver.find_elements(*USERNAME_LOCATOR):
+        return False
+    if "appstore" in url or "portal" in url:
+        return True
+    return bool(driver.find_elements(By.XPATH, "//a[contains(@href, 'logout')]"))
+
+
+def auto_login(driver, credentials=None, solve_captcha=None, login_url=SEP_LOGIN_URL, max_attempts=3):
+    """
+    自动登录 sep。solve_captcha(driver, image_element) 返回验证码文本，
+    与评估页面使用同一套识别后端。成功进入首页返回 True，否则返回 False（调用方转人工登录）
+    """
+    credentials = credentials or load_credentials()
+    if not credentials:
+        return False
+    username, password = credentials
+
+    log.info(f"🔐 正在自动登录: {username}")
+    backend = create_backend(driver)
+    backend.navigate(login_url)
+    if is_logged_in(driver):
+        log.info("✅ 已处于登录状态")
+        return True
+
+    wait = WebDriverWait(driver, 10)
+    for attempt in range(max_attempts):
+        try:
+            username_input = wait.until(EC.presence_of_element_located(USERNAME_LOCATOR))
+            password_input = driver.find_element(*PASSWORD_LOCATOR)
+            username_input.clear()
+            username_input.send_keys(username)
+            password_input.clear()
+            password_input.send_keys(password)
+
+            # 登录验证码并非每次都出现
+            captcha_inputs = [e for e in driver.find_elements(*CERTCODE_LOCATOR) if e.is_displayed()]
+            if captcha_inputs:
+                if not solve_captcha:
+                    log.warning("⚠️ 登录需要验证码但未配置识别API")
+                    return False
+                captcha_image = driver.find_element(*CERTCODE_IMAGE_LOCATOR)
+                code = solve_captcha(driver, captcha_image)
+                if not code:
+                    log.warning(f"⚠️ 登录验证码识别失败 ({attempt + 1}/{max_attempts})，刷新重试")
+                    backend.click(captcha_image)
+                    time.sleep(1)
+                    continue
+                captcha_inputs[0].clear()
+                captcha_inputs[0].send_keys(code)
+
+            backend.click(driver.find_element(*SUBMIT_LOCATOR))
+
+            try:
+                timed_wait("login_result", 10, lambda t: WebDriverWait(driver, t).until(
+                    lambda d: is_logged_in(d) or d.find_elements(By.XPATH, LOGIN_ERROR_XPATH)
+                ))
+            except TimeoutException:
+                pass
+
+            if is_logged_in(driver):
+                log.info("✅ 自动登录成功")
+                return True
+
+            errors = driver.find_elements(By.XPATH, LOGIN_ERROR_XPATH)
+            message = errors[0].text.strip() if errors else "未进入首页"
+            log.error(f"❌ 自动登录失败 ({attempt + 1}/{max_attempts}): {message}")
+            if "密码" in message or "用户" in message:
+                # 账号密码错误时重试只会触发锁定
+                return False
+            backend.navigate(login_url)
+
+        except (TimeoutException, NoSuchElementException) as e:
+            log.error(f"❌ 登录页面元素未找到: {e}")
+            return False
+        except Exception as e:
+            log.error(f"❌ 自动登录时出错: {e}")
+            return False
+
+    return False
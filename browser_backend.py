@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+浏览器后端
+功能：把工具用到的浏览器操作（导航、执行脚本、元素截图、Cookie、点击、网络事件）收拢到一个小接口后面，
+提供两种实现：
+- SeleniumBackend：经由 chromedriver 的经典 WebDriver HTTP 调用
+- CDPBackend：直接连接同一个 Chrome 的 DevTools websocket，省去 chromedriver 这一跳，并可订阅网络事件
+
+选择方式：环境变量 UCAS_EVAL_BACKEND=cdp（默认 selenium）。CDP 后端需要安装 websocket-client，
+不可用时自动退回 Selenium。两种后端都提供 execute_script/current_url，可直接传给 page_state 和 session_keeper。
+同一标签页的 DevTools 连接在表单之间复用，标签页切换（预取、回收）或连接断开后才重新连接
+
+元素参数（click、screenshot_element）既可以是 CSS 选择器，也可以是已定位到的 WebElement
+"""
+
+import base64
+import itertools
+import json
+import os
+import threading
+
+from eval_logging import get_logger
+
+log = get_logger("browser_backend")
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+# Selenium 的默认页面加载超时，navigate 结束后恢复，不影响登录、预取等不限时的导航
+SELENIUM_PAGE_LOAD_TIMEOUT = 300
+
+# 元素在文档中的位置（CSS像素，另给出滚动偏移），用于元素截图和原生点击；arguments[0] 为选择器或元素
+ELEMENT_RECT_SCRIPT = """
+const el = typeof arguments[0] === 'string' ? document.querySelector(arguments[0]) : arguments[0];
+if (!el) return null;
+if (arguments[1]) el.scrollIntoView({block: 'center', inline: 'nearest'});
+const r = el.getBoundingClientRect();
+return {x: r.left, y: r.top, width: r.width, height: r.height, scrollX: window.scrollX, scrollY: window.scrollY};
+"""
+
+
+class BrowserBackendError(Exception):
+    """后端操作失败（连接断开、脚本异常、超时、元素不存在等）"""
+
+
+class NavigationTimeout(BrowserBackendError):
+    """页面没有在给定时间内加载完成（已停止加载）"""
+
+
+class BrowserBackend:
+    """后端接口；execute_script 与 WebDriver 同名同义，便于现有代码直接使用"""
+
+    name = "base"
+
+    def navigate(self, url, timeout=None):
+        """打开 url 并等待加载完成；给定 timeout 时超时停止加载并抛出 NavigationTimeout"""
+        raise NotImplementedError
+
+    def evaluate(self, script, *args):
+        """执行函数体形式的脚本（可用 arguments[i] 和 return），返回可 JSON 序列化的结果"""
+        raise NotImplementedError
+
+    def execute_script(self, script, *args):
+        return self.evaluate(script, *args)
+
+    @property
+    def current_url(self):
+        return self.evaluate("return location.href")
+
+    def screenshot_element(self, target):
+        """返回元素截图的 PNG 字节"""
+        raise NotImplementedError
+
+    def get_cookies(self):
+        """返回 Cookie 列表，每项至少包含 name/value/domain/path"""
+        raise NotImplementedError
+
+    def set_cookies(self, cookies):
+        raise NotImplementedError
+
+    def click(self, target):
+        raise NotImplementedError
+
+    def on(self, event, callback):
+        """订阅 DevTools 事件（如 Network.responseReceived），callback 接收事件参数"""
+        raise BrowserBackendError(f"{self.name} 后端不支持事件订阅")
+
+    def close(self):
+        pass
+
+
+def _find(driver, target):
+    if not isinstance(target, str):
+        return target
+    from selenium.webdriver.common.by import By
+    return driver.find_element(By.CSS_SELECTOR, target)
+
+
+class SeleniumBackend(BrowserBackend):
+    """经典 WebDriver 实现：每个操作都是 Python → chromedriver → Chrome 的一次 HTTP 往返"""
+
+    name = "selenium"
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def navigate(self, url, timeout=None):
+        if timeout is None:
+            self.driver.get(url)
+            return
+        from selenium.common.exceptions import TimeoutException
+        self.driver.set_page_load_timeout(timeout)
+        try:
+            self.driver.get(url)
+        except TimeoutException:
+            try:
+                self.driver.execute_script("window.stop();")
+            except Exception:
+                pass
+            raise NavigationTimeout(f"页面加载超过 {timeout:.0f} 秒")
+        finally:
+            try:
+                self.driver.set_page_load_timeout(SELENIUM_PAGE_LOAD_TIMEOUT)
+            except Exception:
+                pass
+
+    def evaluate(self, script, *args):
+        return self.driver.execute_script(script, *args)
+
+    @property
+    def current_url(self):
+        return self.driver.current_url
+
+    def screenshot_element(self, target):
+        return _find(self.driver, target).screenshot_as_png
+
+    def get_cookies(self):
+        return self.driver.get_cookies()
+
+    def set_cookies(self, cookies):
+        for cookie in cookies:
+            self.driver.add_cookie(cookie)
+
+    def click(self, target):
+        _find(self.driver, target).click()
+
+
+class CDPBackend(BrowserBackend):
+    """
+    DevTools websocket 实现：后台线程读取消息，按 id 分发命令回复、按方法名分发事件。
+    attach(driver) 连接 chromedriver 所启动 Chrome 的当前标签页（窗口句柄即 DevTools 的 targetId），
+    与 Selenium 共用同一个页面；WebElement 参数的位置经由其所属 driver 查询，点击和截图本身走 DevTools
+    """
+
+    name = "cdp"
+
+    def __init__(self, ws_url, timeout=10, handle=None):
+        if websocket is None:
+            raise BrowserBackendError("CDP 后端需要安装 websocket-client")
+        try:
+            self.ws = websocket.create_connection(ws_url, timeout=timeout, suppress_origin=True)
+        except (websocket.WebSocketException, OSError) as e:
+            raise BrowserBackendError(f"连接 DevTools 失败: {e}")
+        self.ws.settimeout(None)
+        self.timeout = timeout
+        self.handle = handle
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._listeners = {}
+        self._enabled_domains = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_loop, name="cdp-reader", daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def attach(cls, driver, timeout=10):
+        address = (driver.capabilities.get("goog:chromeOptions") or {}).get("debuggerAddress")
+        if not address:
+            raise BrowserBackendError("浏览器未提供 DevTools 调试地址")
+        handle = driver.current_window_handle
+        return cls(f"ws://{address}/devtools/page/{handle}", timeout=timeout, handle=handle)
+
+    def send(self, method, params=None, timeout=None):
+        """发送一条 DevTools 命令并等待回复，返回 result 字段"""
+        msg_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._lock:
+            if self._closed:
+                raise BrowserBackendError("DevTools 连接已关闭")
+            self._pending[msg_id] = waiter
+        try:
+            self.ws.send(json.dumps({"id": msg_id, "method": method, "params": params or {}}))
+        except (websocket.WebSocketException, OSError) as e:
+            with self._lock:
+                self._pending.pop(msg_id, None)
+            raise BrowserBackendError(f"{method} 发送失败: {e}")
+        if not waiter[0].wait(timeout or self.timeout):
+            with self._lock:
+                self._pending.pop(msg_id, None)
+            raise BrowserBackendError(f"{method} 超时")
+        reply = waiter[1] or {"error": {"message": "DevTools 连接已断开"}}
+        if "error" in reply:
+            raise BrowserBackendError(f"{method}: {reply['error'].get('message')}")
+        return reply.get("result", {})
+
+    def _read_loop(self):
+        while not self._closed:
+            try:
+                message = json.loads(self.ws.recv())
+            except (websocket.WebSocketException, OSError, ValueError):
+                break
+            if "id" in message:
+                with self._lock:
+                    waiter = self._pending.pop(message["id"], None)
+                if waiter:
+                    waiter[1] = message
+                    waiter[0].set()
+                continue
+            for callback in list(self._listeners.get(message.get("method"), [])):
+                try:
+                    callback(message.get("params", {}))
+                except Exception as e:
+                    log.debug(f"DevTools 事件回调出错: {e}")
+        # 连接断开：唤醒所有等待中的命令
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for waiter in pending.values():
+            waiter[0].set()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _enable(self, domain):
+        if domain not in self._enabled_domains:
+            self.send(f"{domain}.enable")
+            self._enabled_domains.add(domain)
+
+    def on(self, event, callback):
+        self._enable(event.split(".", 1)[0])
+        self._listeners.setdefault(event, []).append(callback)
+
+    def off(self, event, callback):
+        listeners = self._listeners.get(event, [])
+        if callback in listeners:
+            listeners.remove(callback)
+
+    def navigate(self, url, timeout=None):
+        timeout = SELENIUM_PAGE_LOAD_TIMEOUT if timeout is None else timeout
+        loaded = threading.Event()
+
+        def on_load(params):
+            loaded.set()
+
+        self.on("Page.loadEventFired", on_load)
+        try:
+            result = self.send("Page.navigate", {"url": url})
+            if result.get("errorText"):
+                raise BrowserBackendError(f"导航失败: {result['errorText']}")
+            if not loaded.wait(timeout):
+                try:
+                    self.send("Page.stopLoading")
+                except BrowserBackendError:
+                    pass
+                raise NavigationTimeout(f"页面加载超过 {timeout:.0f} 秒")
+        finally:
+            self.off("Page.loadEventFired", on_load)
+
+    def evaluate(self, script, *args):
+        expression = f"(function() {{\n{script}\n}}).apply(null, {json.dumps(list(args))})"
+        result = self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True, "awaitPromise": True})
+        if result.get("exceptionDetails"):
+            details = result["exceptionDetails"]
+            raise BrowserBackendError((details.get("exception") or {}).get("description") or details.get("text"))
+        return result.get("result", {}).get("value")
+
+    def _rect(self, target):
+        """滚动到元素并返回其位置；WebElement 无法传进 DevTools，经由其所属 driver 查询"""
+        if isinstance(target, str):
+            rect = self.evaluate(ELEMENT_RECT_SCRIPT, target, True)
+        else:
+            rect = target.parent.execute_script(ELEMENT_RECT_SCRIPT, target, True)
+        if not rect:
+            raise BrowserBackendError(f"元素不存在: {target}")
+        return rect
+
+    def screenshot_element(self, target):
+        rect = self._rect(target)
+        clip = {"x": rect["x"] + rect["scrollX"], "y": rect["y"] + rect["scrollY"],
+                "width": rect["width"], "height": rect["height"], "scale": 1}
+        data = self.send("Page.captureScreenshot", {"format": "png", "clip": clip})["data"]
+        return base64.b64decode(data)
+
+    def get_cookies(self):
+        """所有域名的 Cookie（sep 和评估站点一次取全）"""
+        return self.send("Network.getAllCookies").get("cookies", [])
+
+    def set_cookies(self, cookies):
+        self.send("Network.setCookies", {"cookies": cookies})
+
+    def click(self, target):
+        """在元素中心派发原生鼠标事件，效果等同真实点击"""
+        rect = self._rect(target)
+        x, y = rect["x"] + rect["width"] / 2, rect["y"] + rect["height"] / 2
+        for event_type in ("mousePressed", "mouseReleased"):
+            self.send("Input.dispatchMouseEvent",
+                      {"type": event_type, "x": x, "y": y, "button": "left", "clickCount": 1})
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+_warned = set()
+# id(driver) -> 该 driver 当前在用的 CDP 后端
+_connections = {}
+
+
+def create_backend(driver, kind=None):
+    """
+    返回 driver 当前标签页的后端（传入的已经是后端时原样返回）。CDP 连接按 driver 缓存，
+    仍指向当前标签页且未断开时直接复用，否则关闭旧连接重新建立；CDP 不可用时退回 Selenium（每种原因只提示一次）
+    """
+    if isinstance(driver, BrowserBackend):
+        return driver
+    kind = (kind or os.environ.get("UCAS_EVAL_BACKEND") or "selenium").lower()
+    if kind == "cdp":
+        try:
+            cached = _connections.get(id(driver))
+            if cached and not cached.closed and cached.handle == driver.current_window_handle:
+                return cached
+            if cached:
+                cached.close()
+            _connections[id(driver)] = backend = CDPBackend.attach(driver)
+            return backend
+        except Exception as e:
+            reason = str(e)
+            if reason not in _warned:
+                _warned.add(reason)
+                log.warning(f"⚠️ CDP 后端不可用，使用 Selenium: {reason}")
+    return SeleniumBackend(driver)
+
+
+def close_backends():
+    """关闭所有缓存的 DevTools 连接，在退出浏览器前调用"""
+    for backend in _connections.values():
+        backend.close()
+    _connections.clear()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+验证码识别离线评测
+功能：把记录下来的验证码样本库逐一回放到各识别后端、预处理方案和上传编码，统计准确率、p50/p95延迟、上传大小和费用
+
+用法：
+    python captcha_bench.py                          # 评测全部后端 x 全部预处理方案（当前默认上传编码）
+    python captcha_bench.py -p gray_contrast binarize -n 50
+    python captcha_bench.py -p gray_contrast -e png compact binary   # 对比上传编码对准确率和延迟的影响
+样本库由评估脚本在 UCAS_EVAL_RECORD_CAPTCHA=1 时自动积累；评测使用临时状态目录和独立的熔断器，不影响真实运行的路由统计
+"""
+
+import argparse
+import base64
+import functools
+import os
+import shutil
+import tempfile
+import time
+
+from PIL import Image
+
+import eval_state
+from eval_state import state_path
+from captcha_dataset import load_dataset
+from captcha_image import PREPROCESSORS, ENCODINGS, DEFAULT_ENCODING, preprocess_captcha, encode_captcha
+from latency_stats import percentile
+from eval_logging import get_logger, prompt, flush_logs
+
+log = get_logger("captcha_bench")
+
+
+def load_backends():
+    """
+    识别后端：名称 -> (solve(api_key, image_base64) -> 文本, 用量统计对象)
+    每个 UCAS_EVAL_CAPTCHA_MODELS 中配置的模型一个后端，固定使用该模型，复用 captcha_flow 中的实现；
+    每个后端有自己的调用策略（熔断器、用量统计），评测用的路由器独立于运行时的 CAPTCHA_ROUTER。
+    需在切换临时状态目录之后加载
+    """
+    import captcha_flow
+    from captcha_policy import CaptchaAPIPolicy
+    from captcha_router import ModelRouter
+    router = ModelRouter()
+    backends = {}
+    for m in router.models:
+        policy = CaptchaAPIPolicy(name=m.name)
+        backends[m.name] = (functools.partial(captcha_flow.solve_captcha_with_zhipu_llm, model=m.name,
+                                              policy=policy, router=router), policy.meter)
+    return backends
+
+
+def use_temp_state():
+    """
+    路由统计、熔断状态等写到临时目录，评测不污染真实运行学到的数据；
+    验证码格式模型复制一份，流式请求的提前结束条件与真实运行一致
+    """
+    from captcha_validator import FORMAT_FILE
+    format_path = state_path(FORMAT_FILE)
+    eval_state.STATE_DIR = tempfile.mkdtemp(prefix="ucas_eval_captcha_bench_")
+    if os.path.exists(format_path):
+        shutil.copy(format_path, state_path(FORMAT_FILE))
+
+
+def run_benchmark(samples, backends, variants, api_key, encodings=(DEFAULT_ENCODING,)):
+    results = []
+    combos = [(v, e) for v in variants for e in encodings]
+    for backend_name, (solve, meter) in backends.items():
+        for variant, encoding in combos:
+            tokens_before, cost_before = meter.total_tokens + meter.estimated_tokens, meter.cost
+            latencies = []
+            payload_bytes = 0
+            exact = loose = answered = 0
+            for sample in samples:
+                payload = encode_captcha(preprocess_captcha(Image.open(sample["path"]), variant), encoding)
+                payload_bytes += len(payload)
+                image_base64 = base64.b64encode(payload).decode('utf-8')
+                started = time.monotonic()
+                answer = solve(api_key, image_base64)
+                latencies.append(time.monotonic() - started)
+                if answer:
+                    answered += 1
+                    exact += answer == sample["truth"]
+                    loose += answer.lower() == sample["truth"].lower()
+            count = len(samples) or 1
+            results.append({
+                "backend": backend_name, "variant": variant, "encoding": encoding, "samples": len(samples),
+                "bytes": payload_bytes / count,
+                "answered": answered / count, "accuracy": exact / count, "accuracy_nocase": loose / count,
+                "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                "tokens": meter.total_tokens + meter.estimated_tokens - tokens_before, "cost": meter.cost - cost_before,
+            })
+    return results
+
+
+def print_report(results):
+    log.info("")
+    log.info(f"{'后端':<10}{'预处理':<16}{'编码':<9}{'样本':>6}{'有答案':>8}{'准确率':>8}{'忽略大小写':>10}"
+             f"{'p50(s)':>9}{'p95(s)':>9}{'大小(B)':>9}{'tokens':>9}{'费用(¥)':>10}")
+    for r in results:
+        log.info(f"{r['backend']:<10}{r['variant']:<16}{r['encoding']:<9}{r['samples']:>6}{r['answered']:>8.1%}"
+                 f"{r['accuracy']:>8.1%}{r['accuracy_nocase']:>10.1%}{r['p50']:>9.2f}{r['p95']:>9.2f}"
+                 f"{r['bytes']:>9.0f}{r['tokens']:>9}{r['cost']:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="验证码识别离线评测")
+    parser.add_argument("-d", "--dataset", help="样本库目录，默认 ~/.ucas_eval/captcha_dataset")
+    parser.add_argument("-b", "--backends", nargs="*", help="只评测指定后端")
+    parser.add_argument("-p", "--preprocess", nargs="*", choices=sorted(PREPROCESSORS), help="只评测指定预处理方案")
+    parser.add_argument("-e", "--encoding", nargs="*", choices=sorted(ENCODINGS),
+                        help=f"评测的上传编码，默认只评测当前编码 {DEFAULT_ENCODING}")
+    parser.add_argument("-n", "--limit", type=int, help="最多使用最近的 N 个样本")
+    args = parser.parse_args()
+
+    samples = [s for s in load_dataset(args.dataset) if s.get("truth")]
+    if args.limit:
+        samples = samples[-args.limit:]
+    if not samples:
+        log.error("❌ 样本库中没有带真值的样本（需开启 UCAS_EVAL_RECORD_CAPTCHA=1 并成功提交过表单）")
+        flush_logs()
+        return
+
+    api_key = os.environ.get("ZHIPU_API_KEY", "").strip() or prompt("请输入智谱AI API密钥: ").strip()
+    use_temp_state()
+    backends = load_backends()
+    if args.backends:
+        backends = {name: backends[name] for name in args.backends if name in backends}
+    variants = args.preprocess or list(PREPROCESSORS)
+
+    encodings = args.encoding or [DEFAULT_ENCODING]
+
+    log.info(f"📊 使用 {len(samples)} 个样本评测 {len(backends)} 个后端 x {len(variants)} 种预处理 x {len(encodings)} 种编码")
+    print_report(run_benchmark(samples, backends, variants, api_key, encodings))
+    flush_logs()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+验证码样本记录
+功能：可选地保存每张识别过的验证码原图、识别结果以及提交是否成功，逐步积累带标注的离线样本库
+
+开启方式：环境变量 UCAS_EVAL_RECORD_CAPTCHA=1，样本保存在 ~/.ucas_eval/captcha_dataset/
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+
+from eval_state import state_path
+from eval_logging import get_logger
+
+log = get_logger("captcha_dataset")
+
+DATASET_DIR = "captcha_dataset"
+LABELS_FILE = "labels.jsonl"
+
+
+class CaptchaRecorder:
+    """
+    记录器：record() 保存原图和识别结果，label() 在提交后补记是否成功。
+    labels.jsonl 只追加写入，同一样本的多条记录以最后一条为准
+    """
+
+    def __init__(self, enabled=None, directory=None):
+        if enabled is None:
+            enabled = os.environ.get("UCAS_EVAL_RECORD_CAPTCHA", "").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.directory = directory or os.path.dirname(state_path(DATASET_DIR, LABELS_FILE))
+        self.last_sample_id = None
+        self._lock = threading.Lock()
+
+    def record(self, raw_png, answer, latency=None, source="", backend="glm-4v", preprocess="",
+               encoding="", payload_bytes=None, baseline_bytes=None):
+        """
+        保存一张验证码样本，返回样本ID（未开启时返回 None）。
+        payload_bytes 为实际上传的图片大小，baseline_bytes 为同一张图按 png 编码的大小，便于对比编码前后的延迟和准确率
+        """
+        if not self.enabled or not raw_png:
+            return None
+        sample_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        try:
+            with open(os.path.join(self.directory, f"{sample_id}.png"), "wb") as f:
+                f.write(raw_png)
+            self._append({
+                "id": sample_id, "answer": answer, "success": None, "latency": latency,
+                "source": source, "backend": backend, "preprocess": preprocess, "encoding": encoding,
+                "payload_bytes": payload_bytes, "baseline_bytes": baseline_bytes, "time": time.time(),
+            })
+        except OSError as e:
+            log.warning(f"⚠️ 保存验证码样本失败: {e}")
+            return None
+        self.last_sample_id = sample_id
+        return sample_id
+
+    def label(self, sample_id, success, truth=None):
+        """补记提交结果；提交成功时识别结果即为真值"""
+        if not self.enabled or not sample_id:
+            return
+        entry = {"id": sample_id, "success": bool(success)}
+        if truth is not None:
+            entry["truth"] = truth
+        try:
+            self._append(entry)
+        except OSError as e:
+            log.warning(f"⚠️ 更新验证码样本标注失败: {e}")
+
+    def label_last(self, success):
+        """给最近一次记录的样本补记提交结果"""
+        self.label(self.last_sample_id, success)
+        self.last_sample_id = None
+
+    def _append(self, entry):
+        with self._lock:
+            with open(os.path.join(self.directory, LABELS_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def load_dataset(directory=None):
+    """
+    读取样本库，返回样本列表（按时间排序）。每个样本包含 id/path/answer/success/truth 等字段；
+    truth 为人工标注或提交成功时的识别结果，无法确定真值时为 None
+    """
+    directory = directory or os.path.dirname(state_path(DATASET_DIR, LABELS_FILE))
+    samples = {}
+    labels_path = os.path.join(directory, LABELS_FILE)
+    if not os.path.exists(labels_path):
+        return []
+    with open(labels_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            samples.setdefault(entry["id"], {}).update(entry)
+
+    result = []
+    for sample_id, sample in samples.items():
+        path = os.path.join(directory, f"{sample_id}.png")
+        if not os.path.exists(path):
+            continue
+        sample["path"] = path
+        if sample.get("truth") is None:
+            sample["truth"] = sample.get("answer") if sample.get("success") else None
+        result.append(sample)
+    return sorted(result, key=lambda s: s.get("time", 0))
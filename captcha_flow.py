@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+验证码处理流程
+功能：两个评估脚本共用的验证码流水线——定位验证码元素、截图预处理、调用智谱视觉模型识别、
+格式校验、填入并保存、根据提示判断对错后重试，多次失败时转人工处理
+识别相关的状态（调用策略、模型路由、样本记录、格式模型、选择器缓存）在这里各只有一份，两个脚本和守护进程共享
+"""
+
+import base64
+import re
+import time
+from datetime import datetime, timedelta
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+from captcha_policy import CaptchaAPIPolicy, CaptchaAPIError
+from captcha_router import ModelRouter
+from zhipu_stream import STREAM_ENABLED, read_completion_stream, captcha_stop_condition
+from page_state import PageState, wait_for_state
+from browser_backend import create_backend
+from captcha_image import prepare_captcha_upload, DEFAULT_PREPROCESSOR, DEFAULT_ENCODING
+from captcha_pool import CAPTCHA_POOL
+from captcha_dataset import CaptchaRecorder
+from captcha_validator import CaptchaFormat
+from selector_resolver import SelectorResolver
+from form_deadline import FormDeadlineExceeded, budget, check_deadline
+from adaptive_timeouts import timed_wait
+from eval_logging import get_logger, prompt
+
+log = get_logger("captcha_flow")
+
+# 智谱API调用策略（重试、熔断、用量统计），整个运行期间共享
+CAPTCHA_POLICY = CaptchaAPIPolicy()
+
+# 验证码识别模型路由（UCAS_EVAL_CAPTCHA_MODELS 配置多个模型，按滚动统计的延迟和正确率选择）
+CAPTCHA_ROUTER = ModelRouter()
+
+# 验证码样本记录（UCAS_EVAL_RECORD_CAPTCHA=1 时开启）
+CAPTCHA_RECORDER = CaptchaRecorder()
+
+# 验证码格式模型（从成功提交中学习，用于提交前拦截低置信度答案）
+CAPTCHA_FORMAT = CaptchaFormat()
+
+# 页面元素选择器（selector_config.json，一次页面内调用解析，按表单模板缓存命中结果）
+SELECTOR_RESOLVER = SelectorResolver()
+
+MAX_ATTEMPTS = 3
+
+CAPTCHA_PROMPT = "图片里的验证码是什么？请只返回验证码的文本内容，不要包含任何其他说明和解释。"
+
+# 从模型回复中提取验证码，按顺序尝试
+CAPTCHA_PATTERNS = [
+    r'([a-zA-Z0-9]{3,6})$',  # 行末的3-6位字母数字组合
+    r'是([a-zA-Z0-9]{3,6})',  # "是"后面的验证码
+    r'码是([a-zA-Z0-9]{3,6})',  # "码是"后面的验证码
+    r'([a-zA-Z0-9]{3,6})',  # 任何3-6位字母数字组合
+]
+
+
+def generate_zhipu_token(apikey: str):
+    """生成智谱AI的JWT token"""
+    try:
+        api_key_part, secret = apikey.split(".", 1)
+    except Exception:
+        raise Exception("invalid apikey", apikey)
+
+    payload = {
+        "api_key": api_key_part,
+        "exp": int((datetime.now() + timedelta(days=1)).timestamp() * 1000),
+        "timestamp": int(datetime.now().timestamp() * 1000),
+    }
+
+    import jwt  # 首次调用API时才导入，不拖慢启动
+
+    return jwt.encode(
+        payload,
+        secret,
+        algorithm="HS256",
+        headers={"alg": "HS256", "sign_type": "SIGN"},
+    )
+
+
+def extract_captcha_text(content):
+    """从模型回复中提取验证码，提取不到时返回 None"""
+    for pattern in CAPTCHA_PATTERNS:
+        match = re.search(pattern, content)
+        if match:
+            return match.group(1)
+    # 正则没匹配到时，尝试简单的字母数字过滤
+    alnum_only = ''.join(filter(str.isalnum, content))
+    if 3 <= len(alnum_only) <= 6:
+        return alnum_only
+    return None
+
+
+def solve_captcha_with_zhipu_llm(api_key, image_base64, model=None, learned_format=True, policy=None, router=None):
+    """
+    使用智谱AI视觉模型识别验证码；默认由 CAPTCHA_ROUTER 按预期耗时选择模型，model 指定时直接使用该模型。
+    learned_format=False 时（登录页验证码）不按评估页学到的格式提前结束流式请求；
+    policy/router 默认为共享的 CAPTCHA_POLICY/CAPTCHA_ROUTER，离线评测传入自己的实例
+    """
+    policy = CAPTCHA_POLICY if policy is None else policy
+    router = CAPTCHA_ROUTER if router is None else router
+    if policy.is_open():
+        log.warning("⛔ 智谱API熔断中，跳过本次调用")
+        return None
+
+    try:
+        token = generate_zhipu_token(api_key)
+    except Exception as e:
+        log.error(f"❌ 生成智谱Token失败: {e}")
+        policy.trip(permanent=True)
+        return None
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}"
+    }
+
+    def _ask(captcha_model):
+        log.info(f"🤖 正在调用智谱AI ({captcha_model.name}) 识别验证码...")
+        payload = {
+            "model": captcha_model.name,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": CAPTCHA_PROMPT},
+                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}},
+                    ]
+                }
+            ],
+            "max_tokens": 20
+        }
+
+        def _post_completion():
+            import requests
+            if not STREAM_ENABLED:
+                response = requests.post(captcha_model.endpoint, headers=headers, json=payload, timeout=budget(20))
+                response.raise_for_status()
+                return response.json()
+            # 流式读取：出现符合格式的答案就断开，不等模型补充的说明文字
+            response = requests.post(captcha_model.endpoint, headers=headers, json=dict(payload, stream=True),
+                                     timeout=budget(20), stream=True)
+            response.raise_for_status()
+            stop = captcha_stop_condition(CAPTCHA_FORMAT) if learned_format else None
+            return read_completion_stream(response, stop=stop)
+
+        data = policy.call(_post_completion)
+        policy.record_usage(data.get('usage'))
+        content = data['choices'][0]['message']['content'].strip()
+        log.info(f"🤖 大模型原始返回: '{content}'")
+        if data.get("early_candidate"):
+            return data["early_candidate"]
+        return extract_captcha_text(content)
+
+    try:
+        # 由路由器选择模型（可对冲），指定 model 时直接使用该模型
+        captcha_text = router.solve(_ask, model=model)
+        if captcha_text:
+            log.info(f"🎯 提取的验证码: '{captcha_text}'")
+            return captcha_text
+        log.warning("⚠️ 无法从返回内容中提取验证码")
+        policy.record_parse_failure()
+        return None
+
+    except CaptchaAPIError as e:
+        log.error(f"❌ 调用智谱API失败 [{e.kind}]: {e}")
+    except (KeyError, IndexError, TypeError) as e:
+        log.error(f"❌ 解析API响应失败，格式可能不正确: {e}")
+        policy.record_parse_failure()
+    except Exception as e:
+        log.error(f"❌ 调用智谱API时发生未知错误: {e}")
+
+    return None
+
+
+def find_captcha_elements(driver):
+    """验证码元素定位：一次页面内调用按优先级解析 selector_config.json 中的候选选择器"""
+    log.info("🔍 正在定位验证码元素...")
+    found = SELECTOR_RESOLVER.resolve(driver, ("captcha_input", "captcha_image"))
+    captcha_input, input_selector = found["captcha_input"]
+    captcha_image, image_selector = found["captcha_image"]
+    if captcha_input:
+        log.info(f"✅ 找到验证码输入框: {input_selector[0]}='{input_selector[1]}'")
+    if captcha_image:
+        log.info(f"✅ 找到验证码图片: {image_selector[0]}='{image_selector[1]}'")
+    return captcha_input, captcha_image
+
+
+def _page_screenshot_box(driver, captcha_image):
+    """整页截图和验证码图片所在区域（设备像素），元素截图不可用时的退路"""
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", captcha_image)
+    time.sleep(0.5)
+    location, size = captcha_image.location, captcha_image.size
+    png = driver.get_screenshot_as_png()
+    pixel_ratio = driver.execute_script("return window.devicePixelRatio") or 1
+    box = (int(location['x'] * pixel_ratio), int(location['y'] * pixel_ratio),
+           int((location['x'] + size['width']) * pixel_ratio), int((location['y'] + size['height']) * pixel_ratio))
+    return png, box
+
+
+def get_captcha_solution(driver, captcha_image, zhipu_api_key, learned_format=True):
+    """
+    截取验证码图片、预处理后交给视觉模型识别，失败时返回 None；
+    格式模型只从评估页验证码学习，识别登录页验证码时传 learned_format=False
+    """
+    try:
+        # 元素截图经由浏览器后端（Selenium 一次往返；CDP 直接按元素区域截图）
+        try:
+            png, box = create_backend(driver).screenshot_element(captcha_image), None
+        except Exception as e:
+            log.warning(f"⚠️ 元素截图失败，改为整页截图后裁剪: {e}")
+            png, box = _page_screenshot_box(driver, captcha_image)
+
+        # 解码、裁剪、预处理（灰度 + 增强对比度）和上传编码都在共享进程池中完成，不占用驱动浏览器的线程
+        prepared = CAPTCHA_POOL.run(prepare_captcha_upload, png, box, DEFAULT_PREPROCESSOR, DEFAULT_ENCODING,
+                                    CAPTCHA_RECORDER.enabled)
+        if prepared is None:
+            log.error("❌ 验证码截图区域无效")
+            return None
+        payload, raw_png, baseline_bytes = prepared["payload"], prepared["raw_png"], prepared["baseline_bytes"]
+        image_base64 = base64.b64encode(payload).decode('utf-8')
+        log.info(f"📸 验证码图片预处理完成（{DEFAULT_ENCODING} 编码，上传 {len(payload)} 字节）")
+        started = time.monotonic()
+        answer = solve_captcha_with_zhipu_llm(zhipu_api_key, image_base64, learned_format=learned_format)
+        CAPTCHA_RECORDER.record(raw_png, answer, latency=time.monotonic() - started,
+                                source=driver.current_url, preprocess=DEFAULT_PREPROCESSOR,
+                                backend=CAPTCHA_ROUTER.last_model or "glm-4v", encoding=DEFAULT_ENCODING,
+                                payload_bytes=len(payload), baseline_bytes=baseline_bytes)
+        return answer
+
+    except Exception as e:
+        log.error(f"❌ 截图或预处理验证码时发生错误: {e}")
+        return None
+
+
+def _refresh_captcha(driver, captcha_image):
+    try:
+        create_backend(driver).click(captcha_image)
+        time.sleep(1)
+    except Exception as e:
+        log.error(f"❌ 刷新验证码失败: {e}")
+
+
+def _click_save(driver):
+    """点击保存并确认；按钮或确认对话框没出现时只记录日志，由后面的结果判断兜底"""
+    try:
+        log.info("🖱️ 点击保存按钮...")
+        # 保存按钮的候选选择器见 selector_config.json，一次调用解析
+        save_button, selector = SELECTOR_RESOLVER.resolve(driver, ("save_button",))["save_button"]
+        if not save_button:
+            raise NoSuchElementException("selector_config.json 中的选择器都无法找到'保存'按钮")
+        log.info(f"   ✅ 使用选择器找到按钮: {selector[1]}")
+        backend = create_backend(driver)
+        backend.click(save_button)
+
+        # 处理确认对话框
+        page = timed_wait("confirm_dialog", 5, lambda t: wait_for_state(
+            driver, {PageState.CONFIRM_DIALOG, PageState.ERROR}, timeout=t))
+        if page is None or page.state != PageState.CONFIRM_DIALOG:
+            raise TimeoutException("确认对话框未出现")
+        confirm_button = driver.find_element(By.XPATH, "//button[text()='确定']")
+        log.info("🖱️ 点击确认按钮...")
+        backend.click(confirm_button)
+    except (TimeoutException, NoSuchElementException):
+        log.info("ℹ️ 未找到保存或确认按钮")
+    except FormDeadlineExceeded:
+        raise
+    except Exception as e:
+        log.error(f"❌ 点击保存时出错: {e}")
+
+
+def _captcha_rejected(driver):
+    """等待保存结果：出现验证码错误提示时关闭提示并返回 True，没有错误提示（成功或已评估）时返回 False"""
+    try:
+        page = timed_wait("submit_result", 3, lambda t: wait_for_state(
+            driver,
+            lambda p: p.state in (PageState.ERROR, PageState.ALREADY_EVALUATED) or "成功" in p.message,
+            timeout=t,
+        ), expect_absence=True)
+        if page is None or page.state != PageState.ERROR or "验证码" not in page.message:
+            return False
+        log.error("❌ 验证码错误，准备重试...")
+
+        # 关闭错误对话框
+        error_confirm = timed_wait("error_dialog_button", 3, lambda t: WebDriverWait(driver, t).until(
+            EC.element_to_be_clickable((By.XPATH, "//div[contains(@class, 'messager-button')]//button[contains(text(),'确定')]"))), expect_absence=True)
+        create_backend(driver).click(error_confirm)
+        time.sleep(1)
+    except TimeoutException:
+        return False
+    return True
+
+
+def _hand_over(reason, instruction, on_submit, on_manual):
+    """转人工处理：on_manual 存在时交给调用方排队，否则阻塞等待用户"""
+    if on_submit:
+        on_submit()
+    if on_manual:
+        on_manual(reason)
+    else:
+        prompt(instruction)
+
+
+def solve_and_submit(driver, zhipu_api_key, on_submit=None, on_manual=None):
+    """
+    处理验证码并提交表单，返回是否已确认提交成功（页面没有验证码时直接返回 True）。
+    on_submit 在进入保存阶段时调用（用于预取下一个页面），on_manual(原因) 在需要人工处理时调用（不提供时阻塞等待用户）
+    """
+    check_deadline("验证码")
+    try:
+        captcha_input, captcha_image = find_captcha_elements(driver)
+
+        if captcha_input and captcha_image and zhipu_api_key:
+            for attempt in range(MAX_ATTEMPTS):
+                check_deadline(f"验证码第{attempt + 1}次")
+                log.info(f"\n🤖 ===== 验证码识别: 第 {attempt + 1}/{MAX_ATTEMPTS} 次 =====")
+
+                captcha_solution = get_captcha_solution(driver, captcha_image, zhipu_api_key)
+                if captcha_solution:
+                    captcha_solution, _ = CAPTCHA_FORMAT.gate(captcha_solution)
+
+                if not captcha_solution:
+                    if CAPTCHA_POLICY.is_open():
+                        log.warning("⛔ 智谱API当前不可用，直接转人工处理")
+                        break
+                    log.warning("⚠️ 验证码识别失败，刷新后重试...")
+                    _refresh_captcha(driver, captcha_image)
+                    continue
+
+                # 填写验证码
+                log.info(f"✍️ 正在填入验证码: '{captcha_solution}'")
+                try:
+                    driver.execute_script("arguments[0].value = arguments[1];", captcha_input, captcha_solution)
+                    time.sleep(0.5)
+
+                    # 验证填写结果
+                    filled_value = captcha_input.get_attribute('value')
+                    log.info(f"🕵️ 验证填写结果: '{filled_value}'")
+                    if filled_value != captcha_solution:
+                        log.error("❌ 填写失败或被清空，刷新重试")
+                        _refresh_captcha(driver, captcha_image)
+                        continue
+                except Exception as e:
+                    log.error(f"❌ 填写验证码时出错: {e}")
+                    continue
+
+                # 进入保存阶段：趁等待确认对话框和结果提示的时间在后台预取下一个页面
+                if on_submit:
+                    on_submit()
+                _click_save(driver)
+
+                # 检查是否有验证码错误提示（出现"成功"提示或已评估页面时提前结束等待）
+                if _captcha_rejected(driver):
+                    CAPTCHA_RECORDER.label_last(False)
+                    CAPTCHA_ROUTER.label_last(False)
+                    _refresh_captcha(driver, captcha_image)
+                    continue
+
+                log.info("✅ 验证码提交成功！")
+                CAPTCHA_RECORDER.label_last(True)
+                CAPTCHA_ROUTER.label_last(True)
+                CAPTCHA_FORMAT.learn(captcha_solution)
+                return True
+
+            log.error("❌ 多次尝试失败，需要手动处理")
+            _hand_over("验证码多次识别失败", "请手动完成验证码输入并提交，完成后按回车...", on_submit, on_manual)
+            return False
+
+        if captcha_input:
+            log.warning("⚠️ 发现验证码但未配置API，请手动输入")
+            _hand_over("未配置验证码API", "请手动输入验证码并提交，完成后按回车...", on_submit, on_manual)
+            return False
+
+        log.info("✅ 未发现验证码")
+        return True
+
+    except FormDeadlineExceeded:
+        raise
+    except Exception as e:
+        log.info(f"ℹ️ 验证码处理时出错: {e}")
+        return False
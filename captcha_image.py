@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+验证码图片预处理
+功能：集中维护验证码图片的预处理方案和上传编码，评估脚本与离线评测共用同一套实现
+PIL 在第一次处理图片时才导入，不拖慢脚本启动
+
+上传编码（环境变量 UCAS_EVAL_CAPTCHA_ENCODING，默认 compact）：
+- png：预处理结果原样编码（HiDPI 屏幕上是 2~3 倍大小的全分辨率灰度图）
+- compact：缩放到固定高度 + 16 级灰度调色板（4 位 PNG）
+- binary：缩放到固定高度 + 1 位黑白
+"""
+
+import base64
+import io
+import os
+
+
+def _gray_contrast(im):
+    """评估脚本一直使用的方案：灰度 + 对比度x2"""
+    from PIL import ImageEnhance
+    return ImageEnhance.Contrast(im.convert('L')).enhance(2)
+
+
+def _binarize(im, threshold=140):
+    from PIL import ImageOps
+    gray = ImageOps.autocontrast(im.convert('L'))
+    return gray.point(lambda p: 255 if p > threshold else 0, mode='1')
+
+
+def _upscale_gray(im):
+    from PIL import Image
+    gray = _gray_contrast(im)
+    return gray.resize((gray.width * 2, gray.height * 2), Image.LANCZOS)
+
+
+PREPROCESSORS = {
+    "raw": lambda im: im.convert('RGB'),
+    "gray_contrast": _gray_contrast,
+    "binarize": _binarize,
+    "upscale_gray": _upscale_gray,
+}
+
+DEFAULT_PREPROCESSOR = "gray_contrast"
+
+
+def warm_up():
+    """预先导入预处理和编码用到的 PIL 模块（验证码进程池的子进程启动时调用）；未安装 PIL 时什么都不做"""
+    import importlib
+    for name in ("PIL.Image", "PIL.ImageEnhance", "PIL.ImageOps"):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            return
+
+
+def preprocess_captcha(im, variant=DEFAULT_PREPROCESSOR):
+    """按指定方案预处理验证码图片"""
+    return PREPROCESSORS[variant](im)
+
+
+def load_png(data):
+    """把截图字节解码为 PIL 图片"""
+    from PIL import Image
+    return Image.open(io.BytesIO(data))
+
+
+def image_to_png_bytes(im, **options):
+    buffer = io.BytesIO()
+    im.save(buffer, format="PNG", **options)
+    return buffer.getvalue()
+
+
+def image_to_base64_png(im):
+    return base64.b64encode(image_to_png_bytes(im)).decode('utf-8')
+
+
+# 上传给视觉模型的固定高度（像素）：4 个字符的验证码在这个高度上仍清晰可辨
+UPLOAD_HEIGHT = 40
+
+
+def _fit_height(im, height=UPLOAD_HEIGHT):
+    """缩放到固定高度（保持宽高比），只缩小不放大"""
+    if im.height <= height:
+        return im
+    from PIL import Image
+    width = max(1, round(im.width * height / im.height))
+    return im.resize((width, height), Image.LANCZOS)
+
+
+def _encode_compact(im):
+    gray = _fit_height(im.convert('L'))
+    return image_to_png_bytes(gray.quantize(colors=16), optimize=True, bits=4)
+
+
+def _encode_binary(im, threshold=140):
+    from PIL import ImageOps
+    gray = ImageOps.autocontrast(_fit_height(im.convert('L')))
+    return image_to_png_bytes(gray.point(lambda p: 255 if p > threshold else 0, mode='1'), optimize=True)
+
+
+ENCODINGS = {
+    "png": image_to_png_bytes,
+    "compact": _encode_compact,
+    "binary": _encode_binary,
+}
+
+DEFAULT_ENCODING = os.environ.get("UCAS_EVAL_CAPTCHA_ENCODING", "compact")
+if DEFAULT_ENCODING not in ENCODINGS:
+    DEFAULT_ENCODING = "compact"
+
+
+def encode_captcha(im, encoding=DEFAULT_ENCODING):
+    """按上传编码把（已预处理的）验证码图片编码为 PNG 字节"""
+    return ENCODINGS[encoding](im)
+
+
+def prepare_captcha_upload(screenshot_png, box=None, variant=DEFAULT_PREPROCESSOR, encoding=DEFAULT_ENCODING,
+                           keep_raw=False):
+    """
+    截图字节 -> 上传数据，整个 CPU 密集流程（解码、裁剪、预处理、编码）在一个函数里完成，可直接交给进程池。
+    box 为设备像素下的 (left, top, right, bottom)，会被限制在图片范围内；裁剪区域无效时返回 None。
+    返回 {"payload": 上传的PNG字节, "raw_png": 裁剪后的原图（keep_raw 时）, "baseline_bytes": 按 png 编码的大小（keep_raw 时）}
+    """
+    im = load_png(screenshot_png)
+    if box is not None:
+        width, height = im.size
+        left, top = max(0, min(box[0], width)), max(0, min(box[1], height))
+        right, bottom = max(left, min(box[2], width)), max(top, min(box[3], height))
+        if right - left <= 0 or bottom - top <= 0:
+            return None
+        im = im.crop((left, top, right, bottom))
+    processed = preprocess_captcha(im, variant)
+    return {
+        "payload": encode_captcha(processed, encoding),
+        "raw_png": image_to_png_bytes(im) if keep_raw else None,
+        "baseline_bytes": len(image_to_png_bytes(processed)) if keep_raw else None,
+    }
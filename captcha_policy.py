@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+验证码API调用策略层
+功能：错误分类、带抖动的指数退避重试、熔断器以及单次运行的token/费用统计
+"""
+
+import os
+import random
+import threading
+import time
+
+from form_deadline import current_deadline
+from eval_logging import get_logger
+
+log = get_logger("captcha_policy")
+
+
+class CaptchaAPIError(Exception):
+    """验证码API调用错误基类，kind 为错误类别，transient 表示是否值得重试"""
+    kind = "unknown"
+    transient = False
+
+
+class CaptchaTimeoutError(CaptchaAPIError):
+    kind = "timeout"
+    transient = True
+
+
+class CaptchaNetworkError(CaptchaAPIError):
+    kind = "network"
+    transient = True
+
+
+class CaptchaServerError(CaptchaAPIError):
+    kind = "server"
+    transient = True
+
+
+class CaptchaAuthError(CaptchaAPIError):
+    kind = "auth"
+
+
+class CaptchaQuotaError(CaptchaAPIError):
+    """配额错误：限流可重试，余额耗尽不可重试"""
+    kind = "quota"
+
+    def __init__(self, message, transient=True):
+        super().__init__(message)
+        self.transient = transient
+
+
+class CaptchaParseError(CaptchaAPIError):
+    kind = "parse"
+
+
+# 智谱余额不足/欠费相关的业务错误码，出现后重试没有意义
+ZHIPU_QUOTA_EXHAUSTED_CODES = {"1113", "1112"}
+
+
+def classify_request_error(exc):
+    """将 requests 抛出的异常映射为 CaptchaAPIError 子类"""
+    if isinstance(exc, CaptchaAPIError):
+        return exc
+    import requests  # 只有调用过API才会走到这里，此时 requests 早已导入
+
+    if isinstance(exc, requests.exceptions.Timeout):
+        return CaptchaTimeoutError(f"请求超时: {exc}")
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status in (401, 403):
+            return CaptchaAuthError(f"鉴权失败 (HTTP {status})")
+        if status == 429:
+            code = ""
+            try:
+                code = str(exc.response.json().get("error", {}).get("code", ""))
+            except Exception:
+                pass
+            exhausted = code in ZHIPU_QUOTA_EXHAUSTED_CODES
+            return CaptchaQuotaError(f"配额受限 (HTTP 429, code={code or '-'})", transient=not exhausted)
+        if status >= 500:
+            return CaptchaServerError(f"服务端错误 (HTTP {status})")
+        return CaptchaAPIError(f"HTTP {status}: {exc}")
+    if isinstance(exc, requests.exceptions.RequestException):
+        return CaptchaNetworkError(f"网络错误: {exc}")
+    if isinstance(exc, (KeyError, IndexError, ValueError, TypeError)):
+        return CaptchaParseError(f"响应解析失败: {exc}")
+    return CaptchaAPIError(str(exc))
+
+
+class CircuitBreaker:
+    """
+    简单熔断器：连续失败达到阈值后打开，冷却期内直接拒绝请求；
+    冷却结束后进入半开状态，同一时间只放行一次试探请求，试探结果决定关闭还是重新打开。
+    试探请求超过 reset_timeout 仍未回报结果（如调用方异常退出）时视为丢失，允许下一次试探。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = None
+        self.permanent = False
+        self._lock = threading.Lock()
+
+    def _probe_available(self, now):
+        """调用方需持有锁"""
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        if self.state == self.HALF_OPEN:
+            return self.probe_started_at is None or now - self.probe_started_at >= self.reset_timeout
+        return False
+
+    def allow_request(self):
+        """是否放行本次请求；半开状态下放行即占用唯一的试探名额"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.permanent:
+                return False
+            now = time.monotonic()
+            if not self._probe_available(now):
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_started_at = now
+            return True
+
+    def is_open(self):
+        """当前请求是否会被拒绝（只查询，不改变状态，也不占用试探名额）"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            return self.permanent or not self._probe_available(time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self):
+        """试探请求结束但不说明API是否健康（如响应解析失败），释放试探名额"""
+        with self._lock:
+            self.probe_started_at = None
+
+    def trip(self, permanent=False):
+        """立即打开熔断器，permanent=True 时本次运行内不再恢复（如鉴权失败）"""
+        with self._lock:
+            self.permanent = self.permanent or permanent
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started_at = None
+
+
+class UsageMeter:
+    """
+    单次运行内的调用次数、token 用量与费用统计。
+    流式请求提前结束时接口不返回用量，这些调用按已计量调用的平均用量估算，汇总中单独标出
+    """
+
+    def __init__(self, price_per_1k_tokens=None):
+        if price_per_1k_tokens is None:
+            price_per_1k_tokens = float(os.environ.get("ZHIPU_PRICE_PER_1K_TOKENS", "0.05"))
+        self.price_per_1k_tokens = price_per_1k_tokens
+        self.calls = 0
+        self.unmetered_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record_usage(self, usage):
+        with self._lock:
+            self.calls += 1
+            if usage:
+                self.prompt_tokens += int(usage.get("prompt_tokens", 0) or 0)
+                self.completion_tokens += int(usage.get("completion_tokens", 0) or 0)
+            else:
+                self.unmetered_calls += 1
+
+    def record_error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    @property
+    def total_tokens(self):
+        """接口实际返回的用量"""
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def estimated_tokens(self):
+        """未返回用量的调用按已计量调用的平均值估算；还没有已计量调用时无法估算，记为 0"""
+        metered = self.calls - self.unmetered_calls
+        if not metered or not self.unmetered_calls:
+            return 0
+        return round(self.total_tokens / metered * self.unmetered_calls)
+
+    @property
+    def cost(self):
+        return (self.total_tokens + self.estimated_tokens) / 1000 * self.price_per_1k_tokens
+
+    def summary(self):
+        errors = ", ".join(f"{k}={v}" for k, v in sorted(self.errors.items())) or "无"
+        estimated = (f", 其中 {self.unmetered_calls} 次未返回用量（流式提前结束），按平均值估算约 {self.estimated_tokens} token"
+                     if self.unmetered_calls else "")
+        return (f"调用 {self.calls} 次, token {self.total_tokens} "
+                f"(输入 {self.prompt_tokens} / 输出 {self.completion_tokens}){estimated}, "
+                f"预估费用 ¥{self.cost:.4f}, 错误: {errors}")
+
+
+class CaptchaAPIPolicy:
+    """
+    包装一次API调用：瞬时错误按带抖动的指数退避重试，
+    不可恢复错误立即熔断，熔断期间调用方应直接转入备用方案或人工处理。
+    """
+
+    def __init__(self, max_retries=2, base_delay=0.5, max_delay=4.0,
+                 breaker=None, meter=None, name="智谱API"):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.meter = meter or UsageMeter()
+
+    def allow_request(self):
+        return self.breaker.allow_request()
+
+    def is_open(self):
+        return self.breaker.is_open()
+
+    def backoff_delay(self, retry):
+        """full jitter：在 [0, min(max_delay, base * 2^retry)] 之间均匀取值"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+    def call(self, func, *args, **kwargs):
+        """执行 func，失败时抛出分类后的 CaptchaAPIError"""
+        retry = 0
+        while True:
+            if not self.breaker.allow_request():
+                raise CaptchaAPIError("熔断器已打开，跳过API调用")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                error = classify_request_error(exc)
+                self.meter.record_error(error.kind)
+                if isinstance(error, CaptchaAuthError) or (
+                        isinstance(error, CaptchaQuotaError) and not error.transient):
+                    self.breaker.trip(permanent=True)
+                    raise error from exc
+                if isinstance(error, CaptchaParseError):
+                    self.breaker.release_probe()
+                    raise error from exc
+                self.breaker.record_failure()
+                if not error.transient or retry >= self.max_retries or self.breaker.is_open():
+                    raise error from exc
+                delay = self.backoff_delay(retry)
+                deadline = current_deadline()
+                if deadline and delay >= deadline.remaining():
+                    # 表单时间预算不够再等一轮，交给调用方按失败处理
+                    raise error from exc
+                log.warning(f"⏳ 智谱API {error.kind} 错误，{delay:.2f}s 后重试 ({retry + 1}/{self.max_retries})")
+                time.sleep(delay)
+                retry += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def record_usage(self, usage):
+        self.meter.record_usage(usage)
+
+    def record_parse_failure(self):
+        """模型有返回但无法提取验证码：API本身健康，不计入熔断"""
+        self.meter.record_error(CaptchaParseError.kind)
+
+    def trip(self, permanent=False):
+        self.breaker.trip(permanent=permanent)
+
+    def summary(self):
+        return f"{self.name}统计: {self.meter.summary()}，熔断器状态: {self.breaker.state}"
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+验证码图片处理进程池
+功能：把截图解码、裁剪、预处理和编码这些 CPU 密集的工作交给共享的进程池，
+驱动浏览器的线程只负责截图和收发请求，多个浏览器/标签页同时识别验证码时不再争抢 GIL
+
+- 进程数：环境变量 UCAS_EVAL_CAPTCHA_WORKERS，默认 0，即在调用线程中直接处理——
+  现有脚本和守护进程都只驱动一个浏览器，同一时刻只有一张验证码，单张图片的处理远比启动子进程快
+- 配置了进程数时，也要等第一次出现两个调用方同时处理验证码才创建进程池，之前仍在调用线程中处理
+- 排队上限为进程数的 2 倍，超出时提交方阻塞等待，不会无限堆积截图字节
+- 进程意外退出时自动退回当前线程处理
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from eval_logging import get_logger
+
+log = get_logger("captcha_pool")
+
+
+def _warm_worker():
+    """子进程启动时预先导入 PIL，第一张验证码不用再等"""
+    from captcha_image import warm_up
+    warm_up()
+
+
+def default_workers():
+    try:
+        return max(0, int(os.environ.get("UCAS_EVAL_CAPTCHA_WORKERS", 0)))
+    except ValueError:
+        return 0
+
+
+class CaptchaWorkPool:
+    """
+    run(func, *args) 执行模块级函数并返回结果；有并发调用方时在进程池中执行，
+    参数和返回值需可 pickle（图片以字节传递）
+    """
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = default_workers() if workers is None else workers
+        self.max_pending = max_pending or max(1, self.workers * 2)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self.submitted = 0
+        self.inline = 0
+
+    def _get_executor(self, concurrent):
+        with self._lock:
+            if self._executor is None and self.workers > 0 and concurrent:
+                # spawn：父进程里有 Selenium、心跳等线程，fork 出的子进程可能继承到被占用的锁
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                     initializer=_warm_worker)
+                log.debug(f"验证码处理进程池已启动（{self.workers} 个进程）")
+            return self._executor
+
+    def run(self, func, *args):
+        with self._lock:
+            self._active += 1
+            concurrent = self._active > 1
+        try:
+            return self._run(concurrent, func, *args)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _run(self, concurrent, func, *args):
+        executor = self._get_executor(concurrent)
+        if executor is None:
+            self.inline += 1
+            return func(*args)
+        with self._slots:
+            try:
+                future = executor.submit(func, *args)
+                self.submitted += 1
+                return future.result()
+            except BrokenProcessPool as e:
+                log.warning(f"⚠️ 验证码处理进程池不可用，改在当前线程处理: {e}")
+                with self._lock:
+                    self.workers = 0
+                    self._executor = None
+        self.inline += 1
+        return func(*args)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 进程级共享实例：同一进程中的所有浏览器/脚本共用
+CAPTCHA_POOL = CaptchaWorkPool()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+验证码识别模型路由
+功能：支持配置多个视觉模型/接口地址，按滚动窗口统计每个模型的延迟和正确率，
+每张验证码发给"预期得到正确答案所需时间"最短的模型（平均延迟 / 正确率，答错要刷新重来）；
+可选对冲：首选模型超过其 p95 延迟仍未返回时，向次优模型再发一个请求，先得到答案者胜出
+
+配置：环境变量 UCAS_EVAL_CAPTCHA_MODELS，逗号分隔的模型名，可用 模型名@接口地址 指定其他兼容接口，
+默认只有 glm-4v；UCAS_EVAL_CAPTCHA_HEDGE=1 开启对冲。统计持久化到 ~/.ucas_eval/captcha_router.json
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+
+from eval_state import state_path, load_json, save_json
+from latency_stats import percentile
+from eval_logging import get_logger
+
+log = get_logger("captcha_router")
+
+ROUTER_FILE = "captcha_router.json"
+ZHIPU_CHAT_ENDPOINT = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+DEFAULT_MODELS = "glm-4v"
+
+# 没有延迟样本时假定的延迟（秒）
+PRIOR_LATENCY = 3.0
+# 每个模型至少先试这么多次再按统计排序，保证新加入的模型有机会被评估
+MIN_SAMPLES = 3
+# 至少有这么多延迟样本才用 p95 作为对冲阈值
+HEDGE_MIN_SAMPLES = 5
+
+
+class CaptchaModel:
+    def __init__(self, name, endpoint=ZHIPU_CHAT_ENDPOINT):
+        self.name = name
+        self.endpoint = endpoint
+
+    def __repr__(self):
+        return self.name
+
+
+def parse_models(spec):
+    """'glm-4v-flash, glm-4v@https://...' -> [CaptchaModel, ...]"""
+    models = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, endpoint = item.partition("@")
+        models.append(CaptchaModel(name.strip(), endpoint.strip() or ZHIPU_CHAT_ENDPOINT))
+    return models
+
+
+class ModelStats:
+    """一个模型的滚动统计：每次调用的耗时，以及答案是否被网站接受（1/0）"""
+
+    def __init__(self, window, latencies=(), outcomes=()):
+        self.latencies = deque(latencies, maxlen=window)
+        self.outcomes = deque(outcomes, maxlen=window)
+
+    def mean_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else PRIOR_LATENCY
+
+    def success_rate(self):
+        """拉普拉斯平滑，样本少时不会因为一两次失败就被判死刑"""
+        return (sum(self.outcomes) + 1) / (len(self.outcomes) + 2)
+
+    def expected_time(self):
+        return self.mean_latency() / self.success_rate()
+
+    def p95(self):
+        return percentile(list(self.latencies), 95) if len(self.latencies) >= HEDGE_MIN_SAMPLES else None
+
+    def to_dict(self):
+        return {"latencies": [round(v, 3) for v in self.latencies], "outcomes": list(self.outcomes)}
+
+
+class ModelRouter:
+    """
+    solve(ask) 选择模型并调用 ask(CaptchaModel)，ask 返回识别出的文本（无法提取时返回 None）或抛出异常；
+    提交结果出来后调用 label_last(是否正确)，计入上一次给出答案的模型
+    """
+
+    def __init__(self, models=None, window=50, hedge=None, path=None):
+        if models is None:
+            models = parse_models(os.environ.get("UCAS_EVAL_CAPTCHA_MODELS") or DEFAULT_MODELS)
+        self.models = models or parse_models(DEFAULT_MODELS)
+        if hedge is None:
+            hedge = os.environ.get("UCAS_EVAL_CAPTCHA_HEDGE", "").lower() in ("1", "true", "yes")
+        self.hedge = hedge
+        self.window = window
+        self.path = path or state_path(ROUTER_FILE)
+        saved = load_json(self.path, default={}) or {}
+        self.stats = {
+            m.name: ModelStats(window, saved.get(m.name, {}).get("latencies", ()), saved.get(m.name, {}).get("outcomes", ()))
+            for m in self.models
+        }
+        self.last_model = None
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def ranked(self):
+        """按预期耗时排序；样本不足 MIN_SAMPLES 的模型排在最前面先试"""
+        with self._lock:
+            return sorted(self.models, key=lambda m: (len(self.stats[m.name].outcomes) >= MIN_SAMPLES,
+                                                      self.stats[m.name].expected_time()))
+
+    def model(self, name):
+        for m in self.models:
+            if m.name == name:
+                return m
+        with self._lock:
+            self.stats.setdefault(name, ModelStats(self.window))
+        return CaptchaModel(name)
+
+    def solve(self, ask, model=None):
+        """返回识别出的文本或 None；model 指定时不做路由（离线评测用）"""
+        if model:
+            return self._finish(self._timed(ask, self.model(model)), model)
+        ranked = self.ranked()
+        primary = ranked[0]
+        threshold = self.stats[primary.name].p95() if self.hedge and len(ranked) > 1 else None
+        if threshold is None:
+            return self._finish(self._timed(ask, primary), primary.name)
+        return self._solve_hedged(ask, primary, ranked[1], threshold)
+
+    def _solve_hedged(self, ask, primary, backup, threshold):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="captcha-hedge")
+        # 复制上下文：子线程中的请求同样受当前表单时间预算约束，日志也带表单关联ID
+        first = self._executor.submit(contextvars.copy_context().run, self._timed, ask, primary)
+        try:
+            return self._finish(first.result(timeout=threshold), primary.name)
+        except FutureTimeout:
+            pass
+        log.info(f"⏱️ {primary.name} 超过 p95 {threshold:.2f}s 未返回，向 {backup.name} 发送对冲请求")
+        self.hedges += 1
+        second = self._executor.submit(contextvars.copy_context().run, self._timed, ask, backup)
+        futures = {first: primary.name, second: backup.name}
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if answer:
+                    # 落后的请求继续在后台完成，只用于统计延迟
+                    if future is second:
+                        self.hedge_wins += 1
+                    return self._finish(answer, futures[future])
+        if error:
+            raise error
+        return self._finish(None, primary.name)
+
+    def _timed(self, ask, model):
+        """调用一次并记录耗时；出错或没有答案立即记为失败，有答案的等 label_last() 确认"""
+        started = time.monotonic()
+        try:
+            answer = ask(model)
+        except Exception:
+            self._record(model.name, time.monotonic() - started, outcome=0)
+            raise
+        self._record(model.name, time.monotonic() - started, outcome=None if answer else 0)
+        return answer
+
+    def _finish(self, answer, name):
+        self.last_model = name if answer else None
+        return answer
+
+    def _record(self, name, latency, outcome=None):
+        with self._lock:
+            stats = self.stats.setdefault(name, ModelStats(self.window))
+            stats.latencies.append(latency)
+            if outcome is not None:
+                stats.outcomes.append(outcome)
+            data = {n: s.to_dict() for n, s in self.stats.items()}
+        self._save(data)
+
+    def label_last(self, correct):
+        """网站对上一次答案的判定（与 CaptchaRecorder.label_last 同时调用）"""
+        name, self.last_model = self.last_model, None
+        if not name:
+            return
+        with self._lock:
+            self.stats[name].outcomes.append(1 if correct else 0)
+            data = {n: s.to_dict() for n, s in self.stats.items()}
+        self._save(data)
+
+    def _save(self, data):
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            log.debug(f"保存模型路由统计失败: {e}")
+
+    def summary(self):
+        with self._lock:
+            parts = [f"{m.name} 均值{self.stats[m.name].mean_latency():.2f}s/正确率"
+                     f"{self.stats[m.name].success_rate():.0%}" for m in self.models]
+        hedged = f"，对冲 {self.hedges} 次（备用模型胜出 {self.hedge_wins} 次）" if self.hedges else ""
+        return f"验证码模型: {'；'.join(parts)}{hedged}"
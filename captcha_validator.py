@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+验证码答案置信度校验
+功能：从历史成功提交中学习验证码的真实格式（长度、字符集、大小写），在填入前给识别结果打分，
+低置信度的答案直接换图重识别，省去一次 保存 → 错误提示 → 刷新 的完整往返
+"""
+
+import threading
+
+from eval_state import state_path, load_json, save_json
+from eval_logging import get_logger
+
+log = get_logger("captcha_validator")
+
+FORMAT_FILE = "captcha_format.json"
+
+# 纯数字验证码中模型常见的误读
+DIGIT_CONFUSABLES = str.maketrans({"O": "0", "o": "0", "D": "0", "I": "1", "l": "1", "i": "1",
+                                   "Z": "2", "z": "2", "S": "5", "s": "5", "B": "8", "g": "9", "q": "9"})
+
+
+def char_class(ch):
+    if ch.isdigit():
+        return "digit"
+    if not ch.isalpha():
+        return "other"
+    return "upper" if ch.isupper() else "lower"
+
+
+class CaptchaFormat:
+    """
+    验证码格式模型：统计成功答案的长度分布和字符类别分布。
+    样本不足 min_samples 时不做拦截（score 恒为 1）
+    """
+
+    def __init__(self, min_samples=5, threshold=0.2, path=None):
+        self.min_samples = min_samples
+        self.threshold = threshold
+        self.path = path or state_path(FORMAT_FILE)
+        data = load_json(self.path, default={}) or {}
+        self.samples = data.get("samples", 0)
+        self.lengths = data.get("lengths", {})
+        self.classes = data.get("classes", {})
+        self._lock = threading.Lock()
+
+    @property
+    def trained(self):
+        return self.samples >= self.min_samples
+
+    @property
+    def expected_length(self):
+        """历史上最常见的答案长度，样本不足时为 None"""
+        if not self.trained or not self.lengths:
+            return None
+        return int(max(self.lengths, key=self.lengths.get))
+
+    def learn(self, answer):
+        """记录一个提交成功的答案"""
+        if not answer:
+            return
+        with self._lock:
+            self.samples += 1
+            key = str(len(answer))
+            self.lengths[key] = self.lengths.get(key, 0) + 1
+            for ch in answer:
+                cls = char_class(ch)
+                self.classes[cls] = self.classes.get(cls, 0) + 1
+            data = {"samples": self.samples, "lengths": self.lengths, "classes": self.classes}
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            log.warning(f"⚠️ 保存验证码格式统计失败: {e}")
+
+    def normalize(self, candidate):
+        """按已学到的格式规整大小写和易混字符"""
+        if not self.trained or not candidate:
+            return candidate
+        seen = {cls for cls, count in self.classes.items() if count}
+        if seen == {"digit"}:
+            return candidate.translate(DIGIT_CONFUSABLES)
+        if "upper" not in seen:
+            return candidate.lower()
+        if "lower" not in seen:
+            return candidate.upper()
+        return candidate
+
+    def score(self, candidate):
+        """
+        0~1 的置信度：长度得分 x 字符类别得分，均以历史中最常见的取值为基准做加一平滑
+        """
+        if not self.trained:
+            return 1.0
+        if not candidate:
+            return 0.0
+        max_length = max(self.lengths.values())
+        length_score = (self.lengths.get(str(len(candidate)), 0) + 1) / (max_length + 1)
+        max_class = max(self.classes.values())
+        class_score = min((self.classes.get(char_class(ch), 0) + 1) / (max_class + 1) for ch in candidate)
+        return length_score * class_score
+
+    def gate(self, candidate):
+        """
+        校验候选答案，返回 (可提交的答案或 None, 置信度)
+        """
+        if not candidate:
+            return None, 0.0
+        normalized = self.normalize(candidate)
+        confidence = self.score(normalized)
+        if normalized != candidate:
+            log.info(f"🔧 按历史格式规整验证码: '{candidate}' -> '{normalized}'")
+        if confidence < self.threshold:
+            log.warning(f"⚠️ 验证码 '{normalized}' 与历史格式不符（置信度 {confidence:.2f}），换图重新识别")
+            return None, confidence
+        return normalized, confidence
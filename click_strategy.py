@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+单选按钮点击策略学习
+功能：记住每种表单模板上实际点击成功的策略，之后的行和表单直接使用该策略，不再先滚动和等待可点击
+（ActionChains 的 move_to_element 会自行把元素滚入视口，JS 策略直接作用于 DOM），
+只有它失败时才回退到完整的 滚动 → 等待 → 逐个尝试 流程
+"""
+
+import threading
+
+from selenium.webdriver.common.action_chains import ActionChains
+
+from eval_state import state_path, load_json, save_json
+from eval_logging import get_logger
+
+log = get_logger("click_strategy")
+
+LEARNED_FILE = "click_strategy.json"
+
+# 按默认优先级排列：ActionChains 最接近真实用户操作，其次 JS 点击，最后强制设置 checked 并触发 change
+STRATEGIES = ("actions", "js_click", "force_checked")
+STRATEGY_NAMES = {"actions": "ActionChains 点击", "js_click": "JavaScript 点击", "force_checked": "强制设置"}
+
+# JS 策略在同一次调用里完成点击和结果检查，省去 sleep 和 is_selected() 往返
+JS_CLICK_SCRIPT = "arguments[0].click(); return arguments[0].checked;"
+FORCE_CHECKED_SCRIPT = ("arguments[0].checked = true; arguments[0].dispatchEvent(new Event('change'));"
+                        " return arguments[0].checked;")
+
+
+def try_click(driver, element, strategy):
+    """用指定策略点击，返回点击后是否已选中；出错视为失败"""
+    try:
+        if strategy == "actions":
+            # 原生点击是同步派发的，点击返回后 checked 状态已经更新，无需再等待
+            ActionChains(driver).move_to_element(element).click().perform()
+            return element.is_selected()
+        if strategy == "js_click":
+            return bool(driver.execute_script(JS_CLICK_SCRIPT, element))
+        if strategy == "force_checked":
+            return bool(driver.execute_script(FORCE_CHECKED_SCRIPT, element))
+    except Exception:
+        return False
+    return False
+
+
+class ClickStrategyLearner:
+    """
+    按表单模板记录首选策略：连续失败 max_misses 次后忘掉它，重新按默认优先级探索。
+    学习结果持久化到状态目录，跨运行复用
+    """
+
+    def __init__(self, max_misses=2, path=None):
+        self.max_misses = max_misses
+        self.path = path or state_path(LEARNED_FILE)
+        self.learned = load_json(self.path, default={}) or {}
+        self._lock = threading.Lock()
+
+    def preferred(self, template):
+        return self.learned.get(template, {}).get("strategy")
+
+    def order(self, template):
+        """完整流程中的尝试顺序：首选策略在前，其余保持默认优先级"""
+        preferred = self.preferred(template)
+        return ([preferred] if preferred in STRATEGIES else []) + [s for s in STRATEGIES if s != preferred]
+
+    def record(self, template, strategy, success):
+        with self._lock:
+            entry = self.learned.setdefault(template, {"strategy": None, "misses": 0, "wins": {}})
+            if success:
+                entry["wins"][strategy] = entry["wins"].get(strategy, 0) + 1
+                changed = entry["strategy"] != strategy or entry["misses"]
+                entry["strategy"], entry["misses"] = strategy, 0
+            elif strategy == entry["strategy"]:
+                entry["misses"] += 1
+                changed = True
+                if entry["misses"] >= self.max_misses:
+                    log.warning(f"⚠️ 已学到的点击策略（{STRATEGY_NAMES[strategy]}）连续失败，重新探索")
+                    entry["strategy"], entry["misses"] = None, 0
+            else:
+                changed = False
+            data = dict(self.learned)
+        # 成功计数每次都变，只有首选策略变化时才写盘，避免每行一次磁盘IO
+        if changed:
+            try:
+                save_json(self.path, data)
+            except OSError as e:
+                log.debug(f"保存点击策略失败: {e}")
+
+
+# 全局共享的学习器：只创建一份，避免多个实例互相覆盖同一个状态文件
+CLICK_STRATEGIES = ClickStrategyLearner()
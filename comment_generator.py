@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+评语生成模块
+功能：根据页面上的课程/教师名称，批量调用智谱大模型生成互不重复的评语，并按课程缓存
+"""
+
+import json
+import os
+import re
+import threading
+from html.parser import HTMLParser
+
+from eval_state import state_path, load_json, save_json
+from form_deadline import budget
+from captcha_policy import CaptchaAPIPolicy
+from eval_logging import get_logger
+
+log = get_logger("comment_generator")
+
+ZHIPU_CHAT_ENDPOINT = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+
+# 在页面中查找课程名/教师名的探针：优先匹配"课程名称""主讲教师"等标签后的单元格
+FORM_CONTEXT_SCRIPT = """
+const labels = {course: ['课程名称', '课程名', '课程'], teacher: ['主讲教师', '授课教师', '教师姓名', '教师', '老师']};
+const cells = Array.from(document.querySelectorAll('td, th, label, span, div.form-group'));
+function valueAfter(keys) {
+    for (const key of keys) {
+        for (const el of cells) {
+            const text = (el.textContent || '').trim();
+            if (!text.startsWith(key) || text.length > 60) continue;
+            const rest = text.slice(key.length).replace(/^[\\s:：]+/, '').trim();
+            if (rest) return rest;
+            const next = el.nextElementSibling;
+            if (next && next.textContent.trim()) return next.textContent.trim();
+        }
+    }
+    return '';
+}
+return {course: valueAfter(labels.course), teacher: valueAfter(labels.teacher),
+        textareas: document.querySelectorAll('textarea').length};
+"""
+
+CONTEXT_LABELS = {
+    "course": ("课程名称", "课程名", "课程"),
+    "teacher": ("主讲教师", "授课教师", "教师姓名", "教师", "老师"),
+}
+CONTEXT_TAGS = {"td", "th", "label", "span"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+def _clean(text, limit):
+    # 不回退到 document.title：未能提取课程名的表单标题都相同，会共用同一组评语
+    return " ".join((text or "").split())[:limit]
+
+
+def scrape_form_info(driver):
+    """从当前评估页面提取 (课程名, 教师名, 文本域数量)，失败时为空字符串/0"""
+    try:
+        info = driver.execute_script(FORM_CONTEXT_SCRIPT) or {}
+    except Exception as e:
+        log.warning(f"⚠️ 提取课程/教师信息失败: {e}")
+        info = {}
+    return _clean(info.get("course"), 40), _clean(info.get("teacher"), 20), int(info.get("textareas") or 0)
+
+
+def scrape_form_context(driver):
+    """从当前评估页面提取课程名和教师名，失败时返回空字符串"""
+    course, teacher, _ = scrape_form_info(driver)
+    return course, teacher
+
+
+class _ContextParser(HTMLParser):
+    """构建只含标签名/类名/文本的简易文档树，供 parse_form_context 按 FORM_CONTEXT_SCRIPT 的规则查找"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = {"tag": "", "cls": "", "text": [], "children": []}
+        self.stack = [self.root]
+        self.textareas = 0
+
+    def handle_starttag(self, tag, attrs):
+        node = {"tag": tag, "cls": dict(attrs).get("class") or "", "text": [], "children": []}
+        self.stack[-1]["children"].append(node)
+        if tag == "textarea":
+            self.textareas += 1
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i]["tag"] == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        if self.stack[-1]["tag"] in ("script", "style"):
+            return
+        for node in self.stack:
+            node["text"].append(data)
+
+
+def parse_form_context(html):
+    """
+    从评估页面的 HTML 中提取 (课程名, 教师名, 文本域数量)，规则与 FORM_CONTEXT_SCRIPT 相同，
+    用于在打开表单之前为整批待评估的页面预先登记评语
+    """
+    parser = _ContextParser()
+    parser.feed(html)
+    parser.close()
+    cells = []
+
+    def walk(node):
+        elements = node["children"]
+        for i, child in enumerate(elements):
+            if child["tag"] in CONTEXT_TAGS or (child["tag"] == "div" and "form-group" in child["cls"].split()):
+                following = elements[i + 1] if i + 1 < len(elements) else None
+                cells.append(("".join(child["text"]).strip(), "".join(following["text"]).strip() if following else ""))
+            walk(child)
+
+    walk(parser.root)
+
+    def value_after(keys):
+        for key in keys:
+            for text, following in cells:
+                if not text.startswith(key) or len(text) > 60:
+                    continue
+                rest = re.sub(r"^[\s:：]+", "", text[len(key):]).strip()
+                if rest:
+                    return rest
+                if following:
+                    return following
+        return ""
+
+    return (_clean(value_after(CONTEXT_LABELS["course"]), 40), _clean(value_after(CONTEXT_LABELS["teacher"]), 20),
+            parser.textareas)
+
+
+# 评语生成的API调用策略：与验证码识别各自熔断、各自统计用量，评语请求失败不会停掉验证码识别
+COMMENT_POLICY = CaptchaAPIPolicy(name="评语生成API")
+
+
+class CommentGenerator:
+    """
+    评语生成器：
+    - enqueue() 登记待生成的表单（课程、教师、文本域数量）
+    - prepare_batch() 在一批表单的第一个表单打开后，为整批表单登记并一次性生成评语
+    - comments_for() 返回某表单的评语；若缓存不足，会把所有待生成的表单合并成一次请求
+    - 结果按课程+教师缓存到本地，重复运行不再调用API
+    """
+
+    def __init__(self, api_key, token_func, policy=None, fallback_comments=None,
+                 model=None, cache_file="comment_cache.json"):
+        self.api_key = api_key
+        self.token_func = token_func
+        self.policy = policy
+        self.fallback_comments = list(fallback_comments or [])
+        self.model = model or os.environ.get("ZHIPU_COMMENT_MODEL", "glm-4-flash")
+        self.cache_path = state_path(cache_file)
+        self.cache = load_json(self.cache_path, default={}) or {}
+        self.pending = {}
+        self.used = {}
+        self.prepared_urls = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(course, teacher):
+        return f"{course}|{teacher}" if teacher else course
+
+    def enqueue(self, course, teacher, count):
+        """登记一个待生成评语的表单，已有足够缓存时忽略"""
+        key = self.cache_key(course, teacher)
+        with self._lock:
+            if len(self.cache.get(key, [])) >= count:
+                return
+            self.pending[key] = {"course": course, "teacher": teacher,
+                                 "count": max(count, self.pending.get(key, {}).get("count", 0))}
+
+    def prepare_batch(self, driver, fetch_page, urls):
+        """
+        登记当前页面和 urls 中尚未登记过的表单，然后合并为一次请求生成评语。
+        fetch_page(url) 返回页面 HTML（需带登录 Cookie），取不到时返回 None，该表单留到打开时再单独生成
+        """
+        if not self.api_key:
+            return
+        course, teacher, count = scrape_form_info(driver)
+        if course and count:
+            self.enqueue(course, teacher, count)
+        for url in urls:
+            if url in self.prepared_urls:
+                continue
+            self.prepared_urls.add(url)
+            html = fetch_page(url)
+            if not html:
+                continue
+            course, teacher, count = parse_form_context(html)
+            if course and count:
+                self.enqueue(course, teacher, count)
+        self.flush()
+
+    def comments_for(self, course, teacher, count):
+        """返回 count 条互不相同的评语，尽量使用缓存，必要时批量生成"""
+        key = self.cache_key(course, teacher)
+        if course and self.api_key and len(self.cache.get(key, [])) < count:
+            self.enqueue(course, teacher, count)
+            self.flush()
+
+        cached = list(self.cache.get(key, []))
+        # 同一课程可能被多次评估（课程评估+教师评估），轮换起点避免每次都是同一组
+        start = self.used.get(key, 0)
+        self.used[key] = start + count
+        rotated = cached[start % len(cached):] + cached[:start % len(cached)] if cached else []
+
+        comments = rotated[:count]
+        fallback_index = 0
+        while len(comments) < count and self.fallback_comments:
+            comments.append(self.fallback_comments[fallback_index % len(self.fallback_comments)])
+            fallback_index += 1
+        return comments
+
+    def flush(self):
+        """将所有待生成的表单合并为一次API请求"""
+        with self._lock:
+            batch = self.pending
+            self.pending = {}
+        if not batch:
+            return
+
+        log.info(f"💬 正在为 {len(batch)} 个表单批量生成评语...")
+        try:
+            if self.policy is not None:
+                data = self.policy.call(self._request, batch)
+                self.policy.record_usage(data.get("usage"))
+            else:
+                data = self._request(batch)
+            content = data["choices"][0]["message"]["content"]
+            generated = self._parse(content)
+        except Exception as e:
+            log.warning(f"⚠️ 批量生成评语失败，将使用默认评语: {e}")
+            return
+
+        with self._lock:
+            for key, item in batch.items():
+                texts = [t.strip() for t in generated.get(key, []) if isinstance(t, str) and t.strip()]
+                existing = self.cache.get(key, [])
+                self.cache[key] = existing + [t for t in dict.fromkeys(texts) if t not in existing]
+            try:
+                save_json(self.cache_path, self.cache)
+            except OSError as e:
+                log.warning(f"⚠️ 保存评语缓存失败: {e}")
+        log.info("✅ 评语生成完成")
+
+    def _request(self, batch):
+        forms = [{"id": key, "course": item["course"], "teacher": item["teacher"],
+                  "count": item["count"] + 1} for key, item in batch.items()]
+        prompt = (
+            "你是一名研究生，需要为以下课程评估表单撰写正面、具体、互不重复的中文评语。"
+            "每条评语30到60字，结合课程名称和教师姓名（如有），不要出现引号。"
+            "请严格只返回一个JSON对象，键为表单id，值为评语字符串数组，数组长度等于count。\n"
+            + json.dumps(forms, ensure_ascii=False)
+        )
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.token_func(self.api_key)}",
+        }
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": min(4000, 120 * sum(f["count"] for f in forms) + 200),
+        }
+        import requests  # 首次生成评语时才导入
+
+        response = requests.post(ZHIPU_CHAT_ENDPOINT, headers=headers, json=payload, timeout=budget(60))
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _parse(content):
+        """从模型返回中提取JSON对象（兼容```json代码块）"""
+        match = re.search(r"\{.*\}", content, re.S)
+        if not match:
+            raise ValueError(f"返回内容中没有JSON: {content[:100]}")
+        result = json.loads(match.group(0))
+        if not isinstance(result, dict):
+            raise ValueError("返回的JSON不是对象")
+        return result
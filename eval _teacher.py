@@ -1,34 +1,67 @@
+import os
 import time
 import random
-import base64
-import requests
-import jwt
-import io
-from PIL import Image, ImageEnhance
-from selenium import webdriver
+from collections import deque
+# 最先导入：启动计时从这里开始，重依赖在浏览器启动时后台预加载
+from fast_start import STARTUP, create_chrome, preload_in_background
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.action_chains import ActionChains
+from captcha_flow import (CAPTCHA_POLICY, CAPTCHA_ROUTER, generate_zhipu_token, find_captcha_elements,
+                          get_captcha_solution, solve_and_submit)
+from comment_generator import CommentGenerator, COMMENT_POLICY, scrape_form_context
+from auto_login import auto_login
+from session_keeper import SessionManager
+from page_state import PageState, classify_page, wait_for_state
+from captcha_pool import CAPTCHA_POOL
+from artifact_writer import ArtifactWriter, form_id_from_url
+from resource_watchdog import ResourceWatchdog
+from selector_resolver import form_template
+from click_strategy import CLICK_STRATEGIES, try_click, STRATEGY_NAMES
+from page_prefetcher import PagePrefetcher
+from browser_backend import create_backend, close_backends
+from manual_queue import ManualQueue
+from form_deadline import (FormDeadlineExceeded, start_form_deadline, clear_form_deadline,
+                           check_deadline, navigate_within_budget)
+from adaptive_timeouts import ADAPTIVE_TIMEOUTS, timed_wait
+from form_fixtures import FixtureRecorder
+from eval_logging import get_logger, set_form_id, prompt, flush_logs, SUMMARY
+
+log = get_logger("eval_teacher")
+
+# 表单回归样本记录（UCAS_EVAL_RECORD_FIXTURES=1 时开启）
+FIXTURE_RECORDER = FixtureRecorder()
+
+# 失败现场（标注截图 + DOM快照）后台写入器
+ARTIFACT_WRITER = ArtifactWriter()
+
+# 默认评语（未配置API或生成失败时随机选用）
+DEFAULT_COMMENTS = [
+    "老师教学认真负责，课程内容丰富，讲解清晰老师治学严谨，教学内容充实。aaaa。",
+    "老师专业水平高，备课充分，课程质量很高。老师治学严谨，教学内容充实。aaaa",
+    "课程安排合理，老师耐心解答问题。老师治学严谨，教学内容充实。aaaa",
+    "教学态度认真，课堂氛围活跃。老师治学严谨，教学内容充实。aaaa",
+    "老师治学严谨，教学内容充实。aaaa"
+]
 
 def debug_page_structure(driver):
     """调试页面结构 - 分析表单元素"""
-    print("\n🔍 === 调试页面结构 ===")
+    log.info("\n🔍 === 调试页面结构 ===")
     
     try:
         # 分析表格结构
         tables = driver.find_elements(By.TAG_NAME, "table")
-        print(f"📊 找到 {len(tables)} 个表格")
+        log.info(f"📊 找到 {len(tables)} 个表格")
         
         # 分析单选按钮
         all_radios = driver.find_elements(By.XPATH, "//input[@type='radio']")
-        print(f"🔘 找到 {len(all_radios)} 个单选按钮")
+        log.info(f"🔘 找到 {len(all_radios)} 个单选按钮")
         
         # 分析表格行
         table_rows = driver.find_elements(By.XPATH, "//tr[td//input[@type='radio']]")
-        print(f"📋 找到 {len(table_rows)} 个包含单选按钮的表格行")
+        log.info(f"📋 找到 {len(table_rows)} 个包含单选按钮的表格行")
         
         # 分析按名称分组的单选按钮
         radio_names = set()
@@ -36,11 +69,11 @@ def debug_page_structure(driver):
             name = radio.get_attribute('name')
             if name:
                 radio_names.add(name)
-        print(f"🏷️ 单选按钮组数量: {len(radio_names)}")
+        log.info(f"🏷️ 单选按钮组数量: {len(radio_names)}")
         
         # 分析文本域
         textareas = driver.find_elements(By.TAG_NAME, "textarea")
-        print(f"📝 找到 {len(textareas)} 个文本域")
+        log.info(f"📝 找到 {len(textareas)} 个文本域")
         
         # 分析提交按钮
         submit_buttons = []
@@ -49,15 +82,15 @@ def debug_page_structure(driver):
                         "//input[@type='submit']", "//button[@type='submit']"]:
             buttons = driver.find_elements(By.XPATH, selector)
             submit_buttons.extend(buttons)
-        print(f"💾 找到 {len(submit_buttons)} 个可能的提交按钮")
+        log.info(f"💾 找到 {len(submit_buttons)} 个可能的提交按钮")
         
         # 显示每行单选按钮的详细信息
-        print("\n📋 各行单选按钮详情:")
+        log.info("\n📋 各行单选按钮详情:")
         for i, row in enumerate(table_rows[:3]):  # 只显示前3行
             try:
                 row_radios = row.find_elements(By.XPATH, ".//input[@type='radio']")
                 row_text = row.find_element(By.XPATH, "./td[1]").text.strip()[:20]
-                print(f"  第{i+1}行 '{row_text}': {len(row_radios)}个选项")
+                log.info(f"  第{i+1}行 '{row_text}': {len(row_radios)}个选项")
                 
                 # 显示各选项的位置和值
                 radios_with_pos = []
@@ -69,89 +102,170 @@ def debug_page_structure(driver):
                 # 按位置排序显示
                 radios_with_pos.sort(key=lambda x: x[1])
                 position_info = " → ".join([f"{info[0]}(位置{info[1]:.0f})" for info in radios_with_pos])
-                print(f"    选项位置: {position_info}")
+                log.info(f"    选项位置: {position_info}")
                 
             except Exception as e:
-                print(f"  第{i+1}行: 解析失败 - {e}")
+                log.info(f"  第{i+1}行: 解析失败 - {e}")
         
-        print("🆗 调试完成\n")
+        log.info("🆗 调试完成\n")
         
     except Exception as e:
-        print(f"❌ 调试过程出错: {e}")
+        log.error(f"❌ 调试过程出错: {e}")
 
-def quick_evaluation():
-    """快速评估 - 采用循环模式，一次评估一个URL"""
+def create_driver():
+    """启动浏览器"""
     options = Options()
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
     
-    driver = webdriver.Chrome(options=options)
+    driver = create_chrome(options)
     driver.maximize_window()
+    return driver
+
+def quick_evaluation():
+    """快速评估 - 采用循环模式，一次评估一个URL"""
+    STARTUP.mark("导入模块")
+    preload_in_background()
+    driver = create_driver()
+    STARTUP.mark("启动浏览器")
+    session_manager = None
+    watchdog = ResourceWatchdog()
+    prefetcher = PagePrefetcher()
+    manual_queue = ManualQueue()
+    timed_out = []
     
     try:
-        print("\n" + "="*50)
-        print("🤖 智谱AI (GLM-4V) 验证码识别配置 (可选)")
-        zhipu_api_key = input("请输入智谱AI API密钥（直接回车跳过，将手动处理验证码）: ").strip()
+        log.info("\n" + "="*50)
+        log.info("🤖 智谱AI (GLM-4V) 验证码识别配置 (可选)")
+        zhipu_api_key = os.environ.get("ZHIPU_API_KEY", "").strip()
+        if not zhipu_api_key:
+            zhipu_api_key = prompt("请输入智谱AI API密钥（直接回车跳过，将手动处理验证码）: ").strip()
+            STARTUP.skip()
         if zhipu_api_key:
-            print("✅ 智谱AI API已配置。")
+            log.info("✅ 智谱AI API已配置。")
         else:
-            print("ℹ️ 未配置智谱AI API，将需要手动输入验证码。")
-        print("="*50)
+            log.info("ℹ️ 未配置智谱AI API，将需要手动输入验证码。")
+        log.info("="*50)
+
+        # 评语生成器：按课程批量生成并缓存评语，未配置API时随机选用默认评语
+        comment_generator = CommentGenerator(
+            zhipu_api_key, generate_zhipu_token, policy=COMMENT_POLICY,
+            fallback_comments=DEFAULT_COMMENTS,
+        ) if zhipu_api_key else None
 
-        # 首先登录
-        print("🌐 导航到登录页面...")
+        # 首先登录：配置了账号（UCAS_USERNAME/UCAS_PASSWORD 或本地密钥文件）时自动完成
         login_url = "https://sep.ucas.ac.cn/appStoreStudent"
-        driver.get(login_url)
-        
-        print("请完成登录:")
-        print("1. 输入用户名和密码")
-        print("2. 输入验证码")
-        print("3. 点击登录")
-        input("登录完成后按回车继续...")
+        solve_login_captcha = (lambda d, img: get_captcha_solution(d, img, zhipu_api_key, learned_format=False)) if zhipu_api_key else None
+        if auto_login(driver, solve_captcha=solve_login_captcha, login_url=login_url):
+            STARTUP.mark("自动登录")
+        else:
+            log.info("🌐 导航到登录页面...")
+            create_backend(driver).navigate(login_url)
+            
+            log.info("请完成登录:")
+            log.info("1. 输入用户名和密码")
+            log.info("2. 输入验证码")
+            log.info("3. 点击登录")
+            prompt("登录完成后按回车继续...")
+            STARTUP.skip()
+
+        def relogin():
+            log.warning("⚠️ 会话已失效，请重新登录")
+            if not auto_login(driver, solve_captcha=solve_login_captcha, login_url=login_url):
+                prompt("登录完成后按回车继续...")
+            session_manager.mark_relogin()
+
+        # 会话管理：导航前用轻量请求判断是否过期，批次期间后台心跳保活
+        session_manager = SessionManager()
         
         success_count = 0
         total_count = 0
         first_run = True
+        # 一次可以粘贴多个URL（空格或换行分隔），排队依次评估，下一个页面在当前表单保存时预取
+        pending_urls = deque()
+        # 每批URL的第一个表单打开后（Cookie已同步）为整批表单一次性生成评语
+        batch_comments_ready = True
 
         while True:
-            print("\n" + "="*50)
-            print("请输入下一个评估页面的URL (直接按回车退出流程):")
-            print("示例: https://xkcts.ucas.ac.cn:8443/evaluate/evaluateTeacher/78810/278488/1541/0")
-            eval_url = input("URL: ").strip()
-
-            if not eval_url:
-                print("🏁 用户选择退出。")
+            # 上一个表单结束：采样内存，必要时回收标签页或带Cookie重启浏览器
+            if watchdog.end_form(driver):
+                driver = watchdog.maybe_recycle(driver, create_driver, (manual_queue, prefetcher))
+
+            # 一批URL处理完：集中处理暂存的需要人工介入的表单，再询问下一批
+            if not pending_urls and manual_queue:
+                prefetcher.discard(driver)
+                manual_queue.review(driver)
+
+            if not pending_urls:
+                log.info("\n" + "="*50)
+                log.info("请输入下一个评估页面的URL，可一次粘贴多个（空格分隔；直接按回车退出流程）:")
+                log.info("示例: https://xkcts.ucas.ac.cn:8443/evaluate/evaluateTeacher/78810/278488/1541/0")
+                pending_urls.extend(prompt("URL: ").split())
+                STARTUP.skip()
+                batch_comments_ready = False
+
+            if not pending_urls:
+                prefetcher.discard(driver)
+                log.info("🏁 用户选择退出。")
                 break
+            eval_url = pending_urls.popleft()
             
             total_count += 1
-            print(f"\n📝 开始评估第 {total_count} 个课程...")
-            print(f"URL: {eval_url}")
+            set_form_id(f"{total_count:03d}-{form_id_from_url(eval_url)}")
+            watchdog.begin_form(f"第{total_count}个 {form_id_from_url(eval_url)}", driver)
+            log.info(f"\n📝 开始评估第 {total_count} 个课程...")
+            log.info(f"URL: {eval_url}")
             
             try:
-                # 导航到评估页面
-                driver.get(eval_url)
-                
-                # 检查是否需要重新登录 (使用更健壮的等待方式)
-                try:
-                    WebDriverWait(driver, 3).until(
-                        lambda d: "登录" in d.page_source or "login" in d.current_url.lower()
-                    )
-                    print("⚠️ 会话可能已失效，请重新登录")
-                    input("登录完成后按回车继续...")
-                    driver.get(eval_url)
-                except TimeoutException:
-                    pass # 很好，不需要重新登录
-
-                # 显式等待，确保页面主要内容加载
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//body"))
-                )
+                # 导航前检查会话，只有确实过期才重新登录
+                if not session_manager.is_valid(eval_url):
+                    relogin()
+
+                # 导航到评估页面（已在后台预取时直接切换标签页）
+                # 从这里开始计入本表单的时间预算（登录等待不计入）
+                start_form_deadline()
+                prefetched = prefetcher.take(driver, eval_url, session_manager.generation)
+                # 导航、状态轮询和Cookie同步走可插拔后端（UCAS_EVAL_BACKEND=cdp 时直连 DevTools）
+                backend = create_backend(driver)
+                if not prefetched:
+                    navigate_within_budget(backend, eval_url)
+
+                # 等待页面进入可判断的状态（表单/已评估/登录页/错误页）
+                settled = {PageState.EVALUATION_FORM, PageState.ALREADY_EVALUATED, PageState.LOGIN, PageState.ERROR}
+                page = timed_wait("page_settled", 10, lambda t: wait_for_state(backend, settled, timeout=t)) \
+                    or classify_page(backend)
+
+                # 兜底：被重定向到登录页时重新登录
+                if page.state == PageState.LOGIN:
+                    relogin()
+                    start_form_deadline()
+                    navigate_within_budget(backend, eval_url)
+                    page = timed_wait("page_settled", 10, lambda t: wait_for_state(backend, settled, timeout=t)) \
+                        or classify_page(backend)
+                session_manager.sync_cookies(backend)
+                session_manager.start_heartbeat(eval_url)
+
+                if page.state == PageState.ALREADY_EVALUATED:
+                    log.info("ℹ️ 该课程已评估，跳过。")
+                    continue
                 
                 # 检查是否在正确的评估页面
-                if "evaluate" not in driver.current_url and "评估" not in driver.page_source:
-                    print("❌ 当前似乎不是评估页面，请检查URL或登录状态。")
-                    print(f"   当前URL: {driver.current_url}")
+                if page.state != PageState.EVALUATION_FORM:
+                    log.error(f"❌ 当前似乎不是评估页面（{page.state.value}），请检查URL或登录状态。")
+                    log.info(f"   当前URL: {page.url}")
                     continue
+                startup_line = STARTUP.report("打开首个表单")
+                if startup_line:
+                    log.info(startup_line)
+
+                if FIXTURE_RECORDER.enabled:
+                    FIXTURE_RECORDER.capture(driver, "teacher", find_captcha_elements(driver)[1])
+                
+                if comment_generator and not batch_comments_ready:
+                    batch_comments_ready = True
+                    comment_generator.prepare_batch(driver, session_manager.fetch_page, list(pending_urls))
+                    # 评语批量生成（逐个抓取排队中的页面 + 一次API请求）不计入本表单的时间预算
+                    start_form_deadline()
                 
                 # 调试页面结构（仅在第一次评估时运行）
                 if first_run:
@@ -159,211 +273,141 @@ def quick_evaluation():
                     first_run = False
                 
                 # 填写评估表单
-                if fill_evaluation_form(driver, zhipu_api_key=zhipu_api_key):
+                prefetch_next = (lambda: prefetcher.prefetch(driver, pending_urls[0], session_manager.generation)) \
+                    if pending_urls else None
+                needs_manual = []
+                ok = fill_evaluation_form(driver, zhipu_api_key=zhipu_api_key, comment_generator=comment_generator,
+                                          on_submit=prefetch_next, on_manual=needs_manual.append)
+                if needs_manual:
+                    # 保留标签页，批次结束后集中人工处理，不阻塞后面的表单
+                    manual_queue.park(driver, needs_manual[0], f"第{total_count}个 {form_id_from_url(eval_url)}")
+                elif ok:
                     success_count += 1
-                    print(f"✅ 第 {total_count} 个课程评估成功！")
+                    log.log(SUMMARY, f"✅ 第 {total_count} 个课程评估成功！")
                 else:
-                    print(f"❌ 第 {total_count} 个课程评估失败或未完整保存。")
+                    log.log(SUMMARY, f"❌ 第 {total_count} 个课程评估失败或未完整保存。")
                 
+            except FormDeadlineExceeded as e:
+                # 中止该表单：记录后直接处理下一个，不让卡住的页面拖住整批
+                timed_out.append(f"第{total_count}个 {form_id_from_url(eval_url)}")
+                log.log(SUMMARY, f"⏰ 第 {total_count} 个课程{e}，已中止。")
+                continue
             except Exception as e:
-                print(f"💥 评估第 {total_count} 个课程时发生严重错误: {e}")
+                log.error(f"💥 评估第 {total_count} 个课程时发生严重错误: {e}")
                 continue
+            finally:
+                clear_form_deadline()
+                ADAPTIVE_TIMEOUTS.save()
         
-        print("\n" + "="*50)
-        print(f"🎉 评估流程结束！")
-        print(f"共尝试评估 {total_count} 个课程，成功 {success_count} 个。")
+        log.info("\n" + "="*50)
+        set_form_id(None)
+        log.log(SUMMARY, "🎉 评估流程结束！")
+        log.log(SUMMARY, f"共尝试评估 {total_count} 个课程，成功 {success_count} 个。")
+        if manual_queue.handled:
+            log.log(SUMMARY, f"🙋 其中 {manual_queue.handled} 个表单转人工处理")
+        if timed_out:
+            log.log(SUMMARY, f"⏰ 其中 {len(timed_out)} 个表单超出时间预算被中止: {'、'.join(timed_out)}")
+        for line in watchdog.summary_lines():
+            log.log(SUMMARY, line)
+        for line in ADAPTIVE_TIMEOUTS.summary_lines():
+            log.log(SUMMARY, line)
+        if prefetcher.hits or prefetcher.misses:
+            log.log(SUMMARY, f"⏩ 页面预取: 命中 {prefetcher.hits} 次，作废 {prefetcher.misses} 次")
+        if zhipu_api_key:
+            log.log(SUMMARY, f"📊 {CAPTCHA_POLICY.summary()}")
+            log.log(SUMMARY, f"📝 {COMMENT_POLICY.summary()}")
+            log.log(SUMMARY, f"🧭 {CAPTCHA_ROUTER.summary()}")
         return True
         
     except Exception as e:
-        print(f"💥 脚本发生意外错误: {e}")
+        log.error(f"💥 脚本发生意外错误: {e}")
         return False
     
     finally:
-        print("所有操作已完成。")
-        input("按回车关闭浏览器...")
+        if session_manager:
+            session_manager.stop()
+        ARTIFACT_WRITER.close()
+        close_backends()
+        CAPTCHA_POOL.shutdown()
+        log.info("所有操作已完成。")
+        prompt("按回车关闭浏览器...")
         driver.quit()
 
-def generate_zhipu_token(apikey: str):
-    """根据智谱API Key生成认证用的JWT Token"""
-    try:
-        id, secret = apikey.split(".")
-    except Exception as e:
-        raise Exception("无效的智谱API Key格式，应为 'id.secret'", e)
-
-    payload = {
-        "api_key": id,
-        "exp": int(round(time.time() * 1000)) + 60 * 1000,  # 60秒有效期
-        "timestamp": int(round(time.time() * 1000)),
-    }
-
-    return jwt.encode(
-        payload,
-        secret,
-        algorithm="HS256",
-        headers={"alg": "HS256", "sign_type": "SIGN"},
-    )
-
-def solve_captcha_with_zhipu_llm(api_key, image_base64):
+def click_radio_button(driver, radio_element, row_num, template="/"):
     """
-    使用智谱AI GLM-4V模型识别验证码。
+    点击一个单选按钮。该表单模板上已学到有效策略时直接使用（不滚动、不等待），
+    否则（或它失败时）滚动到元素、等待可点击，再按学到的顺序逐个尝试。
+    返回 True 如果成功，否则返回 False。
     """
-    print("🤖 正在调用智谱AI (GLM-4V) API识别验证码...")
-    
-    try:
-        token = generate_zhipu_token(api_key)
-    except Exception as e:
-        print(f"❌ 生成智谱Token失败: {e}")
-        return None
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-
-    api_endpoint = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
-    
-    payload = {
-        "model": "glm-4v",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "图片里的验证码是什么？请只返回验证码的文本内容，不要包含任何其他说明和解释。"
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{image_base64}"
-                        }
-                    }
-                ]
-            }
-        ],
-        "max_tokens": 20
-    }
+    preferred = CLICK_STRATEGIES.preferred(template)
+    if preferred:
+        if try_click(driver, radio_element, preferred):
+            CLICK_STRATEGIES.record(template, preferred, True)
+            log.info(f"✅ 第 {row_num} 行 - {STRATEGY_NAMES[preferred]}成功")
+            return True
+        CLICK_STRATEGIES.record(template, preferred, False)
 
     try:
-        response = requests.post(api_endpoint, headers=headers, json=payload, timeout=20)
-        response.raise_for_status()
-        
-        content = response.json()['choices'][0]['message']['content'].strip()
-        print(f"🤖 大模型原始返回: '{content}'")
-        
-        # 改进的验证码提取逻辑
-        import re
-        
-        # 尝试多种模式提取验证码
-        patterns = [
-            r'[a-zA-Z0-9]{3,6}$',  # 行末的3-6位字母数字组合
-            r'是([a-zA-Z0-9]{3,6})',  # "是"后面的验证码
-            r'码是([a-zA-Z0-9]{3,6})',  # "码是"后面的验证码
-            r'([a-zA-Z0-9]{3,6})',  # 任何3-6位字母数字组合
-        ]
-        
-        captcha_text = None
-        for pattern in patterns:
-            match = re.search(pattern, content)
-            if match:
-                if pattern.startswith('[a-zA-Z0-9]') and pattern.endswith('$'):
-                    captcha_text = match.group(0)
-                else:
-                    captcha_text = match.group(1)
-                break
-        
-        # 如果正则没匹配到，尝试简单的字母数字过滤
-        if not captcha_text:
-            alnum_only = ''.join(filter(str.isalnum, content))
-            if 3 <= len(alnum_only) <= 6:
-                captcha_text = alnum_only
-        
-        if captcha_text:
-            print(f"🎯 提取的验证码: '{captcha_text}'")
-            return captcha_text
-        else:
-            print("⚠️ 无法从返回内容中提取验证码")
-            return None
-
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 调用智谱API时网络错误: {e}")
-    except (KeyError, IndexError) as e:
-        print(f"❌ 解析API响应失败，格式可能不正确: {e}")
-        print(f"   收到的响应: {response.text}")
-    except Exception as e:
-        print(f"❌ 调用智谱API时发生未知错误: {e}")
-    
-    return None
+        # 滚动到该选项，确保它在可视范围内
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", radio_element)
+        time.sleep(0.3) # 滚动后短暂暂停
 
-def click_radio_button(driver, radio_element, row_num):
-    """
-    使用多种方法尝试点击一个单选按钮，以提高成功率。
-    返回 True 如果成功，否则返回 False。
-    """
-    try:
         # 等待元素变得可点击，这是最关键的一步
-        WebDriverWait(driver, 3).until(EC.element_to_be_clickable(radio_element))
-
-        # 策略一：使用ActionChains，最接近真实用户操作
-        try:
-            ActionChains(driver).move_to_element(radio_element).click().perform()
-            time.sleep(0.1)
-            if radio_element.is_selected():
-                print(f"✅ 第 {row_num} 行 - ActionChains 点击成功")
+        timed_wait("radio_clickable", 3, lambda t: WebDriverWait(driver, t).until(EC.element_to_be_clickable(radio_element)))
+
+        for strategy in CLICK_STRATEGIES.order(template):
+            if strategy == preferred:
+                continue  # 刚刚已经试过
+            if try_click(driver, radio_element, strategy):
+                CLICK_STRATEGIES.record(template, strategy, True)
+                log.info(f"✅ 第 {row_num} 行 - {STRATEGY_NAMES[strategy]}成功")
                 return True
-        except Exception:
-            pass  # 失败则尝试下一种方法
+            CLICK_STRATEGIES.record(template, strategy, False)
 
-        # 策略二：使用JavaScript直接点击
-        try:
-            driver.execute_script("arguments[0].click();", radio_element)
-            time.sleep(0.1)
-            if radio_element.is_selected():
-                print(f"✅ 第 {row_num} 行 - JavaScript 点击成功")
-                return True
-        except Exception:
-            pass  # 失败则尝试下一种方法
-            
-        # 策略三：强制设置checked状态并触发事件
-        try:
-            driver.execute_script("arguments[0].checked = true; arguments[0].dispatchEvent(new Event('change'));", radio_element)
-            time.sleep(0.1)
-            if radio_element.is_selected():
-                print(f"✅ 第 {row_num} 行 - 强制设置成功")
-                return True
-        except Exception:
-            pass
-
-        print(f"❌ 第 {row_num} 行所有点击方法均失败")
+        log.error(f"❌ 第 {row_num} 行所有点击方法均失败")
         return False
 
     except TimeoutException:
-        print(f"❌ 第 {row_num} 行 - 等待按钮可点击超时")
+        log.error(f"❌ 第 {row_num} 行 - 等待按钮可点击超时")
         # 输出详细的调试信息
         is_disp = radio_element.is_displayed()
         is_enabled = radio_element.is_enabled()
         size = radio_element.size
         location = radio_element.location
-        print(f"  > 调试信息: 可见={is_disp}, 可用={is_enabled}, 尺寸={size}, 位置={location}")
+        log.info(f"  > 调试信息: 可见={is_disp}, 可用={is_enabled}, 尺寸={size}, 位置={location}")
         return False
     except Exception as e:
-        print(f"❌ 第 {row_num} 行 - 点击时发生未知错误: {e}")
+        log.error(f"❌ 第 {row_num} 行 - 点击时发生未知错误: {e}")
         return False
 
-def fill_evaluation_form(driver, zhipu_api_key=None):
-    """填写评估表单（重构版）"""
+def fill_evaluation_form(driver, zhipu_api_key=None, comment_generator=None, on_submit=None, on_manual=None):
+    """
+    填写评估表单（重构版）；on_submit 在进入保存阶段时调用（用于预取下一个页面），
+    on_manual(原因) 在需要人工处理时调用（不提供时阻塞等待用户）
+    """
+    manual_reason = None
     try:
-        wait = WebDriverWait(driver, 10)
-        print("📝 开始填写评估表单...")
+        log.info("📝 开始填写评估表单...")
         
-        print("🧠 使用新的高可靠性策略填写单选按钮...")
+        # 等待表单出现（已在表单页面时立即返回）；会话失效、弹出错误框等情况不再盲目填写
+        page = timed_wait("form_ready", 5, lambda t: wait_for_state(driver, {PageState.EVALUATION_FORM}, timeout=t)) \
+            or classify_page(driver)
+        if page.state != PageState.EVALUATION_FORM:
+            log.error(f"❌ 当前页面不是可填写的评估表单（{page.state.value}），跳过填写")
+            return False
+        
+        log.info("🧠 使用新的高可靠性策略填写单选按钮...")
+        check_deadline("单选题")
         try:
             # 1. 等待评估行完全加载
-            table_rows = wait.until(EC.presence_of_all_elements_located((By.XPATH, "//tr[td//input[@type='radio']]")))
-            print(f"📋 找到 {len(table_rows)} 个包含单选按钮的评估行")
+            table_rows = timed_wait("table_rows", 10, lambda t: WebDriverWait(driver, t).until(
+                EC.presence_of_all_elements_located((By.XPATH, "//tr[td//input[@type='radio']]"))))
+            log.info(f"📋 找到 {len(table_rows)} 个包含单选按钮的评估行")
             
             filled_count = 0
             total_rows = len(table_rows)
+            failed_rows = []
+            template = form_template(driver.current_url)
 
             for i, row in enumerate(table_rows):
                 row_num = i + 1
@@ -371,7 +415,7 @@ def fill_evaluation_form(driver, zhipu_api_key=None):
                     # 2. 在行内查找所有选项
                     radios_in_row = row.find_elements(By.XPATH, ".//input[@type='radio']")
                     if not radios_in_row:
-                        print(f"⚠️ 第 {row_num} 行未找到选项")
+                        log.warning(f"⚠️ 第 {row_num} 行未找到选项")
                         continue
 
                     # 3. 按水平位置排序，找出最左边的选项
@@ -379,284 +423,94 @@ def fill_evaluation_form(driver, zhipu_api_key=None):
                     best_radio = radios_with_pos[0][0]
                     
                     if best_radio.is_selected():
-                        print(f"ℹ️ 第 {row_num} 行已选择，跳过")
+                        log.info(f"ℹ️ 第 {row_num} 行已选择，跳过")
                         filled_count += 1
                         continue
                     
-                    # 4. 滚动到该选项，确保它在可视范围内
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", best_radio)
-                    time.sleep(0.3) # 滚动后短暂暂停
-
-                    # 5. 使用新的高可靠性点击函数
-                    if click_radio_button(driver, best_radio, row_num):
+                    # 4. 点击：优先使用该表单模板上学到的策略，必要时才滚动并逐个尝试
+                    if click_radio_button(driver, best_radio, row_num, template):
                         filled_count += 1
                     else:
-                        # 终极调试：如果所有方法都失败，保存截图
-                        filename = f"eval_fail_row_{row_num}.png"
-                        driver.save_screenshot(filename)
-                        print(f"📸 关键失败：已保存截图至 {filename} 供分析。")
+                        # 先记下失败行，整张表单处理完后统一记录一次现场
+                        failed_rows.append(row)
 
                 except Exception as e:
-                    print(f"❌ 处理第 {row_num} 行时发生意外错误: {e}")
+                    log.error(f"❌ 处理第 {row_num} 行时发生意外错误: {e}")
                     continue
             
-            print(f"✅ 完成单选题填写，成功填写 {filled_count}/{total_rows} 行")
+            log.info(f"✅ 完成单选题填写，成功填写 {filled_count}/{total_rows} 行")
+            if failed_rows:
+                note = f"failed_rows={len(failed_rows)}/{total_rows}"
+                ARTIFACT_WRITER.capture(driver, form_id_from_url(driver.current_url), failed_rows, note)
             if filled_count < total_rows:
-                print("⚠️ 部分单选题未能自动完成，请检查失败截图或手动完成。")
-                input("手动完成后按回车继续...")
+                log.warning("⚠️ 部分单选题未能自动完成，请检查失败截图或手动完成。")
+                if on_manual:
+                    # 先把文本域填好，再把整张表单交给人工（不提交）
+                    manual_reason = f"单选题未完成（{filled_count}/{total_rows}）"
+                else:
+                    prompt("手动完成后按回车继续...")
 
         except TimeoutException:
-            print("❌ 未能找到评估表格，跳过单选题。")
+            log.error("❌ 未能找到评估表格，跳过单选题。")
+        except FormDeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ 处理单选题时发生严重错误: {e}")
+            log.error(f"❌ 处理单选题时发生严重错误: {e}")
         
         time.sleep(1)
         
         # 处理文本域
+        check_deadline("文本域")
         try:
             textareas = driver.find_elements(By.TAG_NAME, "textarea")
-            print(f"🔍 找到 {len(textareas)} 个文本域")
+            log.info(f"🔍 找到 {len(textareas)} 个文本域")
             
             if textareas:
-                comments = [
-                    "老师教学认真负责，课程内容丰富，讲解清晰老师治学严谨，教学内容充实。aaaa。",
-                    "老师专业水平高，备课充分，课程质量很高。老师治学严谨，教学内容充实。aaaa",
-                    "课程安排合理，老师耐心解答问题。老师治学严谨，教学内容充实。aaaa",
-                    "教学态度认真，课堂氛围活跃。老师治学严谨，教学内容充实。aaaa",
-                    "老师治学严谨，教学内容充实。aaaa"
-                ]
+                generated = []
+                if comment_generator:
+                    course, teacher = scrape_form_context(driver)
+                    log.info(f"📚 课程: {course or '未知'}  教师: {teacher or '未知'}")
+                    generated = comment_generator.comments_for(course, teacher, len(textareas))
                 
                 for i, textarea in enumerate(textareas):
                     try:
                         if textarea.is_displayed() and textarea.is_enabled():
-                            comment = random.choice(comments)
+                            comment = generated[i] if i < len(generated) else random.choice(DEFAULT_COMMENTS)
                             textarea.clear()
                             textarea.send_keys(comment)
-                            print(f"✅ 填写了第 {i+1} 个文本域")
+                            log.info(f"✅ 填写了第 {i+1} 个文本域")
                     except Exception as e:
-                        print(f"❌ 填写第 {i+1} 个文本域失败: {e}")
+                        log.error(f"❌ 填写第 {i+1} 个文本域失败: {e}")
             else:
-                print("ℹ️ 未找到文本域")
+                log.info("ℹ️ 未找到文本域")
                 
         except Exception as e:
-            print(f"❌ 处理文本域时出错: {e}")
+            log.error(f"❌ 处理文本域时出错: {e}")
         
-        # 处理验证码
-        captcha_solved = False
-        try:
-            # 定位验证码元素
-            captcha_input, captcha_image = find_captcha_elements(driver)
-            
-            if captcha_input and captcha_image and zhipu_api_key:
-                MAX_ATTEMPTS = 3
-                for attempt in range(MAX_ATTEMPTS):
-                    print(f"\n🤖 ===== 验证码识别: 第 {attempt + 1}/{MAX_ATTEMPTS} 次 =====")
-                    
-                    # 获取验证码解决方案
-                    captcha_solution = get_captcha_solution(driver, captcha_image, zhipu_api_key)
-
-                    if not captcha_solution:
-                        print("⚠️ 验证码识别失败，刷新后重试...")
-                        try:
-                            captcha_image.click()
-                            time.sleep(1)
-                        except Exception as e:
-                            print(f"❌ 刷新验证码失败: {e}")
-                        continue
-
-                    # 填写验证码
-                    print(f"✍️ 正在填入验证码: '{captcha_solution}'")
-                    try:
-                        driver.execute_script("arguments[0].value = arguments[1];", captcha_input, captcha_solution)
-                        time.sleep(0.5)
-                        
-                        # 验证填写结果
-                        filled_value = captcha_input.get_attribute('value')
-                        print(f"🕵️ 验证填写结果: '{filled_value}'")
-
-                        if filled_value != captcha_solution:
-                            print("❌ 填写失败或被清空，刷新重试")
-                            captcha_image.click()
-                            time.sleep(1)
-                            continue
-                    except Exception as e:
-                        print(f"❌ 填写验证码时出错: {e}")
-                        continue
-
-                    # 点击保存按钮
-                    try:
-                        print("🖱️ 点击保存按钮...")
-                        main_save_button = driver.find_element(By.XPATH, "//button[@type='submit' and contains(text(), '保存')]")
-                        main_save_button.click()
-
-                        # 处理确认对话框
-                        confirm_button = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, "//button[text()='确定']")))
-                        print("🖱️ 点击确认按钮...")
-                        confirm_button.click()
-                    except TimeoutException:
-                        print("ℹ️ 未找到保存或确认按钮")
-                    except Exception as e:
-                        print(f"❌ 点击保存时出错: {e}")
-
-                    # 检查是否有验证码错误提示
-                    try:
-                        error_dialog = WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.XPATH, "//div[contains(text(), '验证码错误')]")))
-                        print(f"❌ 验证码错误，准备重试...")
-                        
-                        # 关闭错误对话框
-                        error_confirm = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, "//div[contains(@class, 'messager-button')]//button[contains(text(),'确定')]")))
-                        error_confirm.click()
-                        time.sleep(1)
-
-                        # 刷新验证码
-                        captcha_image.click()
-                        time.sleep(1)
-
-                    except TimeoutException:
-                        print("✅ 验证码提交成功！")
-                        captcha_solved = True
-                        break
-                
-                if not captcha_solved:
-                    print("❌ 多次尝试失败，需要手动处理")
-                    input("请手动完成验证码输入并提交，完成后按回车...")
+        if manual_reason:
+            on_manual(manual_reason)
+            return False
 
-            elif captcha_input:
-                print("⚠️ 发现验证码但未配置API，请手动输入")
-                input("请手动输入验证码并提交，完成后按回车...")
-            
-            else:
-                print("✅ 未发现验证码")
-                captcha_solved = True
-                
-        except Exception as e:
-            print(f"ℹ️ 验证码处理时出错: {e}")
+        # 处理验证码并提交
+        captcha_solved = solve_and_submit(driver, zhipu_api_key, on_submit=on_submit, on_manual=on_manual)
         
         if captcha_solved:
-            print("\n✅ 评估表单已完成")
+            log.info("\n✅ 评估表单已完成")
         else:
-            print("\nℹ️ 评估可能需要手动完成")
+            log.info("\nℹ️ 评估可能需要手动完成")
         
         return captcha_solved
         
+    except FormDeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ 填写表单时发生致命错误: {e}")
+        log.error(f"❌ 填写表单时发生致命错误: {e}")
         return False
 
-def find_captcha_elements(driver):
-    """简化的验证码元素定位"""
-    print("🔍 正在定位验证码元素...")
-    
-    # 验证码输入框选择器（按优先级排序）
-    input_selectors = [
-        ("name", "adminValidateCode"),                                           # 最可能的选择器
-        ("xpath", "//span[contains(text(), '验证码')]/following-sibling::input[@type='text']"),
-        ("xpath", "//input[contains(@placeholder, '验证码')]"),
-        ("xpath", "//input[contains(@name, 'captcha')]"),
-        ("xpath", "//input[contains(@id, 'captcha')]"),
-        ("xpath", "//input[contains(@id, 'validate')]")
-    ]
-    
-    # 验证码图片选择器（按优先级排序）
-    image_selectors = [
-        ("id", "adminValidateImg"),                                              # 最可能的选择器
-        ("xpath", "//img[contains(@id, 'captcha')]"),
-        ("xpath", "//img[contains(@id, 'validate')]"),
-        ("xpath", "//img[contains(@src, 'captcha')]"),
-        ("xpath", "//img[contains(@src, 'validate')]")
-    ]
-
-    # 查找输入框
-    captcha_input = None
-    for selector_type, selector_value in input_selectors:
-        try:
-            if selector_type == "id":
-                element = driver.find_element(By.ID, selector_value)
-            elif selector_type == "name":
-                element = driver.find_element(By.NAME, selector_value)
-            elif selector_type == "xpath":
-                element = driver.find_element(By.XPATH, selector_value)
-            
-            if element.is_displayed():
-                captcha_input = element
-                print(f"✅ 找到验证码输入框: {selector_type}='{selector_value}'")
-                break
-        except:
-            continue
-    
-    # 查找图片
-    captcha_image = None
-    for selector_type, selector_value in image_selectors:
-        try:
-            if selector_type == "id":
-                element = driver.find_element(By.ID, selector_value)
-            elif selector_type == "xpath":
-                element = driver.find_element(By.XPATH, selector_value)
-            
-            if element.is_displayed():
-                captcha_image = element
-                print(f"✅ 找到验证码图片: {selector_type}='{selector_value}'")
-                break
-        except:
-            continue
-    
-    return captcha_input, captcha_image
-
-def get_captcha_solution(driver, captcha_image, zhipu_api_key):
-    """简化的验证码识别逻辑"""
-    try:
-        # 滚动到验证码图片，确保其完全可见
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", captcha_image)
-        time.sleep(0.5)
-
-        # 获取元素的位置和大小信息
-        location = captcha_image.location
-        size = captcha_image.size
-        
-        # 截取整个页面
-        png = driver.get_screenshot_as_png()
-        im = Image.open(io.BytesIO(png))
-        
-        # 获取设备像素比例并计算裁剪区域
-        pixel_ratio = driver.execute_script("return window.devicePixelRatio") or 1
-        left = int(location['x'] * pixel_ratio)
-        top = int(location['y'] * pixel_ratio)
-        right = int((location['x'] + size['width']) * pixel_ratio)
-        bottom = int((location['y'] + size['height']) * pixel_ratio)
-        
-        # 确保裁剪坐标在图片范围内
-        img_width, img_height = im.size
-        left = max(0, min(left, img_width))
-        top = max(0, min(top, img_height))
-        right = max(left, min(right, img_width))
-        bottom = max(top, min(bottom, img_height))
-        
-        # 检查裁剪区域是否合理
-        if right - left <= 0 or bottom - top <= 0:
-            print("⚠️ 裁剪坐标无效，使用元素截图方法")
-            image_base64 = captcha_image.screenshot_as_base64
-        else:
-            # 执行裁剪和预处理
-            im_cropped = im.crop((left, top, right, bottom))
-            im_processed = im_cropped.convert('L')  # 转灰度
-            enhancer = ImageEnhance.Contrast(im_processed)
-            im_processed = enhancer.enhance(2)  # 增强对比度
-            
-            # 转换为base64
-            buffer = io.BytesIO()
-            im_processed.save(buffer, format="PNG")
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        print("📸 验证码图片预处理完成")
-        return solve_captcha_with_zhipu_llm(zhipu_api_key, image_base64)
-        
-    except Exception as e:
-        print(f"❌ 截图或预处理验证码时发生错误: {e}")
-        return None
-
 if __name__ == "__main__":
-    print("=== UCAS 快速评估工具 ===")
-    print("⚠️ 本工具用于批量评估课程")
-    print("⚠️ 请确保已准备好所有评估页面的URL")
-    print()
-    quick_evaluation() 
+    log.info("=== UCAS 快速评估工具 ===")
+    log.info("⚠️ 本工具用于批量评估课程")
+    log.info("⚠️ 请确保已准备好所有评估页面的URL")
+    log.info("")
+    quick_evaluation()
+    flush_logs() 
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评估守护进程
+功能：常驻一个已登录的浏览器，通过本地 HTTP 接口接收评估任务，复用两个评估脚本的填表逻辑，
+其他工具推送任务时无需再付出 Chrome 启动、登录和 Python 导入的开销
+
+用法：
+    python eval_daemon.py [--port 8765]
+接口（仅监听 127.0.0.1，所有请求都需带 X-Auth-Token 请求头；令牌取 UCAS_EVAL_DAEMON_TOKEN，
+未设置时启动时随机生成，写入 ~/.ucas_eval/daemon.json 并打印在日志中）：
+    POST   /jobs        {"url": "...", "kind": "teacher|course"}   入队（Content-Type: application/json），kind 缺省时按URL判断
+                        URL 的主机必须在 UCAS_EVAL_DAEMON_HOSTS 中（默认 xkcts.ucas.ac.cn）
+    GET    /jobs        列出全部任务
+    GET    /jobs/<id>   查询单个任务
+    DELETE /jobs/<id>   取消任务（排队中立即取消，执行中则在表单的下一个阶段边界中止；
+                        manual 状态的任务放弃人工处理并关闭其标签页）
+    POST   /jobs/<id>/resolve   manual 状态的任务已在浏览器中处理完：关闭其标签页，任务标记为 done
+    GET    /stats       智谱API用量统计
+示例：
+    curl -X POST localhost:8765/jobs -H "X-Auth-Token: $TOKEN" -H "Content-Type: application/json" \
+         -d '{"url": "https://xkcts.ucas.ac.cn:8443/evaluate/evaluateTeacher/..."}'
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from fast_start import STARTUP, preload_in_background
+import eval_course
+from auto_login import auto_login
+from session_keeper import SessionManager
+from page_state import PageState, classify_page, wait_for_state
+from comment_generator import CommentGenerator, COMMENT_POLICY
+from resource_watchdog import ResourceWatchdog
+from page_prefetcher import PagePrefetcher
+from browser_backend import create_backend, close_backends
+from manual_queue import ManualQueue
+from form_deadline import (FormCancelled, FormDeadlineExceeded, start_form_deadline, clear_form_deadline,
+                           set_form_cancel, check_deadline, navigate_within_budget)
+from adaptive_timeouts import ADAPTIVE_TIMEOUTS, timed_wait
+from captcha_pool import CAPTCHA_POOL
+from captcha_flow import CAPTCHA_POLICY, CAPTCHA_ROUTER, generate_zhipu_token, get_captcha_solution
+from artifact_writer import form_id_from_url
+from eval_state import state_path, save_json
+from eval_logging import get_logger, set_form_id, prompt, flush_logs, SUMMARY
+
+log = get_logger("eval_daemon")
+
+LOGIN_URL = "https://sep.ucas.ac.cn/"
+
+# 只接受这些主机上的评估页面：任务会驱动已登录的浏览器打开URL并填写、提交表单
+JOB_HOSTS = {h.strip().lower() for h in os.environ.get("UCAS_EVAL_DAEMON_HOSTS", "xkcts.ucas.ac.cn").split(",") if h.strip()}
+
+DAEMON_FILE = "daemon.json"
+
+# 暂存等待人工处理的表单超过这个时长（秒）仍未处理时关闭其标签页，任务标记为 expired
+MANUAL_TTL = float(os.environ.get("UCAS_EVAL_MANUAL_TTL", "3600"))
+# 空闲时工作线程检查人工处理结果和过期暂存表单的间隔
+MANUAL_POLL_INTERVAL = 5
+
+
+def load_teacher_module():
+    """教师评估脚本文件名中带空格，只能按路径加载"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval _teacher.py")
+    spec = importlib.util.spec_from_file_location("eval_teacher", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def validate_job_url(url):
+    """返回错误信息，URL 可接受时返回 None"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return "URL 格式错误"
+    if parts.scheme not in ("http", "https") or (parts.hostname or "").lower() not in JOB_HOSTS:
+        return f"只接受 {', '.join(sorted(JOB_HOSTS))} 上的评估页面"
+    return None
+
+
+def guess_kind(url):
+    return "teacher" if "teacher" in url.lower() else "course"
+
+
+class JobQueue:
+    """线程安全的任务表 + 等待队列"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.pending = deque()
+        # 运行中任务的取消事件：工作线程在表单各阶段边界检查，DELETE 时设置
+        self._cancel_events = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def submit(self, url, kind=None):
+        with self._cond:
+            job_id = str(next(self._ids))
+            self.jobs[job_id] = {
+                "id": job_id, "url": url, "kind": kind or guess_kind(url), "status": "queued",
+                "created": time.time(), "started": None, "finished": None, "message": "",
+            }
+            self.pending.append(job_id)
+            self._cond.notify()
+            return dict(self.jobs[job_id])
+
+    def list(self):
+        with self._cond:
+            return [dict(job) for job in self.jobs.values()]
+
+    def get(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if not job:
+                return None
+            if job["status"] == "queued":
+                job["status"] = "cancelled"
+                job["finished"] = time.time()
+                self.pending.remove(job_id)
+            elif job["status"] == "running":
+                job["status"] = "cancelling"
+                self._cancel_events[job_id].set()
+            return dict(job)
+
+    def cancel_event(self, job_id):
+        with self._cond:
+            return self._cancel_events.get(job_id)
+
+    def pending_urls(self, kind):
+        """排队中指定类型任务的URL（用于批量生成评语）"""
+        with self._cond:
+            return [self.jobs[job_id]["url"] for job_id in self.pending if self.jobs[job_id]["kind"] == kind]
+
+    def peek_url(self):
+        """下一个排队任务的URL（用于预取），没有时返回 None"""
+        with self._cond:
+            return self.jobs[self.pending[0]]["url"] if self.pending else None
+
+    def next_job(self, stop_event, timeout=None):
+        """阻塞等待下一个任务，守护进程退出或等待超过 timeout 秒时返回 None"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while not self.pending and not stop_event.is_set():
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                self._cond.wait(timeout=1)
+            if stop_event.is_set():
+                return None
+            job_id = self.pending.popleft()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started"] = time.time()
+            self._cancel_events[job_id] = threading.Event()
+            return dict(job)
+
+    def resolve_manual(self, job_id, status, message):
+        """manual 状态的任务得到处理结果（人工完成、放弃或过期）"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job and job["status"] == "manual":
+                job.update(status=status, message=message, finished=time.time())
+
+    def finish(self, job_id, status, message=""):
+        with self._cond:
+            job = self.jobs[job_id]
+            self._cancel_events.pop(job_id, None)
+            # 取消请求在最后一个阶段边界之后才到达时表单已经提交，如实报告结果
+            if job["status"] == "cancelling" and status != "cancelled":
+                message = f"{message}（取消请求到达时表单已处理完）".lstrip()
+            job.update(status=status, message=message, finished=time.time())
+
+
+class EvaluationWorker:
+    """唯一持有 driver 的线程：WebDriver 不是线程安全的，所有浏览器操作都在这里串行执行"""
+
+    def __init__(self, jobs, zhipu_api_key):
+        self.jobs = jobs
+        self.zhipu_api_key = zhipu_api_key
+        self.stop_event = threading.Event()
+        self.teacher = load_teacher_module()
+        self.driver = None
+        self.session_manager = SessionManager()
+        self.watchdog = ResourceWatchdog()
+        self.prefetcher = PagePrefetcher()
+        # 守护进程无人值守：需要人工处理的表单保留标签页并标记为 manual，由用户在浏览器窗口中自行完成
+        self.manual_queue = ManualQueue()
+        # 接口线程登记的人工处理结果 (job_id, status, message)，由工作线程关闭标签页后更新任务状态
+        self.manual_results = deque()
+        self.comment_generators = {}
+        if zhipu_api_key:
+            self.comment_generators = {
+                "course": CommentGenerator(zhipu_api_key, generate_zhipu_token, policy=COMMENT_POLICY,
+                                           fallback_comments=eval_course.DEFAULT_POSITIVE_COMMENTS),
+                "teacher": CommentGenerator(zhipu_api_key, generate_zhipu_token, policy=COMMENT_POLICY,
+                                            fallback_comments=self.teacher.DEFAULT_COMMENTS),
+            }
+
+    def solve_login_captcha(self, driver, image):
+        if not self.zhipu_api_key:
+            return None
+        return get_captcha_solution(driver, image, self.zhipu_api_key, learned_format=False)
+
+    def start_browser(self):
+        STARTUP.mark("导入模块")
+        preload_in_background()
+        self.driver = eval_course.create_driver()
+        STARTUP.mark("启动浏览器")
+        self.login()
+        log.info(STARTUP.report("登录"))
+
+    def login(self):
+        if not auto_login(self.driver, solve_captcha=self.solve_login_captcha, login_url=LOGIN_URL):
+            create_backend(self.driver).navigate(LOGIN_URL)
+            prompt("请在浏览器中完成登录，然后回到这里按回车键继续...")
+        self.session_manager.mark_relogin()
+        log.info("✅ 登录完成，守护进程开始接收任务")
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.tend_manual_queue()
+            job = self.jobs.next_job(self.stop_event, timeout=MANUAL_POLL_INTERVAL)
+            if job is None:
+                continue
+            set_form_id(f"job{job['id']}-{form_id_from_url(job['url'])}")
+            self.watchdog.begin_form(f"任务{job['id']} {form_id_from_url(job['url'])}", self.driver)
+            set_form_cancel(self.jobs.cancel_event(job["id"]))
+            try:
+                status, message = self.run_job(job)
+            except FormCancelled as e:
+                status, message = "cancelled", str(e)
+            except FormDeadlineExceeded as e:
+                status, message = "timeout", str(e)
+            except Exception as e:
+                status, message = "failed", f"严重错误: {e}"
+            finally:
+                clear_form_deadline()
+                ADAPTIVE_TIMEOUTS.save()
+            # 表单之间检查内存，必要时回收标签页或带Cookie重启浏览器；出错不能让工作线程退出
+            try:
+                self.watchdog.end_form(self.driver)
+                self.driver = self.watchdog.maybe_recycle(self.driver, eval_course.create_driver,
+                                                             (self.manual_queue, self.prefetcher))
+            except Exception as e:
+                log.error(f"❌ 表单间资源检查失败: {e}")
+            self.jobs.finish(job["id"], status, message)
+            log.log(SUMMARY, f"{'✅' if status == 'done' else '❌'} 任务 {job['id']} ({job['kind']}): {status} {message}")
+            set_form_id(None)
+
+    def run_job(self, job):
+        url = job["url"]
+        if not self.session_manager.is_valid(url):
+            log.warning("⚠️ 会话已失效，重新登录")
+            self.login()
+
+        # 从这里开始计入本任务的时间预算（登录等待不计入）
+        start_form_deadline()
+        prefetched = self.prefetcher.take(self.driver, url, self.session_manager.generation)
+        backend = create_backend(self.driver)
+        if not prefetched:
+            navigate_within_budget(backend, url)
+        settled = {PageState.EVALUATION_FORM, PageState.ALREADY_EVALUATED, PageState.LOGIN, PageState.ERROR}
+        page = timed_wait("page_settled", 10, lambda t: wait_for_state(backend, settled, timeout=t)) \
+            or classify_page(backend)
+        if page.state == PageState.LOGIN:
+            self.login()
+            start_form_deadline()
+            navigate_within_budget(backend, url)
+            page = timed_wait("page_settled", 10, lambda t: wait_for_state(backend, settled, timeout=t)) \
+                or classify_page(backend)
+        self.session_manager.sync_cookies(backend)
+        self.session_manager.start_heartbeat(url)
+
+        if page.state == PageState.ALREADY_EVALUATED:
+            return "done", "已评估，跳过"
+        if page.state != PageState.EVALUATION_FORM:
+            return "failed", f"不是评估页面（{page.state.value}）"
+
+        check_deadline("填写表单")
+        module = self.teacher if job["kind"] == "teacher" else eval_course
+        if module.FIXTURE_RECORDER.enabled:
+            module.FIXTURE_RECORDER.capture(self.driver, job["kind"], module.find_captcha_elements(self.driver)[1])
+
+        generator = self.comment_generators.get(job["kind"])
+        if generator:
+            # 当前表单和排队中同类任务中尚未登记的表单合并为一次评语请求
+            generator.prepare_batch(self.driver, self.session_manager.fetch_page, self.jobs.pending_urls(job["kind"]))
+            # 评语批量生成不计入本任务的时间预算
+            start_form_deadline()
+        needs_manual = []
+        if job["kind"] == "teacher":
+            ok = self.teacher.fill_evaluation_form(self.driver, zhipu_api_key=self.zhipu_api_key,
+                                                   comment_generator=generator, on_submit=self.prefetch_next,
+                                                   on_manual=needs_manual.append)
+        else:
+            ok = eval_course.fill_evaluation_form_with_multiselect(self.driver, self.zhipu_api_key, generator,
+                                                                   on_submit=self.prefetch_next,
+                                                                   on_manual=needs_manual.append)
+        if needs_manual:
+            self.manual_queue.park(self.driver, needs_manual[0], f"任务{job['id']}", key=job["id"])
+            return "manual", needs_manual[0]
+        return ("done", "") if ok else ("failed", "表单未完整保存")
+
+    def release_manual(self, job_id, status, message):
+        """接口线程调用：WebDriver 只能在工作线程中使用，这里只登记结果"""
+        self.manual_results.append((job_id, status, message))
+
+    def tend_manual_queue(self):
+        """任务之间调用：处理接口登记的人工处理结果，关闭超时未处理的暂存表单"""
+        try:
+            while self.manual_results:
+                job_id, status, message = self.manual_results.popleft()
+                self.manual_queue.release(self.driver, job_id)
+                self.jobs.resolve_manual(job_id, status, message)
+                log.info(f"📋 任务 {job_id} 人工处理结果: {status}")
+            for entry in self.manual_queue.expire(self.driver, MANUAL_TTL):
+                self.jobs.resolve_manual(entry["key"], "expired", f"超过 {MANUAL_TTL:.0f}s 未人工处理（{entry['reason']}）")
+        except Exception as e:
+            log.error(f"❌ 处理暂存表单失败: {e}")
+
+    def prefetch_next(self):
+        """当前表单进入保存阶段时在后台标签页预取下一个排队任务的页面"""
+        url = self.jobs.peek_url()
+        if url:
+            self.prefetcher.prefetch(self.driver, url, self.session_manager.generation)
+
+    def stop(self):
+        self.stop_event.set()
+        self.session_manager.stop()
+        CAPTCHA_POOL.shutdown()
+        close_backends()
+        if self.driver:
+            self.driver.quit()
+
+    def stats(self):
+        return {
+            "captcha": CAPTCHA_POLICY.summary(),
+            "comments": COMMENT_POLICY.summary(),
+            "router": CAPTCHA_ROUTER.summary(),
+            "memory": self.watchdog.records[-20:],
+            "prefetch": {"hits": self.prefetcher.hits, "misses": self.prefetcher.misses},
+            "captcha_pool": {"workers": CAPTCHA_POOL.workers, "submitted": CAPTCHA_POOL.submitted,
+                             "inline": CAPTCHA_POOL.inline},
+            "wait_timeouts": [line.strip() for line in ADAPTIVE_TIMEOUTS.summary_lines()[1:]],
+            "manual": [{"job": entry["key"], "label": entry["label"], "reason": entry["reason"], "url": entry["url"],
+                        "parked_at": entry["parked_at"]} for entry in self.manual_queue.parked],
+        }
+
+
+def make_handler(jobs, worker, token, port):
+    # 防 DNS 重绑定：只接受以本机地址访问的请求
+    allowed_hosts = {f"127.0.0.1:{port}", f"localhost:{port}"}
+    if port == 80:
+        allowed_hosts |= {"127.0.0.1", "localhost"}
+
+    class JobAPIHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            log.debug("🌐 " + format % args)
+
+        def _reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self):
+            if (self.headers.get("Host") or "").lower() not in allowed_hosts:
+                self._reply(403, {"error": "invalid host"})
+                return False
+            if not secrets.compare_digest((self.headers.get("X-Auth-Token") or "").encode(), token.encode()):
+                self._reply(401, {"error": "unauthorized"})
+                return False
+            return True
+
+        def _job_id(self):
+            parts = self.path.rstrip("/").split("/")
+            return parts[2] if len(parts) == 3 and parts[1] == "jobs" else None
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path.rstrip("/") == "/jobs":
+                return self._reply(200, jobs.list())
+            if self.path.rstrip("/") == "/stats":
+                return self._reply(200, worker.stats())
+            job = jobs.get(self._job_id())
+            return self._reply(200, job) if job else self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            parts = self.path.rstrip("/").split("/")
+            if len(parts) == 4 and parts[1] == "jobs" and parts[3] == "resolve":
+                job = jobs.get(parts[2])
+                if not job:
+                    return self._reply(404, {"error": "not found"})
+                if job["status"] != "manual":
+                    return self._reply(409, {"error": "任务不在等待人工处理的状态"})
+                worker.release_manual(job["id"], "done", "已人工处理")
+                return self._reply(202, job)
+            if self.path.rstrip("/") != "/jobs":
+                return self._reply(404, {"error": "not found"})
+            # 只接受 JSON：浏览器跨站表单/text/plain 请求无法带上这个类型而不触发预检
+            if (self.headers.get("Content-Type") or "").split(";")[0].strip().lower() != "application/json":
+                return self._reply(415, {"error": "需要 Content-Type: application/json"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                url = body["url"].strip()
+            except (ValueError, KeyError, AttributeError):
+                return self._reply(400, {"error": "需要 JSON 请求体 {\"url\": ...}"})
+            error = validate_job_url(url)
+            if error:
+                return self._reply(400, {"error": error})
+            kind = body.get("kind")
+            if kind not in (None, "teacher", "course"):
+                return self._reply(400, {"error": "kind 只能是 teacher 或 course"})
+            return self._reply(201, jobs.submit(url, kind))
+
+        def do_DELETE(self):
+            if not self._authorized():
+                return
+            job = jobs.cancel(self._job_id())
+            if not job:
+                return self._reply(404, {"error": "not found"})
+            if job["status"] == "manual":
+                worker.release_manual(job["id"], "cancelled", "已放弃人工处理")
+                return self._reply(202, job)
+            return self._reply(200, job)
+
+    return JobAPIHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UCAS 评估守护进程")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("UCAS_EVAL_DAEMON_PORT", "8765")))
+    args = parser.parse_args()
+
+    zhipu_api_key = os.environ.get("ZHIPU_API_KEY", "").strip()
+    if not zhipu_api_key:
+        zhipu_api_key = prompt("请输入智谱AI API密钥（直接回车跳过，将手动处理验证码）: ").strip() or None
+        STARTUP.skip()
+
+    jobs = JobQueue()
+    worker = EvaluationWorker(jobs, zhipu_api_key)
+    worker.start_browser()
+
+    token = os.environ.get("UCAS_EVAL_DAEMON_TOKEN") or secrets.token_urlsafe(24)
+    try:
+        # 状态目录中的文件只有当前用户可读，本机工具可从这里取令牌
+        save_json(state_path(DAEMON_FILE), {"port": args.port, "token": token, "pid": os.getpid()})
+    except OSError as e:
+        log.warning(f"⚠️ 写入 {DAEMON_FILE} 失败: {e}")
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(jobs, worker, token, args.port))
+    threading.Thread(target=server.serve_forever, name="job-api", daemon=True).start()
+    log.info(f"🚀 任务接口已启动: http://127.0.0.1:{args.port}/jobs （Ctrl+C 退出）")
+    if not os.environ.get("UCAS_EVAL_DAEMON_TOKEN"):
+        log.info(f"🔑 本次接口令牌: {token}（请求需带 X-Auth-Token 头，也可从 ~/.ucas_eval/{DAEMON_FILE} 读取）")
+
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        log.warning("\n⚠️ 收到中断，守护进程退出")
+    finally:
+        server.shutdown()
+        worker.stop()
+        log.log(SUMMARY, f"📊 {CAPTCHA_POLICY.summary()}")
+        log.log(SUMMARY, f"📝 {COMMENT_POLICY.summary()}")
+        log.log(SUMMARY, f"🧭 {CAPTCHA_ROUTER.summary()}")
+        for line in worker.watchdog.summary_lines():
+            log.log(SUMMARY, line)
+        for line in ADAPTIVE_TIMEOUTS.summary_lines():
+            log.log(SUMMARY, line)
+        flush_logs()
+
+
+if __name__ == "__main__":
+    main()
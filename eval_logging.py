@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+结构化日志
+功能：分级日志、按表单的关联ID、基于队列的非阻塞输出、可选 JSON Lines 文件输出以及只显示每表单汇总的安静模式
+
+环境变量：
+- UCAS_EVAL_LOG_LEVEL  控制台日志级别（DEBUG/INFO/WARNING/ERROR，默认 INFO）
+- UCAS_EVAL_QUIET=1    安静模式：控制台只输出每个表单的汇总和错误
+- UCAS_EVAL_LOG_JSON   JSON Lines 日志文件路径（记录全部 DEBUG 及以上日志）
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+ROOT_LOGGER_NAME = "ucas_eval"
+
+# 介于 INFO 与 WARNING 之间，用于每个表单/每次运行的汇总行
+SUMMARY = 25
+logging.addLevelName(SUMMARY, "SUMMARY")
+
+_form_id = contextvars.ContextVar("form_id", default="-")
+_setup_lock = threading.Lock()
+_listener = None
+_log_queue = None
+
+
+class FormContextFilter(logging.Filter):
+    """给每条日志附加当前表单的关联ID"""
+
+    def filter(self, record):
+        if not hasattr(record, "form_id"):
+            record.form_id = _form_id.get()
+        return True
+
+
+class QuietFilter(logging.Filter):
+    """安静模式下控制台只放行汇总和错误"""
+
+    def filter(self, record):
+        return record.levelno == SUMMARY or record.levelno >= logging.ERROR
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "form_id": getattr(record, "form_id", "-"),
+            "thread": record.threadName,
+            "message": record.getMessage().strip(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, quiet=None, json_file=None):
+    """
+    配置日志（只生效一次）。参数缺省时从环境变量读取。
+    日志记录方只把 LogRecord 放入队列，格式化和终端/文件 I/O 都在监听线程中完成
+    """
+    global _listener, _log_queue
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level = (level or os.environ.get("UCAS_EVAL_LOG_LEVEL", "INFO")).upper()
+        if quiet is None:
+            quiet = os.environ.get("UCAS_EVAL_QUIET", "").lower() in ("1", "true", "yes")
+        json_file = json_file or os.environ.get("UCAS_EVAL_LOG_JSON")
+
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("%(message)s"))
+        console.setLevel(getattr(logging, level, logging.INFO))
+        if quiet:
+            console.addFilter(QuietFilter())
+        handlers = [console]
+
+        if json_file:
+            file_handler = logging.FileHandler(json_file, encoding="utf-8")
+            file_handler.setFormatter(JsonLinesFormatter())
+            file_handler.setLevel(logging.DEBUG)
+            handlers.append(file_handler)
+
+        _log_queue = queue.Queue(-1)
+        queue_handler = logging.handlers.QueueHandler(_log_queue)
+        queue_handler.addFilter(FormContextFilter())
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(logging.DEBUG)
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(_log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def get_logger(name):
+    """返回 ucas_eval 下的子日志器，首次调用时按环境变量完成配置"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def set_form_id(form_id):
+    """设置当前表单的关联ID，之后本线程（及其派生的上下文）的日志都会带上它"""
+    _form_id.set(form_id or "-")
+
+
+def flush_logs(timeout=2.0):
+    """等待队列中的日志输出完毕（交互输入前调用，避免提示被日志插队）"""
+    if _log_queue is None:
+        return
+    deadline = time.monotonic() + timeout
+    while _log_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def prompt(text=""):
+    """先刷新日志再等待用户输入"""
+    flush_logs()
+    return input(text)
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
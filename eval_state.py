@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+本地状态目录工具
+功能：统一管理跨运行持久化的缓存/统计文件（默认 ~/.ucas_eval，可用 UCAS_EVAL_HOME 覆盖）
+"""
+
+import json
+import os
+import tempfile
+
+STATE_DIR = os.environ.get("UCAS_EVAL_HOME") or os.path.join(os.path.expanduser("~"), ".ucas_eval")
+
+
+def state_path(*parts):
+    """返回状态目录下的路径，并确保其父目录存在"""
+    path = os.path.join(STATE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def load_json(path, default=None):
+    """读取JSON文件，不存在或损坏时返回 default"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """原子写入JSON文件，避免中途退出留下半个文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
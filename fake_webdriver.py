@@ -0,0 +1,871 @@
+# -*- coding: utf-8 -*-
+"""
+内存中的假 WebDriver
+功能：把一份 HTML（如 form_fixtures 记录的脱敏表单）解析成文档树，实现填表策略函数用到的那部分 WebDriver 接口
+（find_element(s)、元素的 click/get_attribute/is_selected/send_keys、execute_script 中用到的几段页面脚本），
+不需要 Chrome，单个策略函数毫秒级跑完；每条命令计数，便于对比不同策略的往返次数
+
+- XPath：支持脚本和 selector_config.json 中用到的子集（/、//、.、..、轴::、[@属性]、[n]、text()、contains()、
+  starts-with()、normalize-space()、not()、and/or、=/!=）；CSS 选择器支持 标签#id.类[属性=值] 和后代/子代组合
+- execute_script：只认识已登记的脚本（register_script），其余抛出 FakeScriptError
+- VirtualClock：把指定模块中的 time 换成虚拟时钟，time.sleep 只推进虚拟时间，不真正等待
+
+文档解析和元素查找只依赖标准库；默认登记的页面脚本直接取自 click_strategy、selector_resolver 等模块的原文
+（与被测代码共用同一份，需要安装 selenium）。安装了 selenium 时抛出 selenium 的同名异常，现有代码中的 except 子句照常生效
+"""
+
+import re
+import time as _real_time
+from collections import Counter
+from contextlib import contextmanager
+from html.parser import HTMLParser
+
+try:
+    from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException
+except ImportError:
+    class NoSuchElementException(Exception):
+        pass
+
+    class ElementNotInteractableException(Exception):
+        pass
+
+
+class FakeScriptError(NotImplementedError):
+    """execute_script 收到未登记的脚本"""
+
+
+class XPathError(ValueError):
+    """不支持或无法解析的 XPath / CSS 选择器"""
+
+
+# ---------------------------------------------------------------------------
+# 文档树
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+INVISIBLE_TAGS = {"head", "script", "style", "title", "meta", "link", "template", "noscript"}
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent", "order", "state")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs or {})
+        self.children = []
+        self.parent = parent
+        self.order = 0
+        # 表单控件的运行时状态（checked/value），与初始属性分开，和浏览器一致
+        self.state = {}
+
+    @property
+    def elements(self):
+        return [c for c in self.children if isinstance(c, Node)]
+
+    def own_text(self):
+        return "".join(c for c in self.children if isinstance(c, str))
+
+    def text_content(self):
+        return "".join(c if isinstance(c, str) else c.text_content() for c in self.children)
+
+    def iter_descendants(self):
+        for child in self.elements:
+            yield child
+            yield from child.iter_descendants()
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def __repr__(self):
+        return f"<{self.tag} {self.attrs}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document")
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k: (v if v is not None else "") for k, v in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, {k: (v if v is not None else "") for k, v in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # 向上找到匹配的开始标签；找不到时忽略（容错处理不规范的 HTML）
+        for node in [self.current, *self.current.ancestors()]:
+            if node.tag == tag:
+                self.current = node.parent or self.root
+                return
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    for i, node in enumerate(builder.root.iter_descendants(), 1):
+        node.order = i
+    return builder.root
+
+
+# ---------------------------------------------------------------------------
+# XPath 子集
+
+_TOKEN_RE = re.compile(r"""\s*(?:(//|/|::|\.\.|\.|@|\[|\]|\(|\)|,|!=|=|\*|\|)|('[^']*'|"[^"]*")|(\d+(?:\.\d+)?)|([^\W\d][\w-]*))""")
+
+
+def _tokenize(expression):
+    tokens, pos = [], 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            raise XPathError(f"无法解析的 XPath: {expression!r}（位置 {pos}）")
+        op, string, number, name = match.groups()
+        if op:
+            tokens.append(("op", op))
+        elif string:
+            tokens.append(("str", string[1:-1]))
+        elif number:
+            tokens.append(("num", float(number)))
+        else:
+            tokens.append(("name", name))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """递归下降解析为简单的元组 AST"""
+
+    AXES = {"child", "descendant", "descendant-or-self", "parent", "self", "ancestor",
+            "following-sibling", "preceding-sibling"}
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (value is not None and token[1] != value):
+            raise XPathError(f"XPath 语法错误: {self.expression!r}，期望 {value or kind}，得到 {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def at(self, kind, value=None):
+        token = self.peek()
+        return token[0] == kind and (value is None or token[1] == value)
+
+    def parse(self):
+        expr = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise XPathError(f"XPath 末尾有多余内容: {self.expression!r}")
+        return expr
+
+    def parse_or(self):
+        expr = self.parse_and()
+        while self.at("name", "or"):
+            self.take()
+            expr = ("or", expr, self.parse_and())
+        return expr
+
+    def parse_and(self):
+        expr = self.parse_compare()
+        while self.at("name", "and"):
+            self.take()
+            expr = ("and", expr, self.parse_compare())
+        return expr
+
+    def parse_compare(self):
+        expr = self.parse_union()
+        while self.at("op", "=") or self.at("op", "!="):
+            op = self.take()[1]
+            expr = ("cmp", op, expr, self.parse_union())
+        return expr
+
+    def parse_union(self):
+        expr = self.parse_primary()
+        while self.at("op", "|"):
+            self.take()
+            expr = ("union", expr, self.parse_primary())
+        return expr
+
+    def parse_primary(self):
+        kind, value = self.peek()
+        if kind == "str":
+            self.take()
+            return ("lit", value)
+        if kind == "num":
+            self.take()
+            return ("num", value)
+        if kind == "op" and value == "(":
+            self.take()
+            expr = self.parse_or()
+            self.take("op", ")")
+            predicates = []
+            while self.at("op", "["):
+                self.take()
+                predicates.append(self.parse_or())
+                self.take("op", "]")
+            return ("filter", expr, predicates) if predicates else expr
+        if kind == "op" and value == "@":
+            self.take()
+            return ("attr", self.take("name")[1])
+        if kind == "name" and self.peek(1) == ("op", "(") and value not in ("node",):
+            self.take()
+            self.take("op", "(")
+            if value == "text":
+                self.take("op", ")")
+                return ("text",)
+            args = []
+            while not self.at("op", ")"):
+                args.append(self.parse_or())
+                if self.at("op", ","):
+                    self.take()
+            self.take("op", ")")
+            return ("call", value, args)
+        return self.parse_path()
+
+    def parse_path(self):
+        absolute = False
+        steps = []
+        sep = "/"
+        if self.at("op", "/") or self.at("op", "//"):
+            absolute = True
+            sep = self.take()[1]
+        steps.append((sep, self.parse_step()))
+        while self.at("op", "/") or self.at("op", "//"):
+            sep = self.take()[1]
+            steps.append((sep, self.parse_step()))
+        return ("path", absolute, steps)
+
+    def parse_step(self):
+        if self.at("op", "."):
+            self.take()
+            return ("self", "*", [])
+        if self.at("op", ".."):
+            self.take()
+            return ("parent", "*", [])
+        axis = "child"
+        if self.at("name") and self.peek(1) == ("op", "::"):
+            axis = self.take()[1]
+            self.take()
+            if axis not in self.AXES:
+                raise XPathError(f"不支持的轴: {axis}")
+        if self.at("op", "*"):
+            self.take()
+            test = "*"
+        elif self.at("name", "node") and self.peek(1) == ("op", "("):
+            self.take()
+            self.take("op", "(")
+            self.take("op", ")")
+            test = "*"
+        else:
+            test = self.take("name")[1].lower()
+        predicates = []
+        while self.at("op", "["):
+            self.take()
+            predicates.append(self.parse_or())
+            self.take("op", "]")
+        return (axis, test, predicates)
+
+
+_compiled = {}
+
+
+def compile_xpath(expression):
+    if expression not in _compiled:
+        _compiled[expression] = _Parser(expression).parse()
+    return _compiled[expression]
+
+
+def _axis(node, axis):
+    if axis == "child":
+        return node.elements
+    if axis == "descendant":
+        return list(node.iter_descendants())
+    if axis == "descendant-or-self":
+        return [node, *node.iter_descendants()]
+    if axis == "parent":
+        return [node.parent] if node.parent is not None else []
+    if axis == "self":
+        return [node]
+    if axis == "ancestor":
+        return list(node.ancestors())
+    siblings = node.parent.elements if node.parent is not None else [node]
+    index = siblings.index(node)
+    return siblings[index + 1:] if axis == "following-sibling" else siblings[:index][::-1]
+
+
+def _string(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return value[0].text_content() if value else ""
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else str(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _boolean(value):
+    if isinstance(value, list):
+        return bool(value)
+    return bool(value)
+
+
+def _values(value):
+    """比较时的取值集合：节点集取每个节点的文本，属性缺失时为空集"""
+    if isinstance(value, list):
+        return [n.text_content() for n in value]
+    if value is None:
+        return []
+    return [value]
+
+
+class _Evaluator:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, path, context):
+        _, absolute, steps = path
+        nodes = [self.root] if absolute else [context]
+        for sep, (axis, test, predicates) in steps:
+            result = {}
+            for node in nodes:
+                bases = _axis(node, "descendant-or-self") if sep == "//" else [node]
+                for base in bases:
+                    matched = [n for n in _axis(base, axis)
+                               if n.tag != "#document" and (test == "*" or n.tag == test)]
+                    for predicate in predicates:
+                        matched = self._filter(matched, predicate)
+                    for n in matched:
+                        result[id(n)] = n
+            nodes = sorted(result.values(), key=lambda n: n.order)
+        return nodes
+
+    def _filter(self, nodes, predicate):
+        kept = []
+        size = len(nodes)
+        for position, node in enumerate(nodes, 1):
+            value = self.eval(predicate, node, position, size)
+            if isinstance(value, float) and not isinstance(value, bool):
+                if value == position:
+                    kept.append(node)
+            elif _boolean(value):
+                kept.append(node)
+        return kept
+
+    def eval(self, expr, node, position=1, size=1):
+        kind = expr[0]
+        if kind == "lit":
+            return expr[1]
+        if kind == "num":
+            return expr[1]
+        if kind == "attr":
+            return node.attrs.get(expr[1])
+        if kind == "text":
+            return node.own_text()
+        if kind == "path":
+            return self.path(expr, node)
+        if kind == "filter":
+            # (表达式)[谓词]：谓词中的位置相对整个节点集，而不是每个父节点
+            nodes = self.eval(expr[1], node)
+            for predicate in expr[2]:
+                nodes = self._filter(nodes, predicate)
+            return nodes
+        if kind == "union":
+            merged = {id(n): n for n in self.eval(expr[1], node) + self.eval(expr[2], node)}
+            return sorted(merged.values(), key=lambda n: n.order)
+        if kind == "and":
+            return _boolean(self.eval(expr[1], node, position, size)) and _boolean(self.eval(expr[2], node, position, size))
+        if kind == "or":
+            return _boolean(self.eval(expr[1], node, position, size)) or _boolean(self.eval(expr[2], node, position, size))
+        if kind == "cmp":
+            left = _values(self.eval(expr[2], node, position, size))
+            right = _values(self.eval(expr[3], node, position, size))
+            left = [_string(v) for v in left]
+            right = [_string(v) for v in right]
+            if expr[1] == "=":
+                return any(a == b for a in left for b in right)
+            return any(a != b for a in left for b in right)
+        if kind == "call":
+            return self.call(expr[1], expr[2], node, position, size)
+        raise XPathError(f"不支持的表达式: {expr}")
+
+    def call(self, name, args, node, position, size):
+        values = [self.eval(a, node, position, size) for a in args]
+        if name == "contains":
+            return _string(values[1]) in _string(values[0])
+        if name == "starts-with":
+            return _string(values[0]).startswith(_string(values[1]))
+        if name == "ends-with":
+            return _string(values[0]).endswith(_string(values[1]))
+        if name == "normalize-space":
+            return " ".join(_string(values[0] if values else node.text_content()).split())
+        if name == "concat":
+            return "".join(_string(v) for v in values)
+        if name == "not":
+            return not _boolean(values[0])
+        if name == "string":
+            return _string(values[0] if values else [node])
+        if name == "position":
+            return float(position)
+        if name == "last":
+            return float(size)
+        if name == "count":
+            return float(len(values[0]))
+        raise XPathError(f"不支持的 XPath 函数: {name}()")
+
+
+_CSS_PART_RE = re.compile(r"([#.])([\w-]+)|\[([\w-]+)(?:([*^$]?=)\s*['\"]?([^'\"\]]*)['\"]?)?\]")
+
+
+def css_to_xpath(selector):
+    """CSS 选择器子集转 XPath：标签、#id、.类、[属性]、[属性=值]、[属性*=值]、[属性^=值]、[属性$=值]，空格和 > 组合"""
+    xpaths = []
+    for group in selector.split(","):
+        xpath, sep = "", "//"
+        for part in re.findall(r">|[^\s>]+", group.strip()):
+            if part == ">":
+                sep = "/"
+                continue
+            match = re.match(r"^([\w-]+|\*)?(.*)$", part)
+            tag, rest = match.group(1) or "*", match.group(2)
+            predicates = []
+            consumed = "".join(m.group(0) for m in _CSS_PART_RE.finditer(rest))
+            if consumed != rest:
+                raise XPathError(f"不支持的 CSS 选择器: {selector!r}")
+            for m in _CSS_PART_RE.finditer(rest):
+                prefix, name, attr, op, value = m.groups()
+                if prefix == "#":
+                    predicates.append(f"[@id='{name}']")
+                elif prefix == ".":
+                    predicates.append(f"[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]")
+                elif not op:
+                    predicates.append(f"[@{attr}]")
+                else:
+                    func = {"=": None, "*=": "contains", "^=": "starts-with", "$=": "ends-with"}[op]
+                    predicates.append(f"[@{attr}='{value}']" if func is None else f"[{func}(@{attr}, '{value}')]")
+            xpath += sep + tag + "".join(predicates)
+            sep = "//"
+        xpaths.append(xpath)
+    return " | ".join(xpaths)
+
+
+# ---------------------------------------------------------------------------
+# 虚拟时钟
+
+
+class VirtualClock:
+    """time.sleep 只推进虚拟时间；installed() 期间指定模块里的 time 模块被替换"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.slept = 0.0
+        self.sleeps = 0
+
+    def sleep(self, seconds):
+        seconds = max(0.0, float(seconds))
+        self.now += seconds
+        self.slept += seconds
+        self.sleeps += 1
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def monotonic(self):
+        return self.now
+
+    @contextmanager
+    def installed(self, *modules):
+        proxy = _ClockedTime(self)
+        saved = [(m, m.time) for m in modules if getattr(m, "time", None) is _real_time]
+        for module, _ in saved:
+            module.time = proxy
+        try:
+            yield self
+        finally:
+            for module, original in saved:
+                module.time = original
+
+
+class _ClockedTime:
+    """替代 time 模块：sleep/monotonic/perf_counter/time 走虚拟时钟，其余属性转发给真正的 time"""
+
+    def __init__(self, clock):
+        self._clock = clock
+        self._epoch = _real_time.time()
+
+    def sleep(self, seconds):
+        self._clock.sleep(seconds)
+
+    def monotonic(self):
+        return self._clock.now
+
+    perf_counter = monotonic
+
+    def time(self):
+        return self._epoch + self._clock.now
+
+    def __getattr__(self, name):
+        return getattr(_real_time, name)
+
+
+# ---------------------------------------------------------------------------
+# 驱动与元素
+
+# 与 selenium.webdriver.common.by.By 的取值相同，可直接传 By.XPATH 等
+BY_XPATH, BY_CSS, BY_ID, BY_NAME, BY_TAG = "xpath", "css selector", "id", "name", "tag name"
+
+
+def _is_displayed(node):
+    for n in (node, *node.ancestors()):
+        if n.tag in INVISIBLE_TAGS or "hidden" in n.attrs:
+            return False
+        style = n.attrs.get("style", "").replace(" ", "").lower()
+        if "display:none" in style or "visibility:hidden" in style:
+            return False
+    return not (node.tag == "input" and node.attrs.get("type", "").lower() == "hidden")
+
+
+def _input_type(node):
+    return node.attrs.get("type", "text").lower() if node.tag == "input" else ""
+
+
+class FakeElement:
+    def __init__(self, driver, node):
+        self._driver = driver
+        self._node = node
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElement) and other._node is self._node
+
+    def __hash__(self):
+        return id(self._node)
+
+    def __repr__(self):
+        return f"FakeElement{self._node!r}"
+
+    @property
+    def tag_name(self):
+        self._driver._command("tag_name")
+        return self._node.tag
+
+    @property
+    def text(self):
+        self._driver._command("text")
+        if not _is_displayed(self._node):
+            return ""
+        return " ".join(self._node.text_content().split())
+
+    @property
+    def location(self):
+        self._driver._command("location")
+        return self._driver._location(self._node)
+
+    @property
+    def size(self):
+        self._driver._command("size")
+        return {"width": 20, "height": 20}
+
+    def get_attribute(self, name):
+        self._driver._command("get_attribute")
+        return self._driver._property(self._node, name)
+
+    def is_displayed(self):
+        self._driver._command("is_displayed")
+        return _is_displayed(self._node)
+
+    def is_enabled(self):
+        self._driver._command("is_enabled")
+        return "disabled" not in self._node.attrs
+
+    def is_selected(self):
+        self._driver._command("is_selected")
+        return self._driver._checked(self._node)
+
+    def click(self):
+        """原生点击：元素不可见或被禁用时与浏览器一样抛出异常"""
+        self._driver._command("click")
+        if not _is_displayed(self._node) or "disabled" in self._node.attrs:
+            raise ElementNotInteractableException(f"element not interactable: {self._node!r}")
+        self._driver._activate(self._node)
+
+    def clear(self):
+        self._driver._command("clear")
+        self._node.state["value"] = ""
+
+    def send_keys(self, *values):
+        self._driver._command("send_keys")
+        self._node.state["value"] = self._driver._value(self._node) + "".join(str(v) for v in values)
+
+    def find_element(self, by=BY_XPATH, value=None):
+        return self._driver._find(by, value, self._node, single=True)
+
+    def find_elements(self, by=BY_XPATH, value=None):
+        return self._driver._find(by, value, self._node, single=False)
+
+
+class FakeDriver:
+    """
+    commands 统计每种命令的调用次数（相当于真实驱动的 HTTP 往返），round_trips 为总数；
+    clock 给定时每条命令再推进 rtt 秒虚拟时间，用于估算真实浏览器上的耗时
+    """
+
+    _scripts = {}
+    _defaults_registered = False
+
+    def __init__(self, html, url="file:///fake/page.html", clock=None, rtt=0.0):
+        self.root = parse_html(html)
+        self.html = html
+        self.current_url = url
+        self.clock = clock
+        self.rtt = rtt
+        self.commands = Counter()
+        self.clicked = []
+        self._evaluator = _Evaluator(self.root)
+        self.current_window_handle = "fake-window"
+        self.window_handles = [self.current_window_handle]
+
+    # -- 计数
+
+    def _command(self, name):
+        self.commands[name] += 1
+        if self.clock is not None and self.rtt:
+            self.clock.advance(self.rtt)
+
+    @property
+    def round_trips(self):
+        return sum(self.commands.values())
+
+    # -- 查找
+
+    def select(self, by, value, context=None):
+        """不计数的查找，返回 Node 列表（供脚本处理函数和检查使用）"""
+        context = context or self.root
+        if by == BY_XPATH:
+            result = self._evaluator.eval(compile_xpath(value), context)
+            if not isinstance(result, list):
+                raise XPathError(f"XPath 结果不是节点集: {value!r}")
+            return result
+        if by == BY_CSS:
+            prefix = "." if context is not self.root else ""
+            return self.select(BY_XPATH, " | ".join(prefix + x.strip() for x in css_to_xpath(value).split("|")), context)
+        if by == BY_ID:
+            return [n for n in context.iter_descendants() if n.attrs.get("id") == value]
+        if by == BY_NAME:
+            return [n for n in context.iter_descendants() if n.attrs.get("name") == value]
+        if by == BY_TAG:
+            return [n for n in context.iter_descendants() if n.tag == value.lower()]
+        raise XPathError(f"不支持的定位方式: {by}")
+
+    def _find(self, by, value, context, single):
+        self._command("find_element" if single else "find_elements")
+        nodes = self.select(by, value, context)
+        if single:
+            if not nodes:
+                raise NoSuchElementException(f"no such element: {by}={value!r}")
+            return FakeElement(self, nodes[0])
+        return [FakeElement(self, n) for n in nodes]
+
+    def find_element(self, by=BY_XPATH, value=None):
+        return self._find(by, value, self.root, single=True)
+
+    def find_elements(self, by=BY_XPATH, value=None):
+        return self._find(by, value, self.root, single=False)
+
+    # -- 页面
+
+    @property
+    def page_source(self):
+        self._command("page_source")
+        return self.html
+
+    @property
+    def title(self):
+        nodes = self.select(BY_TAG, "title")
+        return nodes[0].text_content().strip() if nodes else ""
+
+    def get(self, url):
+        self._command("get")
+        self.current_url = url
+
+    def execute_script(self, script, *args):
+        self._command("execute_script")
+        handler = self._lookup_script(script)
+        if handler is None:
+            raise FakeScriptError(f"假驱动未登记该脚本: {script.strip()[:60]!r}")
+        args = [a._node if isinstance(a, FakeElement) else a for a in args]
+        return self._wrap(handler(self, *args))
+
+    def _wrap(self, value):
+        """脚本返回的节点包装为元素，与真实驱动一致"""
+        if isinstance(value, Node):
+            return FakeElement(self, value)
+        if isinstance(value, list):
+            return [self._wrap(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self._wrap(v) for k, v in value.items()}
+        return value
+
+    @classmethod
+    def register_script(cls, script, handler):
+        """登记页面脚本的 Python 实现：handler(driver, *参数)，元素参数以 Node 传入"""
+        cls._scripts[" ".join(script.split())] = handler
+
+    @classmethod
+    def _lookup_script(cls, script):
+        if not cls._defaults_registered:
+            _register_default_scripts()
+        normalized = " ".join(script.split())
+        handler = cls._scripts.get(normalized)
+        if handler is None and normalized.startswith("arguments[0].scrollIntoView("):
+            return lambda driver, *args: None
+        return handler
+
+    # -- 表单控件状态
+
+    def _checked(self, node):
+        if "checked" not in node.state:
+            node.state["checked"] = "checked" in node.attrs
+        return node.state["checked"]
+
+    def _value(self, node):
+        if "value" not in node.state:
+            node.state["value"] = node.own_text() if node.tag == "textarea" else node.attrs.get("value", "")
+        return node.state["value"]
+
+    def _property(self, node, name):
+        if name == "value":
+            return self._value(node)
+        if name == "checked":
+            return "true" if self._checked(node) else None
+        if name in ("innerText", "textContent"):
+            return node.text_content()
+        return node.attrs.get(name)
+
+    def _activate(self, node):
+        """点击效果：单选按钮选中并取消同组其他按钮，复选框切换"""
+        self.clicked.append(node)
+        kind = _input_type(node)
+        if kind == "radio":
+            name = node.attrs.get("name")
+            if name:
+                for other in self.select(BY_NAME, name):
+                    if _input_type(other) == "radio":
+                        other.state["checked"] = False
+            node.state["checked"] = True
+        elif kind == "checkbox":
+            node.state["checked"] = not self._checked(node)
+
+    def _location(self, node):
+        """合成坐标：所在表格行决定 y，行内文档顺序决定 x（足够让"按水平位置排序"的逻辑正常工作）"""
+        row = next((a for a in node.ancestors() if a.tag == "tr"), None)
+        rows = self.select(BY_TAG, "tr")
+        y = (rows.index(row) if row in rows else 0) * 30
+        x = node.order - (row.order if row else 0)
+        return {"x": x * 10, "y": y}
+
+    def form_state(self):
+        """与 form_fixtures.STRUCTURE_SCRIPT 相同的表单结构及填写情况"""
+        radios = [n for n in self.select(BY_TAG, "input") if _input_type(n) == "radio"]
+        groups = {}
+        for i, radio in enumerate(radios):
+            row = next((a for a in radio.ancestors() if a.tag == "tr"), None)
+            key = radio.attrs.get("name") or (f"row{row.order}" if row else f"radio{i}")
+            groups[key] = groups.get(key, False) or self._checked(radio)
+        rows = [tr for tr in self.select(BY_TAG, "tr")
+                if any(_input_type(n) == "radio" for n in tr.iter_descendants())]
+        checkboxes = [n for n in self.select(BY_TAG, "input") if _input_type(n) == "checkbox"]
+        textareas = self.select(BY_TAG, "textarea")
+        return {
+            "rows": [sum(1 for n in tr.iter_descendants() if _input_type(n) == "radio") for tr in rows],
+            "radio_groups": len(groups),
+            "radio_checked": sum(1 for v in groups.values() if v),
+            "checkboxes": len(checkboxes),
+            "checkboxes_checked": sum(1 for c in checkboxes if self._checked(c)),
+            "textareas": len(textareas),
+            "textareas_filled": sum(1 for t in textareas if self._value(t).strip()),
+        }
+
+    # -- 其他常用接口（空实现）
+
+    def get_cookies(self):
+        return []
+
+    def quit(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# 默认登记的页面脚本
+
+
+def _resolve_selectors(driver, groups):
+    """selector_resolver.RESOLVE_SCRIPT 的 Python 实现"""
+    by = {"id": BY_ID, "name": BY_NAME, "css": BY_CSS, "xpath": BY_XPATH}
+    result = {}
+    for name, candidates in groups.items():
+        result[name] = None
+        for kind, value, index in candidates:
+            try:
+                nodes = driver.select(by.get(kind, BY_XPATH), value)
+            except XPathError:
+                continue
+            if nodes and _is_displayed(nodes[0]) and "disabled" not in nodes[0].attrs:
+                result[name] = {"element": nodes[0], "index": index}
+                break
+    return result
+
+
+def _js_click(driver, node):
+    driver._activate(node)
+
+
+def _js_click_checked(driver, node):
+    driver._activate(node)
+    return driver._checked(node)
+
+
+def _force_checked(driver, node):
+    node.state["checked"] = True
+    return True
+
+
+def _set_value(driver, node, value):
+    node.state["value"] = value
+
+
+def _register_default_scripts():
+    """第一次执行脚本时登记默认实现；调用方事先用 register_script 登记的同一脚本保持不变"""
+    FakeDriver._defaults_registered = True
+
+    def register(script, handler):
+        FakeDriver._scripts.setdefault(" ".join(script.split()), handler)
+
+    register("arguments[0].click();", _js_click)
+    register("arguments[0].value = arguments[1];", _set_value)
+    register("return window.devicePixelRatio", lambda driver: 1)
+    register("return window.devicePixelRatio;", lambda driver: 1)
+    from selector_resolver import RESOLVE_SCRIPT
+    register(RESOLVE_SCRIPT, _resolve_selectors)
+    from form_fixtures import STRUCTURE_SCRIPT
+    register(STRUCTURE_SCRIPT, lambda driver: driver.form_state())
+    from click_strategy import JS_CLICK_SCRIPT, FORCE_CHECKED_SCRIPT
+    register(JS_CLICK_SCRIPT, _js_click_checked)
+    register(FORCE_CHECKED_SCRIPT, _force_checked)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+快速启动
+功能：
+- 启动浏览器的同时在后台线程预先导入较重的依赖（requests、jwt、PIL），首次调用API/处理图片时不再等待
+- 第一次启动后缓存 chromedriver/浏览器路径，之后直接使用，不再经过 Selenium Manager（它可能联网解析）
+- 记录启动各阶段耗时，首个表单就绪时输出一行分解
+
+路径也可用环境变量 UCAS_EVAL_CHROMEDRIVER / UCAS_EVAL_CHROME_BINARY 直接指定
+"""
+
+import importlib
+import os
+import threading
+import time
+
+from eval_state import state_path, load_json, save_json
+from eval_logging import get_logger
+
+log = get_logger("fast_start")
+
+DRIVER_PATHS_FILE = "driver_paths.json"
+
+# 首次调用智谱API或处理验证码图片时才需要的模块
+HEAVY_MODULES = ("requests", "jwt", "PIL.Image", "PIL.ImageEnhance")
+
+
+class StartupTimer:
+    """按阶段记录启动耗时；skip() 丢弃等待用户输入的时间，不计入启动耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.stages = []
+        self.waited = 0.0
+        self.reported = False
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.stages.append((label, now - self.last))
+        self.last = now
+
+    def skip(self):
+        now = time.perf_counter()
+        self.waited += now - self.last
+        self.last = now
+
+    def report(self, label):
+        """记录最后一个阶段并返回耗时分解（只在第一次调用时返回，之后返回 None）"""
+        if self.reported:
+            return None
+        self.mark(label)
+        self.reported = True
+        total = sum(seconds for _, seconds in self.stages)
+        parts = "，".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages)
+        waited = f"（另有等待输入 {self.waited:.1f}s 未计入）" if self.waited >= 0.05 else ""
+        return f"⏱️ 启动耗时 {total:.2f}s: {parts}{waited}"
+
+
+# 进程级计时器，从本模块被导入时开始计时
+STARTUP = StartupTimer()
+
+
+def preload_in_background(modules=HEAVY_MODULES):
+    """在守护线程中导入模块，与浏览器启动并行"""
+    def _preload():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                log.debug(f"预加载 {name} 失败: {e}")
+
+    thread = threading.Thread(target=_preload, name="preload-imports", daemon=True)
+    thread.start()
+    return thread
+
+
+def launched_browser_path(driver, options):
+    """
+    实际启动的浏览器可执行文件：chromedriver 的 capabilities 不含浏览器路径，
+    这里取 chromedriver 直接启动的浏览器主进程的可执行文件（需要 psutil）；取不到时退回 options 中指定的路径
+    """
+    try:
+        import psutil
+        for child in psutil.Process(driver.service.process.pid).children():
+            if "chrom" in child.name().lower():
+                return child.exe()
+    except Exception as e:
+        log.debug(f"获取浏览器路径失败: {e}")
+    return options.binary_location or None
+
+
+def create_chrome(options):
+    """
+    启动 Chrome：优先使用环境变量或本地缓存中的 chromedriver/浏览器路径；
+    没有缓存或缓存的路径启动失败（如浏览器升级后版本不匹配）时交给 Selenium 解析，并缓存解析结果
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    path = state_path(DRIVER_PATHS_FILE)
+    cached = load_json(path, default={}) or {}
+    driver_path = os.environ.get("UCAS_EVAL_CHROMEDRIVER") or cached.get("driver")
+    browser_path = os.environ.get("UCAS_EVAL_CHROME_BINARY") or cached.get("browser")
+
+    if driver_path and os.path.isfile(driver_path) and (not browser_path or os.path.isfile(browser_path)):
+        original_binary = options.binary_location
+        if browser_path and not original_binary:
+            options.binary_location = browser_path
+        try:
+            return webdriver.Chrome(service=Service(executable_path=driver_path), options=options)
+        except Exception as e:
+            log.warning(f"⚠️ 使用缓存的 chromedriver 启动失败，重新解析: {e}")
+            options.binary_location = original_binary
+
+    driver = webdriver.Chrome(options=options)
+    try:
+        save_json(path, {"driver": driver.service.path, "browser": launched_browser_path(driver, options)})
+    except (OSError, AttributeError) as e:
+        log.debug(f"缓存 chromedriver 路径失败: {e}")
+    return driver
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+单表单时间预算
+功能：每个表单开始时设定总时间预算（环境变量 UCAS_EVAL_FORM_BUDGET，默认 180 秒），
+各阶段的等待（WebDriverWait、页面状态轮询、页面加载、智谱API请求及其重试退避）都从剩余时间中扣取，
+预算用完时在阶段边界抛出 FormDeadlineExceeded，由主循环中止该表单并记录，批次总耗时因此可预期
+守护进程还可为当前表单挂一个取消事件，事件被设置后下一个阶段边界抛出 FormCancelled
+
+当前预算放在 contextvar 中（与日志的表单关联ID相同），等待点只需调用 budget(默认超时)；
+没有设定预算时（如登录流程、离线回放）budget() 原样返回默认值
+"""
+
+import contextvars
+import os
+import time
+
+from eval_logging import get_logger
+
+log = get_logger("form_deadline")
+
+DEFAULT_FORM_BUDGET = 180.0
+
+# 预算将尽时等待点仍保留的最短超时，避免传入 0 导致请求库报错或轮询一次都不执行
+MIN_WAIT = 0.5
+
+_current = contextvars.ContextVar("form_deadline", default=None)
+_cancel = contextvars.ContextVar("form_cancel", default=None)
+
+
+class FormDeadlineExceeded(Exception):
+    """表单超出时间预算；phase 为超时时所处的阶段"""
+
+    def __init__(self, phase, budget):
+        super().__init__(f"超出 {budget:.0f}s 时间预算（阶段: {phase}）")
+        self.phase = phase
+        self.budget = budget
+
+
+class FormCancelled(FormDeadlineExceeded):
+    """表单被外部取消；沿用 FormDeadlineExceeded 的中止路径，各阶段的异常处理都会原样抛出"""
+
+    def __init__(self, phase):
+        Exception.__init__(self, f"任务已取消（阶段: {phase}）")
+        self.phase = phase
+        self.budget = None
+
+
+class FormDeadline:
+    """一个表单的截止时间；phase 记录最近一次检查所在的阶段，用于超时报告"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+        self.phase = "开始"
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def check(self, phase):
+        """进入新阶段前调用：预算已用完时抛出 FormDeadlineExceeded"""
+        self.phase = phase
+        if self.expired:
+            raise FormDeadlineExceeded(phase, self.budget)
+
+    def timeout(self, default):
+        """等待点的实际超时：默认值与剩余时间取小，但不低于 MIN_WAIT"""
+        return max(MIN_WAIT, min(default, self.remaining()))
+
+
+def form_budget_seconds():
+    try:
+        return float(os.environ.get("UCAS_EVAL_FORM_BUDGET", DEFAULT_FORM_BUDGET))
+    except ValueError:
+        log.warning("⚠️ UCAS_EVAL_FORM_BUDGET 不是有效数字，使用默认预算")
+        return DEFAULT_FORM_BUDGET
+
+
+def start_form_deadline(budget=None):
+    """为当前表单开始计时（覆盖上一个表单的预算），返回 FormDeadline"""
+    deadline = FormDeadline(budget if budget is not None else form_budget_seconds())
+    _current.set(deadline)
+    return deadline
+
+
+def clear_form_deadline():
+    _current.set(None)
+    _cancel.set(None)
+
+
+def set_form_cancel(event):
+    """为当前表单挂上取消事件（threading.Event），在 clear_form_deadline 时一并清除"""
+    _cancel.set(event)
+
+
+def current_deadline():
+    return _current.get()
+
+
+def budget(default):
+    """等待点使用：有预算时返回扣减后的超时，否则返回默认值"""
+    deadline = _current.get()
+    return deadline.timeout(default) if deadline else default
+
+
+def check_deadline(phase):
+    """阶段边界使用：表单已被取消时抛出 FormCancelled；没有预算时只检查取消"""
+    cancel = _cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise FormCancelled(phase)
+    deadline = _current.get()
+    if deadline:
+        deadline.check(phase)
+
+
+def navigate_within_budget(driver, url, default_timeout=30):
+    """
+    带超时的页面导航：页面加载时间受剩余预算约束，卡住的页面会被停止加载并按超时中止该表单，
+    而不是让导航无限期阻塞。driver 可以是 WebDriver 或 browser_backend 中的后端，导航经由后端执行
+    """
+    from browser_backend import create_backend, NavigationTimeout
+
+    deadline = _current.get()
+    try:
+        create_backend(driver).navigate(url, timeout=budget(default_timeout))
+    except NavigationTimeout:
+        raise FormDeadlineExceeded("打开页面", deadline.budget if deadline else default_timeout)
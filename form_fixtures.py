@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+评估表单样本记录
+功能：可选地保存每个评估页面的 DOM 和验证码图片（姓名、学号等信息已脱敏），按表单结构指纹分类，
+作为离线回放（form_replay.py）的回归样本
+
+开启方式：环境变量 UCAS_EVAL_RECORD_FIXTURES=1，样本保存在 ~/.ucas_eval/form_fixtures/<指纹>/<序号>/
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+from eval_state import state_path, load_json, save_json
+from selector_resolver import form_template
+from comment_generator import scrape_form_context
+from eval_logging import get_logger
+
+log = get_logger("form_fixtures")
+
+FIXTURES_DIR = "form_fixtures"
+
+# 表单结构：每个含单选按钮的表格行有几个选项、单选组/复选框/文本域数量及填写情况；记录和回放共用
+STRUCTURE_SCRIPT = """
+const radios = Array.from(document.querySelectorAll('input[type=radio]'));
+const groups = {};
+radios.forEach((r, i) => {
+    const row = r.closest('tr');
+    const key = r.name || (row ? 'row' + row.rowIndex : 'radio' + i);
+    groups[key] = groups[key] || r.checked;
+});
+const rows = Array.from(document.querySelectorAll('tr')).filter(tr => tr.querySelector('input[type=radio]'))
+    .map(tr => tr.querySelectorAll('input[type=radio]').length);
+const checkboxes = Array.from(document.querySelectorAll('input[type=checkbox]'));
+const textareas = Array.from(document.querySelectorAll('textarea'));
+return {
+    rows: rows,
+    radio_groups: Object.keys(groups).length,
+    radio_checked: Object.values(groups).filter(Boolean).length,
+    checkboxes: checkboxes.length,
+    checkboxes_checked: checkboxes.filter(c => c.checked).length,
+    textareas: textareas.length,
+    textareas_filled: textareas.filter(t => t.value.trim()).length,
+};
+"""
+
+# 出现在这些标签后的 2~6 个汉字视为人名
+NAME_LABEL_PATTERN = re.compile(r"(姓名|教师|老师|学生|用户|欢迎您?)(\s*[:：，,]\s*)([一-龥·]{2,6})")
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+# 4位以上的数字串（学号、课程/教师ID、会话参数等）
+DIGITS_PATTERN = re.compile(r"\d{4,}")
+SCRIPT_PATTERN = re.compile(r"<script\b.*?</script\s*>", re.S | re.I)
+EVENT_ATTR_PATTERN = re.compile(r"\s+on[a-z]+\s*=\s*(\"[^\"]*\"|'[^']*')", re.I)
+BASE_TAG_PATTERN = re.compile(r"<base\b[^>]*>", re.I)
+IMG_TAG_PATTERN = re.compile(r"<img\b[^>]*>", re.I)
+SRC_ATTR_PATTERN = re.compile(r"\bsrc\s*=\s*(\"[^\"]*\"|'[^']*')", re.I)
+# 隐藏输入框（表单令牌、会话ID等）和 csrf/token 类 meta 标签的值
+INPUT_TAG_PATTERN = re.compile(r"<input\b[^>]*>", re.I)
+META_TAG_PATTERN = re.compile(r"<meta\b[^>]*>", re.I)
+HIDDEN_TYPE_PATTERN = re.compile(r"\btype\s*=\s*[\"']?hidden\b", re.I)
+SECRET_NAME_PATTERN = re.compile(r"\bname\s*=\s*[\"']?[\w.-]*(csrf|token|session|auth)", re.I)
+VALUE_ATTR_PATTERN = re.compile(r"\b(value|content)\s*=\s*(\"[^\"]*\"|'[^']*'|[^\s>]+)", re.I)
+# URL 中的会话参数：;jsessionid=... 以及名称含 token/session/sid/ticket/auth/key 的查询参数
+JSESSIONID_PATTERN = re.compile(r"(;jsessionid=)[^?#\"'\s<>]*", re.I)
+SECRET_PARAM_PATTERN = re.compile(
+    r"([?&](?:amp;)?[\w.-]*(?:token|session|sid|ticket|auth|key|csrf)[\w.-]*=)[^&#\"'\s<>]*", re.I)
+
+
+def _blank_value(tag):
+    return VALUE_ATTR_PATTERN.sub(lambda m: f'{m.group(1)}=""', tag)
+
+
+def anonymize_html(html, names=()):
+    """
+    脱敏页面源码：去掉脚本和内联事件，替换已知姓名、标签后的人名、邮箱和长数字串，
+    清空隐藏输入框和令牌类 meta 标签的值以及 URL 中的会话/令牌参数，验证码图片改为引用同目录下的 captcha.png
+    """
+    html = SCRIPT_PATTERN.sub("", html)
+    html = EVENT_ATTR_PATTERN.sub("", html)
+    html = BASE_TAG_PATTERN.sub("", html)
+    html = NAME_LABEL_PATTERN.sub(lambda m: m.group(1) + m.group(2) + "某某", html)
+    for i, name in enumerate(n for n in names if n and len(n) >= 2):
+        html = html.replace(name, f"匿名{i + 1}")
+    html = EMAIL_PATTERN.sub("user@example.com", html)
+    html = INPUT_TAG_PATTERN.sub(lambda m: _blank_value(m.group(0)) if HIDDEN_TYPE_PATTERN.search(m.group(0)) else m.group(0), html)
+    html = META_TAG_PATTERN.sub(lambda m: _blank_value(m.group(0)) if SECRET_NAME_PATTERN.search(m.group(0)) else m.group(0), html)
+    html = JSESSIONID_PATTERN.sub(r"\1", html)
+    html = SECRET_PARAM_PATTERN.sub(r"\1", html)
+    html = DIGITS_PATTERN.sub(lambda m: "0" * len(m.group(0)), html)
+
+    def local_captcha(match):
+        tag = match.group(0)
+        if re.search(r"captcha|validate", tag, re.I):
+            return SRC_ATTR_PATTERN.sub('src="captcha.png"', tag)
+        return tag
+
+    return IMG_TAG_PATTERN.sub(local_captcha, html)
+
+
+def structure_fingerprint(template, structure, has_captcha):
+    """结构指纹：模板 + 各行选项数 + 复选框/文本域数量 + 是否有验证码，与具体课程和填写状态无关"""
+    key = {
+        "template": template, "rows": structure.get("rows", []), "checkboxes": structure.get("checkboxes", 0),
+        "textareas": structure.get("textareas", 0), "captcha": bool(has_captcha),
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def read_structure(driver):
+    try:
+        return driver.execute_script(STRUCTURE_SCRIPT) or {}
+    except Exception as e:
+        log.warning(f"⚠️ 读取表单结构失败: {e}")
+        return {}
+
+
+class FixtureRecorder:
+    """
+    capture() 在填表前调用，保存脱敏后的页面和验证码图片；同一结构指纹最多保留 per_fingerprint 份
+    """
+
+    def __init__(self, enabled=None, directory=None, per_fingerprint=3):
+        if enabled is None:
+            enabled = os.environ.get("UCAS_EVAL_RECORD_FIXTURES", "").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.directory = directory or os.path.dirname(state_path(FIXTURES_DIR, "index.json"))
+        self.per_fingerprint = per_fingerprint
+
+    def capture(self, driver, kind, captcha_image=None):
+        """保存当前评估页面，返回样本目录（未开启、样本已足够或失败时返回 None）"""
+        if not self.enabled:
+            return None
+        try:
+            template = form_template(driver.current_url)
+            structure = read_structure(driver)
+            fingerprint = structure_fingerprint(template, structure, captcha_image is not None)
+            target = os.path.join(self.directory, fingerprint)
+            existing = os.listdir(target) if os.path.isdir(target) else []
+            if len(existing) >= self.per_fingerprint:
+                return None
+            html = anonymize_html(driver.page_source, scrape_form_context(driver))
+            captcha_png = captcha_image.screenshot_as_png if captcha_image is not None else None
+        except Exception as e:
+            log.warning(f"⚠️ 记录表单样本失败: {e}")
+            return None
+
+        sample_dir = os.path.join(target, time.strftime("%Y%m%d-%H%M%S"))
+        try:
+            os.makedirs(sample_dir, exist_ok=True)
+            with open(os.path.join(sample_dir, "page.html"), "w", encoding="utf-8") as f:
+                f.write(html)
+            if captcha_png:
+                with open(os.path.join(sample_dir, "captcha.png"), "wb") as f:
+                    f.write(captcha_png)
+            save_json(os.path.join(sample_dir, "meta.json"), {
+                "fingerprint": fingerprint, "kind": kind, "template": template,
+                "structure": structure, "captcha": bool(captcha_png), "captured": time.time(),
+            })
+        except OSError as e:
+            log.warning(f"⚠️ 保存表单样本失败: {e}")
+            return None
+        log.info(f"🧪 已记录表单样本 {fingerprint}（{kind}）")
+        return sample_dir
+
+
+def load_fixtures(directory=None, kind=None):
+    """读取全部样本，返回 meta 列表（附带 path 字段），可按 kind 过滤"""
+    directory = directory or os.path.dirname(state_path(FIXTURES_DIR, "index.json"))
+    fixtures = []
+    if not os.path.isdir(directory):
+        return fixtures
+    for fingerprint in sorted(os.listdir(directory)):
+        fingerprint_dir = os.path.join(directory, fingerprint)
+        if not os.path.isdir(fingerprint_dir):
+            continue
+        for sample in sorted(os.listdir(fingerprint_dir)):
+            sample_dir = os.path.join(fingerprint_dir, sample)
+            meta = load_json(os.path.join(sample_dir, "meta.json"))
+            if not meta or not os.path.exists(os.path.join(sample_dir, "page.html")):
+                continue
+            if kind and meta.get("kind") != kind:
+                continue
+            meta["path"] = sample_dir
+            fixtures.append(meta)
+    return fixtures
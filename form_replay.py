@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评估表单离线回放
+功能：用无头 Chrome 打开记录下来的脱敏表单样本，运行两个评估脚本的填表逻辑，
+检查单选/复选/文本域是否填好、验证码元素能否定位，并统计每个样本的耗时，作为提速改动的回归检查
+
+用法：
+    python form_replay.py                 # 回放全部样本
+    python form_replay.py -k teacher -v   # 只回放教师评估样本，显示浏览器窗口
+样本由评估脚本在 UCAS_EVAL_RECORD_FIXTURES=1 时自动记录；回放使用临时状态目录，不影响已学到的缓存
+不配置验证码API，遇到需要人工处理的步骤直接跳过并计数
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import eval_state
+from form_fixtures import load_fixtures, read_structure
+from eval_logging import get_logger, flush_logs
+
+log = get_logger("form_replay")
+
+
+def create_replay_driver(visible=False):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    if not visible:
+        options.add_argument("--headless=new")
+    options.add_argument("--window-size=1400,1000")
+    options.add_argument("--allow-file-access-from-files")
+    return webdriver.Chrome(options=options)
+
+
+def load_fill_functions():
+    """加载两个脚本（需在切换临时状态目录之后），把人工确认换成计数"""
+    import eval_course
+    import captcha_flow
+    from eval_daemon import load_teacher_module
+
+    teacher = load_teacher_module()
+    manual_prompts = []
+    for module in (eval_course, teacher, captcha_flow):
+        module.prompt = lambda text="": manual_prompts.append(text) or ""
+    fills = {
+        "course": (lambda driver: eval_course.fill_evaluation_form_with_multiselect(driver), eval_course),
+        "teacher": (lambda driver: teacher.fill_evaluation_form(driver), teacher),
+    }
+    return fills, manual_prompts
+
+
+def check_result(fixture, structure, captcha_found):
+    """对照填写后的表单结构给出问题列表，空列表即通过"""
+    problems = []
+    if structure.get("radio_checked", 0) < structure.get("radio_groups", 0):
+        problems.append(f"单选 {structure['radio_checked']}/{structure['radio_groups']}")
+    if structure.get("textareas_filled", 0) < structure.get("textareas", 0):
+        problems.append(f"文本域 {structure['textareas_filled']}/{structure['textareas']}")
+    if fixture["kind"] == "course" and structure.get("checkboxes") and not structure.get("checkboxes_checked"):
+        problems.append("多选未勾选")
+    if fixture.get("captcha") and not captcha_found:
+        problems.append("验证码元素未定位")
+    return problems
+
+
+def replay(driver, fixtures, fills, manual_prompts):
+    results = []
+    for fixture in fixtures:
+        fill, module = fills[fixture["kind"]]
+        driver.get("file://" + os.path.join(os.path.abspath(fixture["path"]), "page.html"))
+        prompts_before = len(manual_prompts)
+        started = time.monotonic()
+        try:
+            fill(driver)
+            error = ""
+        except Exception as e:
+            error = str(e)
+        elapsed = time.monotonic() - started
+        captcha_input, captcha_image = module.find_captcha_elements(driver)
+        problems = check_result(fixture, read_structure(driver), bool(captcha_input and captcha_image))
+        if error:
+            problems.append(f"异常: {error[:60]}")
+        results.append({
+            "fingerprint": fixture["fingerprint"], "kind": fixture["kind"], "elapsed": elapsed,
+            "manual": len(manual_prompts) - prompts_before, "problems": problems,
+        })
+    return results
+
+
+def print_report(results):
+    log.info("")
+    log.info(f"{'指纹':<14}{'类型':<9}{'耗时(s)':>8}{'人工':>6}  结果")
+    for r in results:
+        verdict = "✅ 通过" if not r["problems"] else "❌ " + "；".join(r["problems"])
+        log.info(f"{r['fingerprint']:<14}{r['kind']:<9}{r['elapsed']:>8.2f}{r['manual']:>6}  {verdict}")
+    passed = sum(1 for r in results if not r["problems"])
+    total_time = sum(r["elapsed"] for r in results)
+    log.info(f"\n📊 通过 {passed}/{len(results)}，填表总耗时 {total_time:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评估表单离线回放")
+    parser.add_argument("-d", "--fixtures", help="样本目录，默认 ~/.ucas_eval/form_fixtures")
+    parser.add_argument("-k", "--kind", choices=["teacher", "course"], help="只回放指定类型的表单")
+    parser.add_argument("-v", "--visible", action="store_true", help="显示浏览器窗口")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures, args.kind)
+    if not fixtures:
+        log.error("❌ 没有可回放的样本（需开启 UCAS_EVAL_RECORD_FIXTURES=1 运行评估脚本）")
+        flush_logs()
+        return 1
+
+    # 选择器缓存、点击策略等从空白状态开始，结果可复现，也不污染真实运行学到的数据
+    eval_state.STATE_DIR = tempfile.mkdtemp(prefix="ucas_eval_replay_")
+    fills, manual_prompts = load_fill_functions()
+
+    log.info(f"🧪 回放 {len(fixtures)} 个表单样本")
+    driver = create_replay_driver(args.visible)
+    try:
+        results = replay(driver, fixtures, fills, manual_prompts)
+    finally:
+        driver.quit()
+    print_report(results)
+    flush_logs()
+    return 0 if all(not r["problems"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
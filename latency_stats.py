@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+延迟统计工具
+功能：分位数计算（离线评测报告、模型路由）和可持久化的对数分桶延迟直方图（自适应等待超时）
+"""
+
+import math
+
+
+def percentile(values, q):
+    """最近秩法求分位数，values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# 直方图桶上界（秒）：0.05s 起按 1.25 倍递增到约 60s，最后一个桶收纳更慢的样本
+BUCKET_BOUNDS = tuple(round(0.05 * 1.25 ** i, 3) for i in range(33))
+
+
+class LatencyHistogram:
+    """
+    对数分桶的延迟直方图，可序列化为 JSON 持久化；
+    每次加入样本前旧计数按 half_life 个样本的半衰期衰减，较新的观测占更大权重。
+    等待超时只知道"至少这么久"，记为删失样本（censored），单独计数、不进入分桶
+    """
+
+    def __init__(self, counts=None, censored=0, half_life=200):
+        self.counts = [float(c) for c in list(counts or [])[:len(BUCKET_BOUNDS)]]
+        self.counts += [0.0] * (len(BUCKET_BOUNDS) - len(self.counts))
+        self.censored = float(censored or 0)
+        self.decay = 0.5 ** (1 / half_life)
+
+    @property
+    def total(self):
+        """已完成样本的（衰减后）计数，不含删失样本"""
+        return sum(self.counts)
+
+    def _age(self):
+        self.counts = [c * self.decay for c in self.counts]
+        self.censored *= self.decay
+
+    def add(self, seconds):
+        self._age()
+        for i, bound in enumerate(BUCKET_BOUNDS):
+            if seconds <= bound:
+                break
+        self.counts[i] += 1
+
+    def add_censored(self):
+        self._age()
+        self.censored += 1
+
+    def quantile(self, q, include_censored=False):
+        """
+        返回分位数所在桶的上界（偏保守），没有样本时返回 None。
+        include_censored=True 时删失样本视为比所有已完成样本都慢，分位数落在删失部分时返回 None（真实耗时未知）
+        """
+        censored = self.censored if include_censored else 0.0
+        total = self.total + censored
+        if total <= 0:
+            return None
+        target = q / 100 * total
+        seen = 0.0
+        for count, bound in zip(self.counts, BUCKET_BOUNDS):
+            seen += count
+            if seen >= target - 1e-9:
+                return bound
+        return None if censored else BUCKET_BOUNDS[-1]
+
+    def to_dict(self):
+        return {"counts": [round(c, 3) for c in self.counts], "censored": round(self.censored, 3)}
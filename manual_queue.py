@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+人工处理延后队列
+功能：表单需要人工处理（验证码多次失败、未配置API、单选题未填完）时不再阻塞等待，
+而是保留该标签页、记下原因，换新标签页继续处理其余表单；一批结束后再集中交给用户逐个处理
+"""
+
+import time
+
+from page_state import PageState, classify_page
+from browser_backend import create_backend
+from eval_logging import get_logger, prompt, SUMMARY
+
+log = get_logger("manual_queue")
+
+
+class ManualQueue:
+    """
+    park() 暂存当前表单并切换到新标签页；最多保留 max_open_tabs 个标签页，超出后只记URL，处理时重新打开。
+    review() 依次切回每个暂存表单等待用户处理；无人值守时用 release()/expire() 按 key 或暂存时长移除条目并关闭标签页
+    """
+
+    def __init__(self, max_open_tabs=5):
+        self.max_open_tabs = max_open_tabs
+        self.parked = []
+        self.handled = 0
+
+    def __len__(self):
+        return len(self.parked)
+
+    def park(self, driver, reason, label, key=None):
+        entry = {"label": label, "reason": reason, "url": "", "handle": None, "parked_at": time.time(), "key": key}
+        try:
+            entry["url"] = driver.current_url
+            if sum(1 for p in self.parked if p["handle"]) < self.max_open_tabs:
+                entry["handle"] = driver.current_window_handle
+                # 保留这个标签页（已填写的内容都还在），后续表单在新标签页中进行
+                driver.switch_to.new_window('tab')
+        except Exception as e:
+            log.warning(f"⚠️ 保留标签页失败，处理时将重新打开: {e}")
+            entry["handle"] = None
+        self.parked.append(entry)
+        log.warning(f"⏸️ {label} 需要人工处理（{reason}），已暂存，继续处理其余表单")
+        return entry
+
+    def forget_tabs(self):
+        """浏览器重启后暂存的标签页已不存在（填写内容随之丢失），处理时按URL重新打开"""
+        lost = [entry["label"] for entry in self.parked if entry["handle"]]
+        for entry in self.parked:
+            entry["handle"] = None
+        if lost:
+            log.warning(f"⚠️ 浏览器已重启，暂存表单的标签页已关闭，处理时将重新打开: {'、'.join(lost)}")
+
+    def review(self, driver):
+        """集中处理全部暂存表单，返回本次处理的数量"""
+        if not self.parked:
+            return 0
+        parked, self.parked = self.parked, []
+        log.log(SUMMARY, f"\n📋 有 {len(parked)} 个表单需要人工处理:")
+        for i, entry in enumerate(parked, 1):
+            log.log(SUMMARY, f"   {i}. {entry['label']}: {entry['reason']}")
+
+        home = driver.current_window_handle
+        for entry in parked:
+            try:
+                if entry["handle"] and entry["handle"] in driver.window_handles:
+                    driver.switch_to.window(entry["handle"])
+                else:
+                    driver.switch_to.window(home)
+                    create_backend(driver).navigate(entry["url"])
+            except Exception as e:
+                log.error(f"❌ 无法打开暂存的表单 {entry['label']}: {e}")
+                continue
+            prompt(f"请在浏览器中完成「{entry['label']}」（{entry['reason']}），完成后按回车...")
+            state = classify_page(driver).state
+            if state == PageState.EVALUATION_FORM:
+                log.info(f"ℹ️ {entry['label']} 仍停留在表单页面，请确认是否已保存")
+            self.handled += 1
+            # 处理完的标签页关掉，回到继续批处理的标签页
+            if entry["handle"] and entry["handle"] != home:
+                try:
+                    driver.close()
+                except Exception:
+                    pass
+        try:
+            driver.switch_to.window(home)
+        except Exception:
+            driver.switch_to.window(driver.window_handles[0])
+        return len(parked)
+
+    def release(self, driver, key):
+        """移除 key 对应的暂存表单（用户已在浏览器中处理完或放弃）并关闭其标签页；找不到时返回 None"""
+        entry = next((p for p in self.parked if p["key"] == key), None)
+        if entry is None:
+            return None
+        self.parked.remove(entry)
+        self.handled += 1
+        self._close_tab(driver, entry)
+        return entry
+
+    def expire(self, driver, max_age):
+        """移除暂存超过 max_age 秒的表单并关闭其标签页，返回被移除的条目"""
+        now = time.time()
+        expired = [p for p in self.parked if now - p["parked_at"] >= max_age]
+        for entry in expired:
+            self.parked.remove(entry)
+            self._close_tab(driver, entry)
+            log.warning(f"⌛ {entry['label']} 暂存超过 {max_age:.0f}s 未处理，已关闭其标签页")
+        return expired
+
+    def _close_tab(self, driver, entry):
+        """关闭暂存的标签页后切回当前标签页"""
+        if not entry["handle"]:
+            return
+        try:
+            current = driver.current_window_handle
+            if entry["handle"] == current or entry["handle"] not in driver.window_handles:
+                return
+            driver.switch_to.window(entry["handle"])
+            driver.close()
+            driver.switch_to.window(current)
+        except Exception as e:
+            log.warning(f"⚠️ 关闭暂存表单 {entry['label']} 的标签页失败: {e}")
+            try:
+                driver.switch_to.window(driver.window_handles[0])
+            except Exception:
+                pass
+
+    def summary(self):
+        return [dict(entry) for entry in self.parked]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+评估页面预取
+功能：当前表单进入验证码/保存阶段时，在后台标签页提前打开队列中的下一个评估页面，
+轮到它时直接切换标签页，省去整页加载的等待；会话变化后预取的页面作废
+"""
+
+from eval_logging import get_logger
+
+log = get_logger("page_prefetcher")
+
+
+class PagePrefetcher:
+    """
+    只预取一个页面。prefetch() 用 window.open 打开后台标签页（不阻塞当前操作），
+    take() 在URL和会话代次都匹配时切换过去并关闭旧标签页
+    """
+
+    def __init__(self):
+        self.url = None
+        self.handle = None
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, driver, url, generation):
+        """在后台标签页打开 url；已预取同一页面时不重复打开"""
+        if not url:
+            return
+        if self.handle and self.url == url and self.generation == generation:
+            return
+        self.discard(driver)
+        try:
+            current = driver.current_window_handle
+            before = set(driver.window_handles)
+            driver.execute_script("window.open(arguments[0], '_blank');", url)
+            opened = [h for h in driver.window_handles if h not in before]
+            # 切回当前表单的标签页，保证后续截图和点击作用在前台页面上
+            driver.switch_to.window(current)
+        except Exception as e:
+            log.warning(f"⚠️ 预取下一个评估页面失败: {e}")
+            return
+        if opened:
+            self.url, self.handle, self.generation = url, opened[0], generation
+            log.info("⏩ 已在后台预取下一个评估页面")
+
+    def take(self, driver, url, generation):
+        """
+        切换到预取好的页面。成功返回 True；不匹配或已失效时关闭预取标签页并返回 False，由调用方正常导航
+        """
+        if not self.handle:
+            return False
+        if self.url != url or self.generation != generation or self.handle not in driver.window_handles:
+            self.misses += 1
+            self.discard(driver)
+            return False
+        try:
+            old = driver.current_window_handle
+            if old != self.handle:
+                driver.close()
+            driver.switch_to.window(self.handle)
+        except Exception as e:
+            log.warning(f"⚠️ 切换到预取页面失败: {e}")
+            self.handle = None
+            self._ensure_window(driver)
+            return False
+        self.hits += 1
+        self.url = self.handle = self.generation = None
+        log.info("⚡ 使用预取的评估页面")
+        return True
+
+    def discard(self, driver):
+        """关闭尚未使用的预取标签页"""
+        handle, self.url, self.handle, self.generation = self.handle, None, None, None
+        if not handle:
+            return
+        try:
+            if handle in driver.window_handles:
+                current = driver.current_window_handle
+                driver.switch_to.window(handle)
+                driver.close()
+                driver.switch_to.window(current)
+        except Exception as e:
+            log.debug(f"关闭预取标签页失败: {e}")
+            self._ensure_window(driver)
+
+    def forget_tabs(self):
+        """浏览器重启后预取的标签页已不存在，只清除记录"""
+        self.url = self.handle = self.generation = None
+
+    @staticmethod
+    def _ensure_window(driver):
+        """出错后确保 driver 仍指向一个存在的标签页"""
+        try:
+            handles = driver.window_handles
+            if handles:
+                driver.switch_to.window(handles[0])
+        except Exception:
+            pass
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+页面状态分类器
+功能：一次轻量的页内脚本调用即可判断当前页面处于哪种状态，替代反复拉取 page_source 做子串匹配
+"""
+
+import time
+from collections import namedtuple
+from enum import Enum
+
+
+class PageState(Enum):
+    EVALUATION_FORM = "evaluation_form"      # 可填写的评估表单
+    ALREADY_EVALUATED = "already_evaluated"  # 已评估/保存成功的页面
+    LOGIN = "login"                          # 登录页（会话失效）
+    ERROR = "error"                          # 错误页或错误提示框
+    CONFIRM_DIALOG = "confirm_dialog"        # 打开的确认/提示对话框
+    UNKNOWN = "unknown"
+
+
+# state: PageState；message: 对话框/错误文本（截断）；url: 当前地址
+PageProbe = namedtuple("PageProbe", ["state", "message", "url"])
+
+# 在页面内完成全部判断，只把几十字节的结果传回 Python
+PROBE_SCRIPT = """
+const url = location.href;
+const visible = el => !!(el && (el.offsetWidth || el.offsetHeight || el.getClientRects().length));
+const result = (state, message) => ({state: state, message: (message || '').trim().slice(0, 200), url: url});
+if (/login/i.test(url) || visible(document.querySelector('input[type=password]'))) {
+    return result('login');
+}
+const dialogs = Array.from(document.querySelectorAll(
+    '.messager-window, .panel.window, .modal.in, .modal.show, .layui-layer, [role=dialog], [role=alertdialog]')).filter(visible);
+const okButton = Array.from(document.querySelectorAll('button, a.l-btn, input[type=button]')).find(
+    b => visible(b) && /^\\s*确定\\s*$/.test(b.textContent || b.value || ''));
+if (dialogs.length || okButton) {
+    const box = dialogs[dialogs.length - 1] || okButton.closest('div') || okButton;
+    const text = box.innerText || box.textContent || '';
+    return result(/错误|失败|error/i.test(text) ? 'error' : 'confirm_dialog', text);
+}
+const title = document.title || '';
+if (/^(403|404|500|502|503)\\b|error|错误/i.test(title)) {
+    return result('error', title);
+}
+if (document.querySelector('input[type=radio], input[type=checkbox], textarea')) {
+    return result('evaluation_form');
+}
+const text = document.body ? (document.body.innerText || '').slice(0, 5000) : '';
+if (/已评估|已经评估|已完成评估|评估完成|保存成功/.test(text)) {
+    return result('already_evaluated', text.slice(0, 100));
+}
+return result('unknown');
+"""
+
+
+def classify_page(driver):
+    """返回当前页面的 PageProbe；脚本执行失败时返回 UNKNOWN。driver 也可以是 browser_backend 中的后端"""
+    try:
+        info = driver.execute_script(PROBE_SCRIPT) or {}
+        state = PageState(info.get("state", "unknown"))
+        return PageProbe(state, info.get("message", ""), info.get("url", ""))
+    except Exception:
+        try:
+            url = driver.current_url
+        except Exception:
+            url = ""
+        return PageProbe(PageState.UNKNOWN, "", url)
+
+
+def wait_for_state(driver, condition, timeout, poll=0.1):
+    """
+    轮询分类器直到满足条件：condition 可以是 PageState 集合，也可以是接收 PageProbe 的函数。
+    满足时返回该 PageProbe，超时返回 None
+    """
+    if callable(condition):
+        matches = condition
+    else:
+        states = set(condition)
+
+        def matches(probe):
+            return probe.state in states
+
+    deadline = time.monotonic() + timeout
+    while True:
+        probe = classify_page(driver)
+        if matches(probe):
+            return probe
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll)
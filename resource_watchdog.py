@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+浏览器内存看门狗
+功能：表单进行中由后台线程定期采样浏览器和 Python 进程的内存，记录每个表单的峰值；
+表单之间按最近一个表单的峰值判断，超过阈值时回收标签页或带 Cookie 重启浏览器，并在运行汇总中报告每个表单的内存峰值
+
+阈值（环境变量，单位 MB）：
+- UCAS_EVAL_TAB_HEAP_MB      当前标签页 JS 堆上限，超过后换新标签页（默认 300）
+- UCAS_EVAL_BROWSER_RSS_MB   浏览器进程树 RSS 上限，超过后重启浏览器（默认 1500，需要 psutil）
+
+进程内存只读 /proc 或 psutil，后台采样不经过 WebDriver；标签页 JS 堆需要在页面中执行脚本，只在表单结束时采样
+"""
+
+import gc
+import os
+import threading
+import time
+
+from eval_logging import get_logger
+
+log = get_logger("resource_watchdog")
+
+MB = 1024 * 1024
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def python_rss():
+    """当前 Python 进程的 RSS（字节），无法获取时返回 0"""
+    if psutil:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def browser_rss(driver):
+    """chromedriver 启动的浏览器进程树 RSS 总和（需要 psutil），无法获取时返回 0"""
+    if not psutil:
+        return 0
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        return sum(p.memory_info().rss for p in root.children(recursive=True))
+    except Exception:
+        return 0
+
+
+def tab_heap(driver):
+    """当前标签页已用 JS 堆（字节），非 Chrome 或不支持时返回 0"""
+    try:
+        return int(driver.execute_script(
+            "return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : 0") or 0)
+    except Exception:
+        return 0
+
+
+def recycle_tab(driver):
+    """打开一个新标签页并关闭旧的，释放旧页面的 DOM 和 JS 堆"""
+    old_handle = driver.current_window_handle
+    driver.switch_to.new_window('tab')
+    new_handle = driver.current_window_handle
+    driver.switch_to.window(old_handle)
+    driver.close()
+    driver.switch_to.window(new_handle)
+
+
+def restart_driver(driver, create_driver):
+    """
+    带 Cookie 重启浏览器：优先通过 DevTools 取出全部域名的 Cookie（sep 和评估站点都需要），
+    不支持时退回只保存当前域名的 Cookie。先启动新浏览器，成功后才关闭旧的；启动失败时异常原样抛出，旧浏览器保持可用
+    """
+    current_url = driver.current_url
+    try:
+        all_cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+    except Exception:
+        all_cookies = None
+    domain_cookies = driver.get_cookies() if all_cookies is None else []
+
+    new_driver = create_driver()
+    try:
+        driver.quit()
+    except Exception as e:
+        log.debug(f"关闭旧浏览器失败: {e}")
+    if all_cookies:
+        new_driver.execute_cdp_cmd("Network.enable", {})
+        new_driver.execute_cdp_cmd("Network.setCookies", {"cookies": all_cookies})
+    elif domain_cookies and current_url.startswith("http"):
+        new_driver.get(current_url)
+        for cookie in domain_cookies:
+            try:
+                new_driver.add_cookie(cookie)
+            except Exception as e:
+                log.debug(f"写回 Cookie {cookie.get('name')} 失败: {e}")
+    return new_driver
+
+
+class ResourceWatchdog:
+    """
+    用法：每个表单前 begin_form(label, driver)，表单后 end_form(driver)，
+    之后调用 maybe_recycle(driver, create_driver, tab_holders) 并使用其返回的 driver。
+    tab_holders 为持有标签页句柄的对象（ManualQueue、PagePrefetcher），重启浏览器后调用其 forget_tabs()
+    """
+
+    def __init__(self, tab_heap_limit=None, browser_rss_limit=None, sample_interval=1.0):
+        self.tab_heap_limit = (tab_heap_limit or int(os.environ.get("UCAS_EVAL_TAB_HEAP_MB", "300"))) * MB
+        self.browser_rss_limit = (browser_rss_limit or int(os.environ.get("UCAS_EVAL_BROWSER_RSS_MB", "1500"))) * MB
+        self.sample_interval = sample_interval
+        self.records = []
+        self.tab_recycles = 0
+        self.driver_restarts = 0
+        self._current = None
+        self._sampler_stop = None
+
+    def sample(self, driver):
+        return {"python": python_rss(), "browser": browser_rss(driver), "tab_heap": tab_heap(driver)}
+
+    def begin_form(self, label, driver=None):
+        self._stop_sampler()
+        self._current = record = {"label": label, "started": time.monotonic(),
+                                  "python": python_rss(), "browser": 0, "tab_heap": 0}
+        if driver is not None:
+            self._sampler_stop = stop = threading.Event()
+            threading.Thread(target=self._sample_loop, args=(driver, record, stop),
+                             name="memory-sampler", daemon=True).start()
+
+    def _sample_loop(self, driver, record, stop):
+        """表单进行中定期采样进程内存，保留峰值"""
+        while True:
+            record["python"] = max(record["python"], python_rss())
+            record["browser"] = max(record["browser"], browser_rss(driver))
+            if stop.wait(self.sample_interval):
+                return
+
+    def _stop_sampler(self):
+        if self._sampler_stop:
+            self._sampler_stop.set()
+            self._sampler_stop = None
+
+    def end_form(self, driver):
+        if not self._current:
+            return None
+        self._stop_sampler()
+        record, self._current = self._current, None
+        for key, value in self.sample(driver).items():
+            record[key] = max(record[key], value)
+        record["elapsed"] = time.monotonic() - record.pop("started")
+        self.records.append(record)
+        return record
+
+    def maybe_recycle(self, driver, create_driver=None, tab_holders=()):
+        """根据最近一个表单的内存峰值决定是否回收，返回（可能是新的）driver"""
+        if not self.records:
+            return driver
+        last = self.records[-1]
+        try:
+            if create_driver and self.browser_rss_limit and last["browser"] > self.browser_rss_limit:
+                log.warning(f"♻️ 浏览器内存 {last['browser'] / MB:.0f}MB 超过上限，带Cookie重启浏览器")
+                driver = restart_driver(driver, create_driver)
+                self.driver_restarts += 1
+                # 旧浏览器中暂存的人工处理标签页和预取标签页都已关闭
+                for holder in tab_holders:
+                    holder.forget_tabs()
+            elif self.tab_heap_limit and last["tab_heap"] > self.tab_heap_limit:
+                log.warning(f"♻️ 标签页JS堆 {last['tab_heap'] / MB:.0f}MB 超过上限，换用新标签页")
+                recycle_tab(driver)
+                self.tab_recycles += 1
+        except Exception as e:
+            log.error(f"❌ 回收浏览器资源失败: {e}")
+        gc.collect()
+        return driver
+
+    def summary_lines(self):
+        if not self.records:
+            return []
+        lines = ["🧠 每个表单的内存峰值（进程内存在表单进行中定期采样，标签页堆在表单结束时采样）:"]
+        for r in self.records:
+            lines.append(f"   {r['label']}: Python {r['python'] / MB:.0f}MB, 浏览器 {r['browser'] / MB:.0f}MB, "
+                         f"标签页堆 {r['tab_heap'] / MB:.0f}MB, 用时 {r['elapsed']:.1f}s")
+        peak = max(self.records, key=lambda r: r["python"] + r["browser"])
+        lines.append(f"   峰值表单: {peak['label']}；回收标签页 {self.tab_recycles} 次，重启浏览器 {self.driver_restarts} 次")
+        return lines
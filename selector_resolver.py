@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+页面元素选择器解析
+功能：选择器列表统一放在 selector_config.json 中，一次 execute_script 在页面内按优先级试完全部候选，
+返回命中的元素和所用的选择器；每种表单模板命中过的选择器会被缓存，下次优先尝试
+
+配置文件可用环境变量 UCAS_EVAL_SELECTORS 指向自定义路径
+"""
+
+import json
+import os
+import re
+import threading
+
+from eval_state import state_path, load_json, save_json
+from eval_logging import get_logger
+
+log = get_logger("selector_resolver")
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "selector_config.json")
+CACHE_FILE = "selector_cache.json"
+
+# 在页面内依次尝试每组候选：与 find_element 一致，只取每个选择器的第一个匹配，不可见（按钮还要求可用）时试下一个
+RESOLVE_SCRIPT = """
+var groups = arguments[0], result = {};
+function first(type, value) {
+    if (type === 'id') return document.getElementById(value);
+    if (type === 'name') return document.getElementsByName(value)[0] || null;
+    if (type === 'css') return document.querySelector(value);
+    return document.evaluate(value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function usable(el) {
+    if (!el.getClientRects().length) return false;
+    var style = window.getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none' && !el.disabled;
+}
+for (var name in groups) {
+    result[name] = null;
+    var candidates = groups[name];
+    for (var i = 0; i < candidates.length; i++) {
+        var el = null;
+        try { el = first(candidates[i][0], candidates[i][1]); } catch (e) { continue; }
+        if (el && usable(el)) { result[name] = {element: el, index: candidates[i][2]}; break; }
+    }
+}
+return result;
+"""
+
+
+def form_template(url):
+    """表单模板标识：去掉URL中的数字ID，例如 .../evaluateTeacher/78810/278488/1541/0 -> /evaluate/evaluateTeacher"""
+    path = re.sub(r"^[a-z]+://[^/]+", "", url or "").split("?")[0].split("#")[0]
+    return "/".join(p for p in path.split("/") if not p.isdigit()) or "/"
+
+
+def load_selector_config(path=None):
+    """读取选择器配置：{组名: [[类型(id/name/css/xpath), 值], ...]}"""
+    path = path or os.environ.get("UCAS_EVAL_SELECTORS") or CONFIG_FILE
+    with open(path, "r", encoding="utf-8") as f:
+        return {name: [tuple(item) for item in candidates] for name, candidates in json.load(f).items()}
+
+
+class SelectorResolver:
+    """
+    resolve(driver, groups) 一次往返解析多组选择器，返回 {组名: (元素或None, 命中的选择器或None)}；
+    命中结果按 form_template 缓存并持久化到状态目录
+    """
+
+    def __init__(self, config=None, cache_path=None):
+        self.config = config or load_selector_config()
+        self.cache_path = cache_path or state_path(CACHE_FILE)
+        self.cache = load_json(self.cache_path, default={}) or {}
+        self._lock = threading.Lock()
+
+    def _ordered(self, template, name):
+        """候选列表：缓存命中的选择器排第一，其余保持配置中的优先级"""
+        candidates = [[kind, value, index] for index, (kind, value) in enumerate(self.config.get(name, []))]
+        cached = self.cache.get(template, {}).get(name)
+        if cached is not None and 0 <= cached < len(candidates):
+            candidates.insert(0, candidates.pop(cached))
+        return candidates
+
+    def resolve(self, driver, groups):
+        try:
+            template = form_template(driver.current_url)
+        except Exception:
+            template = "/"
+        payload = {name: self._ordered(template, name) for name in groups}
+        try:
+            found = driver.execute_script(RESOLVE_SCRIPT, payload) or {}
+        except Exception as e:
+            log.warning(f"⚠️ 页面内解析选择器失败: {e}")
+            found = {}
+
+        results, changed = {}, False
+        for name in groups:
+            match = found.get(name)
+            if not match:
+                results[name] = (None, None)
+                continue
+            index = match["index"]
+            results[name] = (match["element"], self.config[name][index])
+            if self.cache.get(template, {}).get(name) != index:
+                with self._lock:
+                    self.cache.setdefault(template, {})[name] = index
+                changed = True
+        if changed:
+            try:
+                save_json(self.cache_path, self.cache)
+            except OSError as e:
+                log.debug(f"保存选择器缓存失败: {e}")
+        return results
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+会话保活与失效探测
+功能：用浏览器的 Cookie 发起轻量 HTTP 请求判断会话是否有效，并在长批次中后台心跳保活
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+from eval_logging import get_logger
+
+log = get_logger("session_keeper")
+
+# 被重定向到这些地址即视为会话失效
+LOGIN_MARKERS = ("sep.ucas.ac.cn", "login", "cas/")
+
+
+class SessionManager:
+    """
+    会话管理器：
+    - sync_cookies() 在主线程中把浏览器 Cookie 同步到 requests 会话（WebDriver 不是线程安全的，后台线程不碰 driver）
+    - is_valid() 只读响应头判断是否被重定向到登录页，代价远小于加载整页
+    - start_heartbeat() 定期访问同一地址，让服务端会话保持活跃
+    - generation 在重新登录或探测到失效时递增，依赖旧会话的缓存（如预取的页面）据此作废
+    """
+
+    def __init__(self, heartbeat_interval=240, probe_timeout=5, fresh_for=60):
+        self.heartbeat_interval = heartbeat_interval
+        self.probe_timeout = probe_timeout
+        self.fresh_for = fresh_for
+        import requests  # 登录完成后才创建会话管理器，requests 不必在启动时导入
+
+        self.http = requests.Session()
+        self.probe_url = None
+        self.last_state = None
+        self.last_checked = 0.0
+        self.synced_hosts = set()
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync_cookies(self, driver):
+        """从浏览器复制 Cookie 和 User-Agent"""
+        try:
+            cookies = driver.get_cookies()
+            user_agent = driver.execute_script("return navigator.userAgent")
+            host = urlsplit(driver.current_url).hostname
+        except Exception as e:
+            log.warning(f"⚠️ 同步浏览器Cookie失败: {e}")
+            return
+        with self._lock:
+            for cookie in cookies:
+                self.http.cookies.set(cookie["name"], cookie["value"],
+                                      domain=cookie.get("domain"), path=cookie.get("path", "/"))
+            if user_agent:
+                self.http.headers["User-Agent"] = user_agent
+            if host:
+                self.synced_hosts.add(host)
+            # Cookie 变化后之前的结论不再可信
+            self.last_checked = 0.0
+
+    def probe(self, url=None):
+        """
+        发起一次探测：True=有效，False=已失效，None=无法判断（网络问题，交给页面自身判断）
+        """
+        import requests
+
+        url = url or self.probe_url
+        if not url:
+            return None
+        try:
+            with self._lock:
+                response = self.http.get(url, allow_redirects=False, timeout=self.probe_timeout, stream=True)
+            response.close()
+        except requests.exceptions.RequestException as e:
+            log.warning(f"⚠️ 会话探测失败: {e}")
+            return None
+
+        if response.status_code in (301, 302, 303, 307, 308):
+            location = response.headers.get("Location", "").lower()
+            valid = not any(marker in location for marker in LOGIN_MARKERS)
+        else:
+            valid = response.status_code not in (401, 403)
+
+        if not valid:
+            self.generation += 1
+        self.last_state = valid
+        self.last_checked = time.monotonic()
+        return valid
+
+    def fetch_page(self, url, timeout=None):
+        """带浏览器 Cookie 获取页面 HTML；被重定向（多为登录页）或请求失败时返回 None"""
+        import requests
+
+        try:
+            with self._lock:
+                response = self.http.get(url, allow_redirects=False, timeout=timeout or self.probe_timeout)
+        except requests.exceptions.RequestException as e:
+            log.debug(f"获取页面失败 {url}: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        return response.text
+
+    def mark_relogin(self):
+        """重新登录后调用：旧会话下的结论和缓存全部作废"""
+        self.generation += 1
+        self.last_state = None
+        self.last_checked = 0.0
+
+    def is_valid(self, url):
+        """判断会话是否有效；心跳刚确认过时直接复用结论，尚未同步过该站点 Cookie 时无法判断，视为有效"""
+        if urlsplit(url).hostname not in self.synced_hosts:
+            return True
+        self.probe_url = url
+        if self.last_state is True and time.monotonic() - self.last_checked < self.fresh_for:
+            return True
+        state = self.probe(url)
+        return state is not False
+
+    def start_heartbeat(self, url=None):
+        """启动后台心跳线程（重复调用只会更新探测地址）"""
+        if url:
+            self.probe_url = url
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="session-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.probe_timeout + 1)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            state = self.probe()
+            if state is False:
+                log.warning("\n⚠️ 后台心跳发现会话已失效，将在下一个表单前重新登录")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+填表策略微基准
+功能：在内存中的假 WebDriver（fake_webdriver）上逐个运行课程评估脚本的填表策略函数，
+不启动浏览器，time.sleep 换成虚拟时钟；统计每个策略的实际耗时、睡眠时间（虚拟）、WebDriver 往返次数，
+并检查填写结果是否正确，用于快速比较策略改动
+
+用法：
+    python strategy_bench.py                      # 内置样例表单 + 全部已记录的表单样本
+    python strategy_bench.py -s table_rows name_groups -n 20
+    python strategy_bench.py --rtt 0.005          # 每次往返按 5ms 计入预估耗时
+样本由评估脚本在 UCAS_EVAL_RECORD_FIXTURES=1 时自动记录；使用临时状态目录，不影响已学到的缓存
+默认只显示汇总，UCAS_EVAL_QUIET=0 时显示策略函数的详细日志
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("UCAS_EVAL_QUIET", "1")
+
+import eval_state
+from fake_webdriver import FakeDriver, VirtualClock
+from form_fixtures import load_fixtures
+from eval_logging import get_logger, flush_logs, SUMMARY
+
+log = get_logger("strategy_bench")
+
+
+def _sample_form():
+    """内置样例：10 道五级单选题（按 name 分组）、3 个复选框、2 个文本域、验证码和保存按钮"""
+    rows = "".join(
+        f"<tr><td>评价指标{i}</td>" + "".join(
+            f"<td><input type='radio' name='item{i}' value='{5 - j}'></td>" for j in range(5)) + "</tr>"
+        for i in range(1, 11))
+    reasons = "".join(f"<label><input type='checkbox' name='reason' value='{i}'>修读原因{i}</label>" for i in range(1, 4))
+    return f"""<html><head><title>课程评估</title></head><body><form>
+<table>{rows}</table>
+<div>{reasons}</div>
+<textarea name='comment1'></textarea><textarea name='comment2'></textarea>
+<span>验证码</span><input type='text' name='adminValidateCode'><img id='adminValidateImg' src='captcha.jpg'>
+<button type='submit'>保存</button>
+</form></body></html>"""
+
+
+SAMPLE_PAGE = {"fingerprint": "sample", "kind": "course", "captcha": True, "html": _sample_form()}
+
+
+def _radio_problems(state, found):
+    if state["radio_checked"] < state["radio_groups"]:
+        return [f"单选 {state['radio_checked']}/{state['radio_groups']}"]
+    return []
+
+
+def _checkbox_problems(state, found):
+    if state["checkboxes"] and not state["checkboxes_checked"]:
+        return ["多选未勾选"]
+    return []
+
+
+def _textarea_problems(state, found):
+    if state["textareas_filled"] < state["textareas"]:
+        return [f"文本域 {state['textareas_filled']}/{state['textareas']}"]
+    return []
+
+
+def _captcha_problems(state, found):
+    return [] if found else ["验证码元素未定位"]
+
+
+def load_strategies():
+    """策略名 -> (运行函数(driver) -> 返回值, 结果检查函数)；需在切换临时状态目录之后加载"""
+    import eval_course
+    return {
+        "table_rows": (eval_course.fill_radio_buttons_by_table_rows, _radio_problems),
+        "name_groups": (eval_course.fill_radio_buttons_by_name_groups, _radio_problems),
+        "sequential": (eval_course.fill_radio_buttons_sequential, _radio_problems),
+        "multiselect": (eval_course.fill_multiselect_questions, _checkbox_problems),
+        "text_areas": (eval_course.fill_text_areas, _textarea_problems),
+        "captcha": (lambda driver: all(eval_course.find_captcha_elements(driver)), _captcha_problems),
+    }, eval_course
+
+
+def load_pages(directory=None, kind=None):
+    pages = [SAMPLE_PAGE] if kind in (None, "course") else []
+    for fixture in load_fixtures(directory, kind):
+        with open(os.path.join(fixture["path"], "page.html"), encoding="utf-8") as f:
+            pages.append(dict(fixture, html=f.read()))
+    return pages
+
+
+def run_strategy(page, name, strategy, module, repeat, rtt):
+    run, check = strategy
+    elapsed = []
+    for _ in range(repeat):
+        driver = FakeDriver(page["html"], url="file:///" + page["fingerprint"] + "/page.html",
+                            clock=VirtualClock(), rtt=rtt)
+        with driver.clock.installed(module):
+            started = time.perf_counter()
+            try:
+                found, error = run(driver), ""
+            except Exception as e:
+                found, error = False, str(e)
+            elapsed.append(time.perf_counter() - started)
+    # 结果检查以最后一次运行为准；验证码只在页面确实有验证码时要求定位到
+    problems = check(driver.form_state(), found) if name != "captcha" or page.get("captcha") else []
+    if error:
+        problems.append(f"异常: {error[:60]}")
+    return {
+        "page": page["fingerprint"], "strategy": name, "ms": statistics.median(elapsed) * 1000,
+        "slept": driver.clock.slept, "round_trips": driver.round_trips,
+        "estimated": driver.clock.now, "problems": problems,
+    }
+
+
+def print_report(results, rtt):
+    log.log(SUMMARY, "")
+    header = f"{'页面':<14}{'策略':<13}{'耗时(ms)':>9}{'睡眠(s)':>9}{'往返':>6}"
+    if rtt:
+        header += f"{'预估(s)':>9}"
+    log.log(SUMMARY, header + "  结果")
+    for r in results:
+        verdict = "✅ 通过" if not r["problems"] else "❌ " + "；".join(r["problems"])
+        line = f"{r['page']:<14}{r['strategy']:<13}{r['ms']:>9.2f}{r['slept']:>9.1f}{r['round_trips']:>6}"
+        if rtt:
+            line += f"{r['estimated']:>9.2f}"
+        log.log(SUMMARY, f"{line}  {verdict}")
+    passed = sum(1 for r in results if not r["problems"])
+    log.log(SUMMARY, f"\n📊 通过 {passed}/{len(results)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="填表策略微基准（假 WebDriver）")
+    parser.add_argument("-d", "--fixtures", help="样本目录，默认 ~/.ucas_eval/form_fixtures")
+    parser.add_argument("-k", "--kind", choices=["teacher", "course"], help="只使用指定类型的表单样本")
+    parser.add_argument("-s", "--strategies", nargs="+", help="只运行指定策略")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每个策略重复次数，耗时取中位数（默认5）")
+    parser.add_argument("--rtt", type=float, default=0.0, help="每次 WebDriver 往返计入的虚拟耗时（秒），用于预估真实浏览器上的耗时")
+    args = parser.parse_args()
+
+    # 选择器缓存等从空白状态开始，结果可复现，也不污染真实运行学到的数据
+    eval_state.STATE_DIR = tempfile.mkdtemp(prefix="ucas_eval_bench_")
+    strategies, module = load_strategies()
+    selected = args.strategies or list(strategies)
+    unknown = [s for s in selected if s not in strategies]
+    if unknown:
+        log.error(f"❌ 未知策略: {', '.join(unknown)}（可选: {', '.join(strategies)}）")
+        flush_logs()
+        return 1
+
+    pages = load_pages(args.fixtures, args.kind)
+    if not pages:
+        log.error("❌ 没有可用的表单样本")
+        flush_logs()
+        return 1
+    log.log(SUMMARY, f"🧪 {len(pages)} 个表单 x {len(selected)} 个策略，每个重复 {args.repeat} 次")
+    results = [run_strategy(page, name, strategies[name], module, max(1, args.repeat), args.rtt)
+               for page in pages for name in selected]
+    print_report(results, args.rtt)
+    flush_logs()
+    return 0 if all(not r["problems"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+智谱流式对话接口
+功能：以 stream=True 调用 chat/completions，逐块解析 SSE 返回的增量文本；
+验证码识别时一旦回复明确给出了符合历史格式、长度为预期长度的答案，
+立即断开连接，不再等待模型补充的说明文字
+
+返回值与非流式接口的 JSON 结构相同（choices[0].message.content / usage），调用方的解析逻辑无需改动；
+提前结束时额外带 early_candidate 字段，此时没有 usage（智谱只在最后一块返回用量），
+UsageMeter 会把这类调用单独计数并按平均用量估算
+"""
+
+import json
+import os
+import re
+
+from eval_logging import get_logger
+
+log = get_logger("zhipu_stream")
+
+# UCAS_EVAL_CAPTCHA_STREAM=0 时改回非流式请求（如配置的兼容接口不支持流式）
+STREAM_ENABLED = os.environ.get("UCAS_EVAL_CAPTCHA_STREAM", "1").lower() not in ("0", "false", "no")
+
+
+def iter_sse_events(response):
+    """逐个产出 SSE 中 data: 行解析后的 JSON，遇到 [DONE] 结束"""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+def read_completion_stream(response, stop=None):
+    """
+    读取流式回复并拼接为非流式结构；stop(已收到的文本) 返回候选答案时提前关闭连接
+    """
+    content = ""
+    usage = None
+    try:
+        for event in iter_sse_events(response):
+            usage = event.get("usage") or usage
+            choices = event.get("choices") or []
+            if choices:
+                content += (choices[0].get("delta") or {}).get("content") or ""
+            candidate = stop(content) if stop else None
+            if candidate:
+                log.info(f"⚡ 流式返回中已出现验证码 '{candidate}'，提前结束请求")
+                return {"choices": [{"message": {"content": content}}], "usage": None, "early_candidate": candidate}
+    finally:
+        response.close()
+    return {"choices": [{"message": {"content": content}}], "usage": usage}
+
+
+def captcha_stop_condition(captcha_format):
+    """
+    提前结束条件：验证码格式模型已训练时，只在回复中明确给出答案时结束——
+    整个回复到目前为止就是一个预期长度的字母数字串且后面已出现换行或句末标点，
+    或该串紧跟在"是/码是/为/冒号/is"之后并已结束；候选还需通过格式模型的置信度检查。
+    回复开头的说明文字（如 "The code is ab3d." 中的 "code"）不会被当成答案。
+    未训练时不知道预期长度，返回 None（读完整个回复）
+    """
+    length = captcha_format.expected_length
+    if not length:
+        return None
+    answer = rf"[\"'“「]?([A-Za-z0-9]{{{length}}})[\"'”」]?"
+    patterns = [
+        re.compile(rf"^\s*{answer}\s*[\n。.!！]"),
+        re.compile(rf"(?:码是|是|为|[:：]|\bis)\s*{answer}[^A-Za-z0-9]"),
+    ]
+
+    def stop(text):
+        for pattern in patterns:
+            for match in pattern.finditer(text):
+                candidate = match.group(1)
+                if captcha_format.score(captcha_format.normalize(candidate)) >= captcha_format.threshold:
+                    return candidate
+        return None
+
+    return stop